@@ -2,8 +2,13 @@
 from __future__ import unicode_literals
 
 from pyscada.bacnet import PROTOCOL_ID
-from pyscada.bacnet.models import BACnetDevice, ExtendedBACnetDevice
+from pyscada.bacnet.models import BACnetDevice, BACnetDeviceProperty
+from pyscada.bacnet.models import ExtendedBACnetDevice
 from pyscada.bacnet.models import (
+    BACnetDiscoveredObject,
+    BACnetExportedVariable,
+    BACnetQuarantinedReference,
+    BACnetTrendLog,
     BACnetVariable,
     BACnetVariableProperty,
     ExtendedBACnetVariable,
@@ -13,15 +18,214 @@ from pyscada.admin import VariableAdmin
 from pyscada.admin import admin_site
 from pyscada.models import Device, DeviceProtocol
 from pyscada.models import Variable
-from django.contrib import admin
+from pyscada.bacnet.points import (
+    read_ede,
+    read_csv,
+    import_points,
+    provision_points,
+)
+from pyscada.bacnet.signals import reinit_daq_daemons
+from django import forms
+from django.contrib import admin, messages
+from django.template.response import TemplateResponse
 
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class ImportPointsForm(forms.Form):
+    _selected_action = forms.CharField(widget=forms.MultipleHiddenInput)
+    file = forms.FileField(help_text="EDE file or csv point list")
+    file_format = forms.ChoiceField(choices=(("ede", "EDE"), ("csv", "csv")))
+    state_texts = forms.FileField(
+        required=False, help_text="EDE state text file (optional)"
+    )
+    device_instance = forms.IntegerField(
+        required=False,
+        min_value=0,
+        help_text="EDE only: import the objects of this BACnet device instance",
+    )
+
+
+class ProvisionPointsForm(forms.Form):
+    _selected_action = forms.CharField(widget=forms.MultipleHiddenInput)
+    object_types = forms.MultipleChoiceField(
+        required=False, help_text="all object types if none is selected"
+    )
+    name_pattern = forms.CharField(
+        required=False, help_text="object name pattern, e.g. *temp*"
+    )
+    units = forms.MultipleChoiceField(
+        required=False, help_text="all units if none is selected"
+    )
+
+    def __init__(self, *args, **kwargs):
+        bacnet_device = kwargs.pop("bacnet_device")
+        super().__init__(*args, **kwargs)
+        discovered = BACnetDiscoveredObject.objects.filter(bacnet_device=bacnet_device)
+        type_names = dict(BACnetVariable.object_type_choises)
+        self.fields["object_types"].choices = [
+            (object_type, type_names.get(object_type, object_type))
+            for object_type in discovered.order_by("object_type")
+            .values_list("object_type", flat=True)
+            .distinct()
+        ]
+        self.fields["units"].choices = [
+            (units, units)
+            for units in discovered.exclude(units="")
+            .order_by("units")
+            .values_list("units", flat=True)
+            .distinct()
+        ]
+
+
+def _remote_device(modeladmin, request, queryset):
+    """
+    return the selected remote BACnet device or None
+    """
+    device = queryset.first()
+    if (
+        queryset.count() != 1
+        or not hasattr(device, "bacnetdevice")
+        or device.bacnetdevice.device_type != 1
+    ):
+        modeladmin.message_user(
+            request, "Select exactly one remote BACnet device.", messages.ERROR
+        )
+        return None
+    return device
+
+
+def _points_result(modeladmin, request, count, result):
+    modeladmin.message_user(
+        request,
+        "%d points read, %d created, %d updated, %d unchanged"
+        % (count, result["created"], result["updated"], result["unchanged"]),
+    )
+
+
+def _device_action_response(modeladmin, request, device, form, action, **kwargs):
+    request.current_app = modeladmin.admin_site.name
+    return TemplateResponse(
+        request,
+        "bacnet/admin/device_action.html",
+        dict(
+            modeladmin.admin_site.each_context(request),
+            device=device,
+            form=form,
+            opts=modeladmin.model._meta,
+            action=action,
+            **kwargs,
+        ),
+    )
+
+
+def import_points_action(modeladmin, request, queryset):
+    """
+    import the points of a remote BACnet device from an EDE file or a csv
+    point list
+    """
+    device = _remote_device(modeladmin, request, queryset)
+    if device is None:
+        return None
+    if "apply" in request.POST:
+        form = ImportPointsForm(request.POST, request.FILES)
+        if form.is_valid():
+            text = form.cleaned_data["file"].read().decode("utf-8-sig")
+            try:
+                if form.cleaned_data["file_format"] == "ede":
+                    state_texts = None
+                    if form.cleaned_data["state_texts"] is not None:
+                        state_texts = (
+                            form.cleaned_data["state_texts"].read().decode("utf-8-sig")
+                        )
+                    points = read_ede(
+                        text, state_texts, form.cleaned_data["device_instance"]
+                    )
+                else:
+                    points = read_csv(text)
+                result = import_points(device, points)
+            except (ValueError, KeyError) as e:
+                modeladmin.message_user(
+                    request, "Import failed: %s" % e, messages.ERROR
+                )
+                return None
+            _points_result(modeladmin, request, len(points), result)
+            return None
+    else:
+        form = ImportPointsForm(initial={"_selected_action": [str(device.pk)]})
+    return _device_action_response(
+        modeladmin,
+        request,
+        device,
+        form,
+        "import_points_action",
+        title="Import BACnet points",
+        intro="Import the points of %s. Existing points are matched by object "
+        "type and instance, only changes are applied." % device,
+        submit="Import",
+    )
+
+
+import_points_action.short_description = "Import BACnet points (EDE / csv)"
+
+
+def provision_points_action(modeladmin, request, queryset):
+    """
+    create the variables of a remote BACnet device from its discovered objects
+    """
+    device = _remote_device(modeladmin, request, queryset)
+    if device is None:
+        return None
+    bacnet_device = device.bacnetdevice
+    if not BACnetDiscoveredObject.objects.filter(bacnet_device=bacnet_device).exists():
+        modeladmin.message_user(
+            request,
+            "No discovered objects for %s, start the BACnet DAQ first." % device,
+            messages.WARNING,
+        )
+        return None
+    if "apply" in request.POST:
+        form = ProvisionPointsForm(request.POST, bacnet_device=bacnet_device)
+        if form.is_valid():
+            result = provision_points(
+                device,
+                [int(t) for t in form.cleaned_data["object_types"]],
+                form.cleaned_data["name_pattern"],
+                form.cleaned_data["units"],
+            )
+            _points_result(modeladmin, request, sum(result.values()), result)
+            return None
+    else:
+        form = ProvisionPointsForm(
+            initial={"_selected_action": [str(device.pk)]},
+            bacnet_device=bacnet_device,
+        )
+    return _device_action_response(
+        modeladmin,
+        request,
+        device,
+        form,
+        "provision_points_action",
+        title="Provision BACnet variables",
+        intro="Create the variables of %s from the discovered objects matching "
+        "the filters. Existing variables are matched by object type and "
+        "instance." % device,
+        submit="Provision",
+    )
+
+
+provision_points_action.short_description = (
+    "Provision BACnet variables from discovered objects"
+)
+
+
 class BACnetDeviceAdminInline(admin.StackedInline):
     model = BACnetDevice
+    fk_name = BACnetDevice.fk_name
+    fieldsets = BACnetDevice.fieldsets
+    formset = BACnetDevice.FormSet
 
 
 class BACnetDeviceAdmin(DeviceAdmin):
@@ -39,6 +243,7 @@ class BACnetDeviceAdmin(DeviceAdmin):
         return qs.filter(protocol_id=PROTOCOL_ID)
 
     inlines = [BACnetDeviceAdminInline]
+    actions = DeviceAdmin.actions + [import_points_action, provision_points_action]
 
 
 class BACnetVariableAdminInline(admin.StackedInline):
@@ -85,6 +290,109 @@ class BACnetVariableAdmin(VariableAdmin):
     inlines = [BACnetVariableAdminInline]
 
 
-# admin_site.register(ExtendedBACnetDevice, BACnetDeviceAdmin)
+admin_site.register(ExtendedBACnetDevice, BACnetDeviceAdmin)
+
+
+class BACnetDiscoveredObjectAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "bacnet_device",
+        "object_type",
+        "object_identifier",
+        "object_name",
+        "units",
+        "last_seen",
+    )
+    list_filter = ("bacnet_device", "object_type", "units")
+    search_fields = ("object_name", "description")
+
+
+class BACnetTrendLogAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "bacnet_variable",
+        "trend_log_instance",
+        "active",
+        "last_sequence_number",
+        "last_record_time",
+        "last_backfill",
+        "records_backfilled",
+    )
+    list_filter = ("active",)
+    raw_id_fields = ("bacnet_variable",)
+    readonly_fields = ("last_record_time", "last_backfill", "records_backfilled")
+
+
+class BACnetDevicePropertyAdmin(admin.ModelAdmin):
+    list_display = ("id", "bacnet_device", "name", "value")
+    list_filter = ("bacnet_device",)
+
+
+def release_quarantine_action(modeladmin, request, queryset):
+    """
+    read the selected quarantined references again
+    """
+    devices = list(
+        Device.objects.filter(
+            variable__bacnetvariable__quarantine__in=queryset
+        ).distinct()
+    )
+    count = queryset.count()
+    queryset.delete()
+    for device in devices:
+        reinit_daq_daemons(device)
+    modeladmin.message_user(request, "%d references released" % count)
+
+
+release_quarantine_action.short_description = "Release from quarantine"
+
+
+class BACnetQuarantinedReferenceAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "bacnet_variable",
+        "property_name",
+        "error",
+        "since",
+        "last_check",
+        "checks",
+    )
+    list_filter = ("error", "bacnet_variable__bacnet_variable__device")
+    search_fields = ("bacnet_variable__bacnet_variable__name",)
+    readonly_fields = (
+        "bacnet_variable",
+        "property_name",
+        "error",
+        "since",
+        "last_check",
+        "checks",
+    )
+    actions = [release_quarantine_action]
+
+    def has_add_permission(self, request):
+        return False
+
+
+class BACnetExportedVariableAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "variable",
+        "bacnet_local_device",
+        "object_type",
+        "object_instance",
+        "object_name",
+        "active",
+    )
+    list_editable = ("active",)
+    list_filter = ("bacnet_local_device", "object_type", "active")
+    search_fields = ("variable__name", "object_name")
+    raw_id_fields = ("variable",)
+
+
 # admin_site.register(ExtendedBACnetVariable, BACnetVariableAdmin)
 admin_site.register(BACnetVariableProperty)
+admin_site.register(BACnetDiscoveredObject, BACnetDiscoveredObjectAdmin)
+admin_site.register(BACnetTrendLog, BACnetTrendLogAdmin)
+admin_site.register(BACnetExportedVariable, BACnetExportedVariableAdmin)
+admin_site.register(BACnetQuarantinedReference, BACnetQuarantinedReferenceAdmin)
+admin_site.register(BACnetDeviceProperty, BACnetDevicePropertyAdmin)
@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import Device as PyScadaDevice
+from pyscada.bacnet import PROTOCOL_ID
+from pyscada.bacnet.models import BACnetDevice
+from pyscada.bacnet.points import save_discovered_objects, provision_points
+from pyscada.bacnet.metrics import metrics
+
+from django.db import transaction
+
+from multiprocessing import get_context
+from queue import Empty
+from time import time, process_time, sleep
+import json
+import resource
+import traceback
+import logging
+
+try:
+    import BAC0
+
+    from bacpypes.constructeddata import Any
+    from bacpypes.primitivedata import Real, Boolean, Unsigned, TagList
+    from bacpypes.basetypes import BinaryPV
+
+    from pyscada.bacnet.device import Device
+    from pyscada.bacnet.simulator import run_farm, STATE_TEXTS
+    from pyscada.bacnet.decoders import decode_primitive
+    from pyscada.bacnet.loop import CORE_LOOPS, measure_core_loop
+    from pyscada.bacnet.spawn import run_with_django
+
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+
+logger = logging.getLogger(__name__)
+
+# name: (points, devices)
+SCENARIOS = {
+    "100": (100, 1),
+    "1k": (1000, 10),
+    "10k": (10000, 100),
+    "50k": (50000, 200),
+}
+
+SIMULATOR_IP = "127.0.0.2"
+SIMULATOR_PORT = 47810
+CLIENT_IP = "127.0.0.1"
+CLIENT_PORT = 47790
+
+# object type, name prefix of the inputs of a simulated device
+SIMULATED_OBJECT_TYPES = (
+    ("analogInput", "ai"),
+    ("binaryInput", "bi"),
+    ("multiStateInput", "msi"),
+)
+
+# result: direction of a regression
+REGRESSION_FIELDS = {
+    "points_per_second": -1,
+    "cycle_p95": 1,
+    "cpu_per_1k_points": 1,
+}
+
+
+def _acquire(local, device_ids):
+    """
+    one acquisition cycle of each device
+    """
+    points = 0
+    for device_id in device_ids:
+        local.request_data(device_id)
+        points += metrics.cycle_timer(local.remote_devices[device_id]).cycles[-1][
+            "points"
+        ]
+    return points
+
+
+# acquisition modes: acquisition_mode of the simulated devices
+ACQUISITION_MODES = {
+    "read": 0,
+    "rpm": 1,
+    "cov": 3,
+}
+
+# seconds of a cycle of the COV mode, the values notified by the simulated
+# devices in this time are stored by the cycle
+COV_CYCLE = 1.0
+
+
+def _point_table(devices, objects, acquisition_mode=0):
+    """
+    create the local device and the simulated remote devices with their
+    variables the way the provisioning does, to be rolled back after the
+    benchmark
+    """
+    local = PyScadaDevice.objects.create(
+        short_name="bacnet-benchmark", protocol_id=PROTOCOL_ID, active=False
+    )
+    BACnetDevice.objects.create(
+        bacnet_device=local,
+        device_type=0,
+        ip_address=CLIENT_IP,
+        mask=8,
+        port=str(CLIENT_PORT),
+    )
+    for n in range(devices):
+        device = PyScadaDevice.objects.create(
+            short_name="bacnet-benchmark-%d" % n, protocol_id=PROTOCOL_ID
+        )
+        device.bacnetdevice = BACnetDevice.objects.create(
+            bacnet_device=device,
+            device_type=1,
+            ip_address=SIMULATOR_IP,
+            port=str(SIMULATOR_PORT + n),
+            bacnet_local_device=local,
+            acquisition_mode=acquisition_mode,
+        )
+        discovered = []
+        for object_type, prefix in SIMULATED_OBJECT_TYPES:
+            for i in range(1, objects + 1):
+                discovered.append(
+                    dict(
+                        object_type=object_type,
+                        object_identifier=i,
+                        object_name="%s-%d" % (prefix, i),
+                        state_texts=(
+                            STATE_TEXTS if object_type == "multiStateInput" else []
+                        ),
+                    )
+                )
+        save_discovered_objects(device.bacnetdevice, discovered)
+        provision_points(device)
+    return local
+
+
+def _local_device(local):
+    """
+    a Device of the DAQ reading the simulated devices, without the discovery
+    """
+    device = PyScadaDevice.objects.select_related("bacnetdevice").get(pk=local.pk)
+    return Device(
+        device,
+        server=BAC0.lite(
+            ip="%s/%d" % (CLIENT_IP, device.bacnetdevice.mask), port=CLIENT_PORT
+        ),
+    )
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))]
+
+
+def measure_acquisition(results, devices, objects, mode="read", cycles=5, timeout=None):
+    """
+    measure the acquisition of the simulated devices, run in a child process
+    to measure the memory of one scenario: the devices and variables are
+    created in a transaction which is rolled back at the end
+    """
+    local_device = None
+    try:
+        with transaction.atomic():
+            local_device = _local_device(
+                _point_table(devices, objects, ACQUISITION_MODES[mode])
+            )
+            if timeout is not None:
+                local_device.read_timeout = timeout
+            variables = len(local_device.variables)
+            device_ids = list(local_device.remote_devices.keys())
+
+            # first cycle: warm up, not measured
+            _acquire(local_device, device_ids)
+            if mode == "cov":
+                # the values notified while the other devices subscribed
+                _acquire(local_device, device_ids)
+            cycle_times = []
+            points_read = 0
+            cpu = process_time()
+            start = time()
+            for i in range(cycles):
+                cycle_start = time()
+                if mode == "cov":
+                    sleep(max(0.0, COV_CYCLE - (cycle_start - start) % COV_CYCLE))
+                    cycle_start = time()
+                points_read += _acquire(local_device, device_ids)
+                cycle_times.append(time() - cycle_start)
+            duration = time() - start
+            cpu = process_time() - cpu
+            transaction.set_rollback(True)
+    except Exception:
+        results.put(dict(error=traceback.format_exc()))
+        return
+    finally:
+        if local_device is not None:
+            local_device._disconnect()
+    results.put(
+        dict(
+            variables=variables,
+            points_read=points_read,
+            duration=duration,
+            cpu=cpu,
+            cycle_times=cycle_times,
+            max_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        )
+    )
+
+
+def _child_result(child, queue):
+    """
+    result put in queue by a child process, None if it stopped without
+    """
+    while True:
+        try:
+            return queue.get(timeout=1.0)
+        except Empty:
+            if not child.is_alive():
+                break
+    try:
+        return queue.get(timeout=1.0)
+    except Empty:
+        return None
+
+
+def run_benchmark(
+    points, devices, mode="read", cycles=5, timeout=None, **simulator_options
+):
+    """
+    measure the acquisition of points from devices simulated in a child
+    process, the acquisition runs in another child process
+
+    in the COV mode a cycle stores the values notified in COV_CYCLE seconds,
+    the points which did not change are not read
+
+    :param timeout: seconds to wait for an answer, default: Device.read_timeout
+    :param simulator_options: options of the DeviceFarm, with the injected
+        faults
+
+    :return: dict of the results, simulator_statistics are the requests
+        received and the faults injected by the simulated devices
+    """
+    if not driver_ok:
+        raise ImportError("bacpypes and BAC0 are needed for the benchmark")
+    objects = max(1, points // devices // 3)
+    ctx = get_context("spawn")
+    ready = ctx.Event()
+    statistics = ctx.Queue()
+    farm = ctx.Process(
+        target=run_farm,
+        args=(ready, statistics),
+        kwargs=dict(
+            devices=devices,
+            ip=SIMULATOR_IP,
+            port=SIMULATOR_PORT,
+            objects=objects,
+            writeable=0,
+            **simulator_options
+        ),
+    )
+    farm.start()
+    try:
+        if not ready.wait(60):
+            raise RuntimeError("the BACnet simulator did not start")
+        queue = ctx.Queue()
+        child = ctx.Process(
+            target=run_with_django,
+            args=("pyscada.bacnet.benchmark.measure_acquisition", queue),
+            kwargs=dict(
+                devices=devices,
+                objects=objects,
+                mode=mode,
+                cycles=cycles,
+                timeout=timeout,
+            ),
+        )
+        child.start()
+        try:
+            result = _child_result(child, queue)
+        finally:
+            child.join()
+    finally:
+        farm.terminate()
+        farm_statistics = _child_result(farm, statistics)
+        farm.join()
+    if result is None:
+        raise RuntimeError("the benchmark process stopped without result")
+    if "error" in result:
+        raise RuntimeError("the benchmark failed :\n%s" % result["error"])
+
+    variables = result["variables"]
+    points_read = result["points_read"]
+    duration = result["duration"]
+    cycle_times = result["cycle_times"]
+    return dict(
+        mode=mode,
+        points=variables,
+        devices=devices,
+        cycles=cycles,
+        points_read=points_read,
+        points_failed=None if mode == "cov" else variables * cycles - points_read,
+        points_per_second=points_read / duration if duration else None,
+        cycle_p50=_percentile(cycle_times, 50),
+        cycle_p95=_percentile(cycle_times, 95),
+        cycle_p99=_percentile(cycle_times, 99),
+        cpu_per_1k_points=(result["cpu"] / points_read * 1000 if points_read else None),
+        max_rss_kb=result["max_rss_kb"],
+        simulator=simulator_options,
+        simulator_statistics=farm_statistics,
+    )
+
+
+def _decoded_value(value):
+    """
+    a property value as received, decoded from its tags
+    """
+    tags = TagList()
+    Any(value).encode(tags)
+    result = Any()
+    result.decode(TagList(tags.tagList))
+    return result
+
+
+def _generic_decode(value, datatype):
+    value = value.cast_out(datatype)
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def decoder_benchmark(iterations=100000):
+    """
+    compare the generic cast of presentValue types with decode_primitive
+
+    :return: list of dicts with the microseconds per value of each decoder
+    """
+    if not driver_ok:
+        raise ImportError("bacpypes and BAC0 are needed for the benchmark")
+    results = []
+    for name, value, datatype in (
+        ("real", Real(21.5), Real),
+        ("enumerated", BinaryPV("active"), BinaryPV),
+        ("boolean", Boolean(True), Boolean),
+        ("unsigned", Unsigned(3), Unsigned),
+    ):
+        value = _decoded_value(value)
+        start = process_time()
+        for i in range(iterations):
+            _generic_decode(value, datatype)
+        generic = process_time() - start
+        start = process_time()
+        for i in range(iterations):
+            decode_primitive(value)
+        fast = process_time() - start
+        results.append(
+            dict(
+                type=name,
+                generic_us=generic / iterations * 1e6,
+                fast_us=fast / iterations * 1e6,
+                speedup=generic / fast if fast else None,
+            )
+        )
+    return results
+
+
+def core_loop_benchmark(duration=10.0, requests=200):
+    """
+    compare the idle cpu and the latencies of the core loops, each stack
+    runs in a child process reading a simulated device
+
+    :return: list of dicts with the idle cpu share and the latency
+        percentiles in seconds of each core loop
+    """
+    if not driver_ok:
+        raise ImportError("bacpypes and BAC0 are needed for the benchmark")
+    ctx = get_context("spawn")
+    ready = ctx.Event()
+    farm = ctx.Process(
+        target=run_farm,
+        args=(ready,),
+        kwargs=dict(
+            devices=1, ip=SIMULATOR_IP, port=SIMULATOR_PORT, objects=1, writeable=0
+        ),
+    )
+    farm.start()
+    results = []
+    try:
+        if not ready.wait(60):
+            raise RuntimeError("the BACnet simulator did not start")
+        for loop in CORE_LOOPS:
+            queue = ctx.Queue()
+            child = ctx.Process(
+                target=measure_core_loop,
+                args=(
+                    loop,
+                    queue,
+                    "%s/8" % CLIENT_IP,
+                    CLIENT_PORT,
+                    "%s:%d" % (SIMULATOR_IP, SIMULATOR_PORT),
+                ),
+                kwargs=dict(duration=duration, requests=requests),
+            )
+            child.start()
+            try:
+                result = queue.get(timeout=duration + requests + 60)
+            finally:
+                child.join()
+            results.append(
+                dict(
+                    loop=loop,
+                    idle_cpu=result["idle_cpu"],
+                    wake_up_p50=_percentile(result["wake_up"], 50),
+                    wake_up_p99=_percentile(result["wake_up"], 99),
+                    request_p50=_percentile(result["request"], 50),
+                    request_p99=_percentile(result["request"], 99),
+                )
+            )
+    finally:
+        farm.terminate()
+        farm.join()
+    return results
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    compare the results with a baseline
+
+    :return: list of the regressions beyond the tolerance
+    """
+    baseline = {(r["name"], r["mode"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = baseline.get((result["name"], result["mode"]))
+        if base is None:
+            continue
+        for field, direction in REGRESSION_FIELDS.items():
+            if result.get(field) is None or not base.get(field):
+                continue
+            change = (result[field] - base[field]) / base[field]
+            if change * direction > tolerance:
+                regressions.append(
+                    "%s %s %s: %.4g, baseline %.4g (%+.1f%%)"
+                    % (
+                        result["name"],
+                        result["mode"],
+                        field,
+                        result[field],
+                        base[field],
+                        change * 100,
+                    )
+                )
+    return regressions
+
+
+def read_results(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def write_results(filename, results):
+    with open(filename, "w") as f:
+        json.dump(results, f, indent=2)
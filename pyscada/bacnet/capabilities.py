@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+try:
+    from bacpypes.basetypes import ServicesSupported, PropertyIdentifier, Segmentation
+
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+
+from pyscada.bacnet.models import BACnetDeviceProperty
+
+from django.conf import settings
+from django.utils.timezone import now
+
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+# properties of the device object describing what a remote device supports,
+# read once and stored as BACnetDeviceProperty
+CAPABILITY_PROPERTIES = (
+    "protocolServicesSupported",
+    "maxApduLengthAccepted",
+    "segmentationSupported",
+    "databaseRevision",
+)
+
+# abort and reject reasons of a request too large for a device, and of a
+# service not supported
+TOO_LARGE_REASONS = (
+    "bufferOverflow",
+    "segmentationNotSupported",
+    "apduTooLong",
+    "windowSizeOutOfRange",
+)
+UNSUPPORTED_REASONS = ("unrecognizedService",)
+
+# stored bit of a service not known, in the protocolServicesSupported of a
+# device rejecting a service before its services were read
+UNKNOWN_BIT = "?"
+
+
+def enumeration_max_age():
+    """
+    seconds the objects enumerated from a device without databaseRevision
+    are used, setting enumeration_max_age, default one day
+    """
+    if hasattr(settings, "PYSCADA_BACNET"):
+        if "enumeration_max_age" in settings.PYSCADA_BACNET:
+            return float(settings.PYSCADA_BACNET["enumeration_max_age"])
+    return 86400.0
+
+
+def objects_cached(bacnet_device, revision, cached_revision):
+    """
+    True if the objects enumerated from a remote device are up to date: its
+    databaseRevision did not change since, or for a device without it, the
+    objects are younger than enumeration_max_age
+
+    :param revision: databaseRevision read from the device, None if the
+        device does not have it
+    :param cached_revision: databaseRevision of the enumerated objects
+    """
+    if bacnet_device.objects_enumerated is None:
+        return False
+    if revision is not None:
+        return cached_revision is not None and int(revision) == cached_revision
+    return now() - bacnet_device.objects_enumerated < timedelta(
+        seconds=enumeration_max_age()
+    )
+
+
+def property_id(name):
+    return PropertyIdentifier.enumerations[name]
+
+
+def encode(name, value):
+    """
+    stored text of a capability property: the bits of the services as 0 and
+    1 in the order of ServicesSupported, the name of the segmentation, else
+    the number
+    """
+    if name == "protocolServicesSupported":
+        return "".join("1" if bit else "0" for bit in list(value))
+    if name == "segmentationSupported" and not isinstance(value, str):
+        for segmentation, number in Segmentation.enumerations.items():
+            if number == int(value):
+                return segmentation
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+class Capabilities:
+    """
+    capabilities of a remote device, from its stored device properties
+    """
+
+    def __init__(self, values=None):
+        # property name: stored text
+        self.values = values or {}
+
+    def __bool__(self):
+        return bool(self.values)
+
+    @classmethod
+    def load(cls, bacnet_device_ids):
+        """
+        capabilities of the remote devices by BACnetDevice id
+        """
+        ids = {property_id(name): name for name in CAPABILITY_PROPERTIES}
+        result = {pk: cls() for pk in bacnet_device_ids}
+        for item in BACnetDeviceProperty.objects.filter(
+            bacnet_device_id__in=list(bacnet_device_ids), property_id__in=list(ids)
+        ):
+            result[item.bacnet_device_id].values[ids[item.property_id]] = item.value
+        return result
+
+    @staticmethod
+    def save(bacnet_device, values):
+        """
+        store the capability properties read from a remote device
+        """
+        for name, value in values.items():
+            BACnetDeviceProperty.objects.update_or_create(
+                bacnet_device=bacnet_device,
+                property_id=property_id(name),
+                defaults=dict(value=encode(name, value)[:200]),
+            )
+
+    def store(self, bacnet_device, names):
+        """
+        store the values of names, already encoded
+        """
+        for name in names:
+            BACnetDeviceProperty.objects.update_or_create(
+                bacnet_device=bacnet_device,
+                property_id=property_id(name),
+                defaults=dict(value=self.values[name][:200]),
+            )
+
+    def supports(self, service):
+        """
+        True or False when the device lists its services, None when unknown
+        """
+        bits = self.values.get("protocolServicesSupported")
+        if not bits:
+            return None
+        position = ServicesSupported.bitNames.get(service)
+        if position is None or position >= len(bits):
+            return False
+        if bits[position] == UNKNOWN_BIT:
+            return None
+        return bits[position] == "1"
+
+    def reject(self, service):
+        """
+        record a service the device rejected, by clearing it in
+        protocolServicesSupported, the services of a device whose services
+        are not known stay unknown
+        """
+        bits = list(
+            self.values.get("protocolServicesSupported")
+            or UNKNOWN_BIT * ServicesSupported.bitLen
+        )
+        bits[ServicesSupported.bitNames[service]] = "0"
+        self.values["protocolServicesSupported"] = "".join(bits)
+
+    def limit(self, max_apdu):
+        """
+        record the size limit of the answers of a device, which does not
+        send segmented answers either
+        """
+        self.values["maxApduLengthAccepted"] = str(max_apdu)
+        self.values["segmentationSupported"] = {
+            "segmentedBoth": "segmentedReceive",
+            "segmentedTransmit": "noSegmentation",
+        }.get(self.segmentation, self.segmentation or "noSegmentation")
+
+    @property
+    def max_apdu(self):
+        try:
+            return int(self.values["maxApduLengthAccepted"])
+        except (KeyError, ValueError):
+            return None
+
+    @property
+    def segmentation(self):
+        return self.values.get("segmentationSupported")
+
+    @property
+    def database_revision(self):
+        try:
+            return int(self.values["databaseRevision"])
+        except (KeyError, ValueError):
+            return None
+
+    def acquisition(self):
+        """
+        acquisition strategy of a device in the automatic acquisition mode:
+        "read_multiple" when ReadPropertyMultiple is supported, else "read",
+        "read" too when the capabilities are unknown
+        """
+        if self.supports("readPropertyMultiple"):
+            return "read_multiple"
+        return "read"
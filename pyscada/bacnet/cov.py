@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+try:
+    from bacpypes.apdu import SubscribeCOVRequest
+    from BAC0.core.functions.cov import SubscriptionContext
+
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+
+from pyscada.bacnet.decoders import decode_value
+
+from django.conf import settings
+
+from collections import deque
+from time import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# object types notifying the changes of their presentValue
+COV_OBJECT_TYPES = (
+    "analogInput",
+    "analogOutput",
+    "analogValue",
+    "binaryInput",
+    "binaryOutput",
+    "binaryValue",
+    "multiStateInput",
+    "multiStateOutput",
+    "multiStateValue",
+)
+
+# error codes and reject reasons of a subscription the device refuses, the
+# object is polled instead
+REFUSED_REASONS = (
+    "covSubscriptionFailed",
+    "optionalFunctionalityNotSupported",
+    "serviceRequestDenied",
+    "unrecognizedService",
+    "unknownObject",
+    "resourcesOtherwise",
+)
+
+# values kept per subscription between two cycles of its device
+MAX_QUEUED_VALUES = 1000
+
+
+def cov_lifetime():
+    """
+    lifetime in seconds of the COV subscriptions to the remote devices,
+    setting cov_lifetime, default 5 minutes, they are renewed after half of
+    it
+    """
+    if hasattr(settings, "PYSCADA_BACNET"):
+        if "cov_lifetime" in settings.PYSCADA_BACNET:
+            return int(settings.PYSCADA_BACNET["cov_lifetime"])
+    return 300
+
+
+def subscribable(reference):
+    """
+    True if the value of a read reference can be received by a COV
+    subscription: the presentValue of an object type notifying its changes
+    """
+    return (
+        reference.property_id == "presentValue"
+        and reference.array_index is None
+        and reference.object_type in COV_OBJECT_TYPES
+    )
+
+
+def context_callback(elements):
+    """
+    no-op, BAC0 requires a callback for each subscription context, the
+    notifications are handled by Subscription.cov_notification
+    """
+    return None
+
+
+if driver_ok:
+
+    class Subscription(SubscriptionContext):
+        """
+        unconfirmed COV subscription to the presentValue of a remote object,
+        registered in the subscription contexts of the BAC0 application
+
+        the stack passes the notifications to cov_notification, the values
+        are queued with their time until the cycle of the device
+        """
+
+        def __init__(self, reference, lifetime):
+            SubscriptionContext.__init__(
+                self,
+                reference.address,
+                (reference.object_type, reference.object_instance),
+                confirmed=False,
+                lifetime=lifetime,
+            )
+            self.reference = reference
+            # time the subscription has to be renewed, 0 to send it
+            self.renew = 0.0
+            self.values = deque(maxlen=MAX_QUEUED_VALUES)
+
+        def request(self, cancel=False):
+            """
+            SubscribeCOV request of the subscription, a cancel request
+            without lifetime
+            """
+            request = SubscribeCOVRequest(
+                subscriberProcessIdentifier=self.subscriberProcessIdentifier,
+                monitoredObjectIdentifier=self.monitoredObjectIdentifier,
+            )
+            request.pduDestination = self.address
+            if not cancel:
+                request.issueConfirmedNotifications = False
+                request.lifetime = self.lifetime
+            return request
+
+        def cov_notification(self, apdu):
+            properties = {}
+            for element in apdu.listOfValues:
+                if element.propertyIdentifier != self.reference.property_id:
+                    continue
+                try:
+                    value = decode_value(
+                        element.value,
+                        self.reference.datatype,
+                        self.reference.object_type,
+                        self.reference.property_id,
+                    )
+                except Exception as e:
+                    logger.info("COV notification of %s : %s" % (self.reference, e))
+                    continue
+                self.values.append((time(), value))
+                properties[element.propertyIdentifier] = value
+            return {
+                "source": apdu.pduSource,
+                "object_changed": apdu.monitoredObjectIdentifier,
+                "properties": properties,
+            }
+
+        def pop(self):
+            """
+            values notified since the last call, list of (time, value)
+            """
+            values = []
+            while self.values:
+                values.append(self.values.popleft())
+            return values
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+try:
+    from bacpypes.primitivedata import Tag
+    from BAC0.core.io.Read import cast_datatype_from_tag
+
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+
+from struct import Struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+_real = Struct(">f")
+_double = Struct(">d")
+
+
+def _boolean(tag):
+    return float(tag.tagLVT)
+
+
+def _unsigned(tag):
+    return float(int.from_bytes(tag.tagData, "big"))
+
+
+def _integer(tag):
+    return float(int.from_bytes(tag.tagData, "big", signed=True))
+
+
+def _real_value(tag):
+    return _real.unpack(tag.tagData)[0]
+
+
+def _double_value(tag):
+    return _double.unpack(tag.tagData)[0]
+
+
+# application tag number (boolean, unsigned, integer, real, double,
+# enumerated): (decoder, expected length of the data or None)
+DECODERS = {
+    1: (_boolean, 0),
+    2: (_unsigned, None),
+    3: (_integer, None),
+    4: (_real_value, 4),
+    5: (_double_value, 8),
+    9: (_unsigned, None),
+}
+
+
+def decode_primitive(value):
+    """
+    decode a property value (bacpypes Any) holding a single boolean,
+    unsigned, integer, real, double or enumerated application tag straight
+    from its bytes
+
+    :return: the value as float, None for other values
+    """
+    tags = value.tagList.tagList
+    if len(tags) != 1:
+        return None
+    tag = tags[0]
+    if tag.tagClass != Tag.applicationTagClass:
+        return None
+    decoder = DECODERS.get(tag.tagNumber)
+    if decoder is None:
+        return None
+    decode, length = decoder
+    if length is not None and len(tag.tagData) != length:
+        return None
+    if length is None and not 0 < len(tag.tagData) <= 8:
+        return None
+    return decode(tag)
+
+
+def decode_value(value, datatype, object_type=None, property_id=None):
+    """
+    decode a property value, primitive numbers with decode_primitive and
+    other values with the generic bacpypes cast
+
+    :param datatype: bacpypes datatype of the property, None when unknown
+    """
+    result = decode_primitive(value)
+    if result is not None:
+        return result
+    if datatype is None:
+        return cast_datatype_from_tag(value, object_type, property_id)
+    return value.cast_out(datatype)
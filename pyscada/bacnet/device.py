@@ -6,11 +6,12 @@ import pyscada
 try:
     from bacpypes.consolelogging import ConfigArgumentParser
 
-    from bacpypes.core import run, stop, enable_sleeping
+    from bacpypes.core import run, stop, enable_sleeping, deferred
 
     from bacpypes.pdu import Address, GlobalBroadcast
     from bacpypes.apdu import WhoIsRequest, IAmRequest, SimpleAckPDU, Error
     from bacpypes.apdu import ReadPropertyMultipleRequest, PropertyReference
+    from bacpypes.apdu import ReadPropertyRequest, ReadPropertyACK
     from bacpypes.apdu import (
         ReadAccessSpecification,
         ReadPropertyMultipleACK,
@@ -29,14 +30,25 @@ try:
     from bacpypes.errors import ExecutionError
 
     import BAC0
+    from BAC0.core.io.Read import find_reason
+    from BAC0.core.io.IOExceptions import (
+        NoResponseFromController,
+        UnknownObjectError,
+        UnknownPropertyError,
+    )
+    from pyscada.bacnet.cov import Subscription
 
     driver_ok = True
 except ImportError:
     driver_ok = False
 
+from collections import deque, namedtuple
+from datetime import timedelta
+from functools import lru_cache
 from math import isnan, isinf
 from time import time, sleep
 import sys
+import json
 import traceback
 
 from threading import Thread
@@ -44,10 +56,39 @@ import random
 
 
 from pyscada.utils.scheduler import MultiDeviceDAQProcess
-from pyscada.models import Variable
+from pyscada.models import Variable, BackgroundProcess
 from pyscada.models import Device as PyScadaDevice
 from pyscada.bacnet import PROTOCOL_ID
-from pyscada.bacnet.models import BACnetDevice
+from pyscada.bacnet.models import BACnetDevice, BACnetVariable, BACnetTrendLog
+from pyscada.bacnet.models import BACnetQuarantinedReference
+from pyscada.bacnet.points import save_discovered_objects
+from pyscada.bacnet.metrics import metrics, device_labels, CycleProfiler
+from pyscada.bacnet.decoders import decode_value
+from pyscada.bacnet.quality import QUALITY_PROPERTIES, quality_bits, is_bad
+from pyscada.bacnet.trendlog import backfill
+from pyscada.bacnet.stack import Stack
+from pyscada.bacnet.routing import Route, route_key, router_address
+from pyscada.bacnet.capabilities import (
+    CAPABILITY_PROPERTIES,
+    TOO_LARGE_REASONS,
+    UNSUPPORTED_REASONS,
+    Capabilities,
+    objects_cached,
+)
+from pyscada.bacnet.quarantine import (
+    RECHECKS_PER_PASS,
+    error_code,
+    is_permanent,
+    quarantine_recheck,
+)
+from pyscada.bacnet.cov import (
+    REFUSED_REASONS,
+    context_callback,
+    cov_lifetime,
+    subscribable,
+)
+
+from django.utils.timezone import now
 
 import logging
 
@@ -56,6 +97,95 @@ logger = logging.getLogger(__name__)
 _debug = 1
 
 
+@lru_cache(maxsize=1024)
+def _get_datatype(object_type, property_id):
+    """
+    memoized get_datatype, the datatype only depends on the object type and
+    the property
+    """
+    return get_datatype(object_type, property_id)
+
+
+@lru_cache(maxsize=256)
+def _get_object_class(object_type):
+    """
+    memoized get_object_class
+    """
+    return get_object_class(object_type)
+
+
+@lru_cache(maxsize=1024)
+def _is_property(property_id):
+    return property_id in PropertyIdentifier.enumerations
+
+
+@lru_cache(maxsize=1024)
+def _property_name(property_id):
+    """
+    name of a property identifier number
+    """
+    for name, value in PropertyIdentifier.enumerations.items():
+        if value == property_id:
+            return name
+    raise ValueError("unknown property %s" % property_id)
+
+
+@lru_cache(maxsize=1024)
+def _reference_datatype(object_type, property_id, array_index=None):
+    """
+    datatype of a property, or of an element when an array index is given
+    """
+    datatype = _get_datatype(object_type, property_id)
+    if datatype is None or array_index is None or not issubclass(datatype, Array):
+        return datatype
+    if array_index == 0:
+        return Unsigned
+    return datatype.subtype
+
+
+class ReadReference(
+    namedtuple(
+        "ReadReference",
+        "address object_type object_instance property_id array_index datatype",
+    )
+):
+    """
+    validated reference of a property read by the poll plan, the address is
+    a bacpypes Address and the datatype is None when it is not known
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        reference = "%s %s %s %s" % (
+            self.address,
+            self.object_type,
+            self.object_instance,
+            self.property_id,
+        )
+        if self.array_index is not None:
+            reference += " %d" % self.array_index
+        return reference
+
+
+# read requests of a cycle: the references read once and the variables
+# (variable, references, indexes in the request, quality variables) they
+# are fanned out to
+PollRequest = namedtuple("PollRequest", "references entries")
+
+# a request of the poll plan waiting for its answer: iocb is the exception
+# when the request could not be sent
+SentRequest = namedtuple("SentRequest", "device_id request iocb start")
+
+
+def _completed(iocb):
+    """
+    IOCB callback: time of the answer, the DAQ may wait for other requests
+    before it reads the answer
+    """
+    iocb.completed = time()
+
+
 class Server:
     """
     BACnet Server that implements all communication over IP
@@ -231,12 +361,12 @@ class BIPApplication(BIPSimpleApplication):
                     pass
                 elif obj_type.isdigit():
                     obj_type = int(obj_type)
-                elif not get_object_class(obj_type):
+                elif not _get_object_class(obj_type):
                     raise ValueError("unknown object type")
 
                 prop_reference_list = []
                 for prop_id, idx in props:
-                    if prop_id not in PropertyIdentifier.enumerations:
+                    if not _is_property(prop_id):
                         break
 
                     if prop_id in ("all", "required", "optional"):
@@ -244,7 +374,7 @@ class BIPApplication(BIPSimpleApplication):
                     else:
                         logger.debug(obj_type)
                         logger.debug(prop_id)
-                        datatype = get_datatype(obj_type, prop_id)
+                        datatype = _get_datatype(obj_type, prop_id)
                         if not datatype:
                             raise ValueError("invalid property for object type")
 
@@ -460,7 +590,7 @@ class BIPApplication(BIPSimpleApplication):
                     propertyValue = readResult.propertyValue
 
                     # find the datatype
-                    datatype = get_datatype(objectIdentifier[0], propertyIdentifier)
+                    datatype = _get_datatype(objectIdentifier[0], propertyIdentifier)
                     if _debug:
                         logger.debug("    - datatype: %r", datatype)
                     if not datatype:
@@ -487,31 +617,111 @@ class Device:
     BACNet device (Master)
     """
 
-    def __init__(self, device):
+    # seconds to wait for the answer of a request
+    read_timeout = 10
+    # ReadPropertyMultiple requests are split to keep the estimated size of
+    # their answers below rpm_max_apdu bytes
+    rpm_max_apdu = 480
+    rpm_header_size = 8
+    rpm_object_size = 7
+    rpm_property_size = 10
+    # largest answer accepted by the local BAC0 device, in one segment
+    local_max_apdu = 1024
+    # subscription requests to a device waiting for their answers at the
+    # same time
+    cov_max_in_flight = 8
+
+    def __init__(self, device, remote_device_ids=None, shard=None, server=None):
+        """
+        :param server: BAC0 application of the caller used instead of the
+            stack of the local device, the remote devices are not discovered
+        """
         self.device = device
         self._device_not_accessible = 0
         self.variables = {}
+        self.remote_devices = {}
+        self.remote_device_ids = remote_device_ids
+        self._poll_plan = {}
+        self._quality_variables = {}
+        self._profilers = {}
+        # trend logs by device, devices to backfill and devices not answering
+        self._trend_logs = {}
+        self._backfill_pending = set()
+        self._offline = set()
+        # objects of the variables served by the local device
+        self.exported = None
+        self.stack = None
+        self.shard = 0
+        # routes to the remote devices behind routers by route key
+        self._routes = {}
+        # quarantined references by variable id and property name
+        self._quarantine = {}
+        self._plan_outdated = False
+        # capabilities of the remote devices by device id, with the
+        # rejected services and the size limits learned
+        self._capabilities = {}
+        # references received by COV by device id, their subscriptions and
+        # the references whose subscription was refused
+        self._cov_plan = {}
+        self._subscriptions = {}
+        self._cov_refused = set()
 
         if not driver_ok:
             logger.warning("Bacnet driver not loaded. Install bacpypes and BAC0.")
             self.server = None
             return
 
-        if self.device.bacnetdevice.device_type == 0:
+        if server is not None:
+            self.server = server
+        elif self.device.bacnetdevice.device_type == 0:
+            remote_devices_qs = self._remote_devices_queryset()
+            if shard is not None:
+                self.shard = shard
+            elif remote_device_ids is not None:
+                # only handle the remote devices of the shard of this process
+                for dev in remote_devices_qs:
+                    self.shard = self.device.bacnetdevice.shard_index(
+                        dev.bacnet_device.pk
+                    )
+                    break
+            bacnetdevice = self.device.bacnetdevice
+            bbmd_address = bacnetdevice.bbmd_address or None
+            bdtable = bacnetdevice.bdt_entries() or None
+            if bdtable and self.shard > 0:
+                # the other shards receive the forwarded broadcasts from the
+                # BBMD of the first shard
+                bbmd_address = "%s:%s" % (bacnetdevice.ip_address, bacnetdevice.port)
+                bdtable = None
             try:
-                self.server = BAC0.lite(
-                    ip=str(self.device.bacnetdevice.ip_address)
-                    + "/"
-                    + str(self.device.bacnetdevice.mask),
-                    port=self.device.bacnetdevice.port,
-                )
-                self.device.bacnetdevice.remote_devices_discovered = "Discovering"
-                BACnetDevice.objects.bulk_update(
-                    [self.device.bacnetdevice], ["remote_devices_discovered"]
+                self.stack = Stack.get(
+                    self.device.pk,
+                    bacnetdevice.ip_address,
+                    bacnetdevice.mask,
+                    int(bacnetdevice.port) + self.shard,
+                    bbmdAddress=bbmd_address,
+                    bbmdTTL=bacnetdevice.bbmd_ttl if bbmd_address else 0,
+                    bdtable=bdtable,
                 )
-                self.server.discover(networks="known")
-                remote_devices = self.server.devices
+                self.server = self.stack.server
+                self._wait_registration()
+                if self.shard == 0:
+                    # only the first shard serves the exported variables
+                    self.exported = self.stack.exported_objects()
+                    self.device.bacnetdevice.remote_devices_discovered = "Discovering"
+                    BACnetDevice.objects.bulk_update(
+                        [self.device.bacnetdevice], ["remote_devices_discovered"]
+                    )
+                remote_devices = self.stack.discover(self.device)
                 if type(remote_devices) == list:
+                    metrics.set(
+                        "bacnet_discovered_devices",
+                        len(remote_devices),
+                        device_labels(self.device),
+                    )
+                if self.shard > 0:
+                    # only the first shard reports the discovered devices
+                    pass
+                elif type(remote_devices) == list:
                     _remote_devices = ""
                     for d in remote_devices:
                         _remote_devices += str(d) + "\n"
@@ -530,41 +740,12 @@ class Device:
                     BACnetDevice.objects.bulk_update(
                         [self.device.bacnetdevice], ["remote_devices_discovered"]
                     )
-                _remotes = []
-                for remote in remote_devices:
-                    if len(remote) == 4:
-                        r = BACnetDevice.objects.filter(
-                            bacnet_local_device=self.device, ip_address=remote[2]
-                        )
-                        if len(r) > 1:
-                            logger.info("BACnet remote device duplicated : %s" % r)
-                        elif len(r) == 0:
-                            continue
-                        else:
-                            r = r.first()
-                            dev = BAC0.device(
-                                remote[2],
-                                int(remote[3]),
-                                self.server,
-                                history_size=None,
-                                poll=0,
-                                auto_save=False,
-                            )
-                            dev.update_bacnet_properties()
-                            # logger.debug(dev.properties.objects_list)
-                            _variables = ""
-                            for v in dev.properties.objects_list:
-                                _variables += str(v) + "\n"
-                            r.remote_devices_variables = _variables[
-                                : BACnetDevice._meta.get_field(
-                                    "remote_devices_variables"
-                                ).max_length
-                            ]
-                            _remotes.append(r)
-                            dev.disconnect(save_on_disconnect=False)
-                BACnetDevice.objects.bulk_update(_remotes, ["remote_devices_variables"])
+                self._discover_remotes(remote_devices, remote_devices_qs)
 
             except BAC0.core.io.IOExceptions.InitializationError as e:
+                if self.stack is not None:
+                    self.stack.release(self.device.pk)
+                    self.stack = None
                 self.server = None
                 logger.warning(e)
 
@@ -573,20 +754,666 @@ class Device:
             #        logger.error("device with id: %d is not accessible" % self.device.pk)
             #    self._device_not_accessible -= 1
 
+        self._load_point_table()
+
+    def _discover_remotes(self, remote_devices, remote_devices_qs):
+        """
+        read the capabilities of the discovered devices configured in
+        remote_devices_qs and enumerate their objects unless they are up to
+        date
+
+        :param remote_devices: result of the discovery, (name, vendor,
+            address, instance) of the devices
+        """
+        _remotes = []
+        capabilities = Capabilities.load(remote_devices_qs.values_list("pk", flat=True))
+        for remote in remote_devices:
+            if len(remote) == 4:
+                r = self._match_remote(remote_devices_qs, str(remote[2]))
+                if len(r) > 1:
+                    logger.info("BACnet remote device duplicated : %s" % r)
+                elif len(r) == 0:
+                    continue
+                else:
+                    r = r.first()
+                    if r.network_number is not None:
+                        r.router_address = (
+                            router_address(
+                                self.server.this_application,
+                                r.network_number,
+                            )
+                            or ""
+                        )
+                    _remotes.append(r)
+                    if capabilities.get(r.pk):
+                        cached_revision = capabilities[r.pk].database_revision
+                        values = self._read_device_properties(
+                            r, remote[2], int(remote[3]), ("databaseRevision",)
+                        )
+                    else:
+                        # read once, kept by the BACnet device properties
+                        cached_revision = None
+                        values = self._read_capabilities(r, remote[2], int(remote[3]))
+                    revision = values.get("databaseRevision")
+                    if objects_cached(r, revision, cached_revision):
+                        logger.debug("%s : objects not changed" % r)
+                        continue
+                    self._enumerate_objects(r, remote[2], int(remote[3]))
+                    r.objects_enumerated = now()
+                    if revision is not None:
+                        # revision of the enumerated objects
+                        Capabilities.save(r, {"databaseRevision": revision})
+        BACnetDevice.objects.bulk_update(
+            _remotes,
+            [
+                "remote_devices_variables",
+                "router_address",
+                "objects_enumerated",
+            ],
+        )
+
+    def _wait_registration(self, timeout=5.0):
+        """
+        wait for the BBMD to accept the foreign device registration, the
+        broadcasts of the discovery are dropped until then
+        """
+        bip = self.server.this_application.bip
+        if not hasattr(bip, "registrationStatus"):
+            return
+        start = time()
+        while bip.registrationStatus != 0 and time() - start < timeout:
+            sleep(0.05)
+        if not self._update_registration():
+            logger.warning(
+                "%s : foreign device registration to %s failed, status %s"
+                % (self.device, bip.bbmdAddress, bip.registrationStatus)
+            )
+
+    def _update_registration(self):
+        """
+        export the foreign device registration status, renewed by the stack
+        every bbmd_ttl seconds
+
+        :return: True when registered or not a foreign device
+        """
+        bip = self.server.this_application.bip
+        if not hasattr(bip, "registrationStatus"):
+            return True
+        registered = bip.registrationStatus == 0
+        metrics.set(
+            "bacnet_foreign_device_registered",
+            int(registered),
+            device_labels(self.device),
+        )
+        return registered
+
+    @staticmethod
+    def _discovered_objects(dev):
+        """
+        objects of a BAC0 remote device with the name, units and state texts
+        read during the discovery
+        """
+        objects = []
+        for point in dev.points:
+            units_state = point.properties.units_state
+            if isinstance(units_state, str):
+                units, state_texts = units_state, []
+            elif units_state:
+                units, state_texts = "", [str(t) for t in units_state]
+            else:
+                units, state_texts = "", []
+            objects.append(
+                dict(
+                    object_type=point.properties.type,
+                    object_identifier=point.properties.address,
+                    object_name=point.properties.name,
+                    description=point.properties.description,
+                    units=units,
+                    state_texts=state_texts,
+                )
+            )
+        return objects
+
+    def _enumerate_objects(self, bacnet_device, address, instance):
+        """
+        read the object list of a remote device and the metadata of its
+        objects, kept as discovered objects
+        """
+        start = time()
+        dev = BAC0.device(
+            address,
+            instance,
+            self.server,
+            history_size=None,
+            poll=0,
+            auto_save=False,
+        )
+        dev.update_bacnet_properties()
+        metrics.request(bacnet_device.bacnet_device, "discovery", time() - start)
+        # logger.debug(dev.properties.objects_list)
+        _variables = ""
+        for v in dev.properties.objects_list:
+            _variables += str(v) + "\n"
+        bacnet_device.remote_devices_variables = _variables[
+            : BACnetDevice._meta.get_field("remote_devices_variables").max_length
+        ]
+        save_discovered_objects(bacnet_device, self._discovered_objects(dev))
+        try:
+            dev.disconnect(save_on_disconnect=False)
+        except ValueError as e:
+            # BAC0 switches the disconnected device to its database, there
+            # is none
+            logger.debug("%s : %s" % (bacnet_device, e))
+
+    def _read_capabilities(self, bacnet_device, address, instance):
+        """
+        read the capability properties of the device object of a remote
+        device and store them
+        """
+        values = self._read_device_properties(
+            bacnet_device, address, instance, CAPABILITY_PROPERTIES
+        )
+        Capabilities.save(bacnet_device, values)
+        return values
+
+    def _read_device_properties(self, bacnet_device, address, instance, names):
+        """
+        read properties of the device object of a remote device, a property
+        the device does not have is skipped
+        """
+        values = {}
+        for name in names:
+            reference = ReadReference(
+                Address(str(address)),
+                "device",
+                instance,
+                name,
+                None,
+                _reference_datatype("device", name),
+            )
+            start = time()
+            try:
+                values[name] = self._read_property(
+                    reference, metrics.cycle_timer(bacnet_device.bacnet_device)
+                )
+            except Exception as e:
+                metrics.request(
+                    bacnet_device.bacnet_device, "discovery", time() - start, e
+                )
+                logger.info("%s : %s not read : %s" % (bacnet_device, name, e))
+                continue
+            metrics.request(bacnet_device.bacnet_device, "discovery", time() - start)
+        return values
+
+    @staticmethod
+    def _match_remote(queryset, address):
+        """
+        remote devices of queryset configured with the address of a
+        discovered device: ip and port, or network and mac behind a router
+        """
+        try:
+            addr = Address(address)
+        except ValueError:
+            return queryset.none()
+        if addr.addrType == Address.remoteStationAddr:
+            return queryset.filter(
+                network_number=addr.addrNet, mac_address=address.partition(":")[2]
+            )
+        ip, _, port = address.partition(":")
+        r = queryset.filter(ip_address=ip, network_number__isnull=True)
+        if port:
+            r = r.filter(port=port)
+        return r
+
+    def _remote_devices_queryset(self):
+        """
+        active remote devices handled by this local device
+        """
+        qs = self.device.bacnet_remote_devices.filter(
+            bacnet_device__active=1
+        ).select_related("bacnet_device")
+        if self.remote_device_ids is not None:
+            qs = qs.filter(bacnet_device__pk__in=self.remote_device_ids)
+        return qs
+
+    @staticmethod
+    def _variable_signature(variable):
+        """
+        values of the configuration of a variable, used to detect changes
+        """
+        signature = [
+            getattr(variable, f.attname) for f in Variable._meta.concrete_fields
+        ]
+        signature += [
+            getattr(variable.bacnetvariable, f.attname)
+            for f in BACnetVariable._meta.concrete_fields
+        ]
+        signature += [
+            variable.device.bacnetdevice.ip_address,
+            variable.device.bacnetdevice.port,
+        ]
+        return signature
+
+    def _load_point_table(self):
+        """
+        (re)load the active variables handled by this device, unchanged
+        variables keep their instance and with it their cached values
+        """
+        if self.device.bacnetdevice.device_type == 0:
             self.remote_devices = {}
-            for dev in self.device.bacnet_remote_devices.filter(
-                bacnet_device__active=1
-            ):
+            for dev in self._remote_devices_queryset():
                 self.remote_devices[dev.bacnet_device.pk] = dev.bacnet_device
-                for var in dev.bacnet_device.variable_set.filter(active=1):
-                    if not hasattr(var, "bacnetvariable"):
-                        continue
-                    self.variables[var.pk] = var
+            capabilities = Capabilities.load(
+                [device.bacnetdevice.pk for device in self.remote_devices.values()]
+            )
+            self._capabilities = {
+                device_id: capabilities[device.bacnetdevice.pk]
+                for device_id, device in self.remote_devices.items()
+            }
+            variables_qs = Variable.objects.filter(
+                device_id__in=list(self.remote_devices.keys())
+            )
         else:
-            for var in self.device.variable_set.filter(active=1):
-                if not hasattr(var, "bacnetvariable"):
-                    continue
-                self.variables[var.pk] = var
+            variables_qs = Variable.objects.filter(device=self.device)
+        variables = {}
+        for var in variables_qs.filter(
+            active=1, bacnetvariable__isnull=False
+        ).select_related("bacnetvariable", "device__bacnetdevice"):
+            if var.pk in self.variables and self._variable_signature(
+                self.variables[var.pk]
+            ) == self._variable_signature(var):
+                var = self.variables[var.pk]
+            variables[var.pk] = var
+        self.variables = variables
+        self._load_quarantine()
+        self._build_poll_plan()
+        self._update_profilers()
+        self._load_trend_logs()
+        if self.exported is not None:
+            self.exported.load(self.device)
+
+    def _load_quarantine(self):
+        """
+        (re)load the quarantined references of the variables, they are not
+        read by the poll plan
+        """
+        self._quarantine = {}
+        for entry in BACnetQuarantinedReference.objects.filter(
+            bacnet_variable__bacnet_variable_id__in=list(self.variables.keys())
+        ).select_related("bacnet_variable"):
+            self._quarantine.setdefault(entry.bacnet_variable.bacnet_variable_id, {})[
+                entry.property_name
+            ] = entry
+        self._update_quarantine_metric()
+
+    def _update_quarantine_metric(self):
+        metrics.set(
+            "bacnet_quarantined_references",
+            sum(len(entries) for entries in self._quarantine.values()),
+            device_labels(self.device),
+        )
+
+    def _load_trend_logs(self):
+        """
+        (re)load the active trend logs of the variables, the devices of new
+        trend logs are backfilled in their next cycle
+        """
+        loaded = set(
+            trend_log.pk
+            for trend_logs in self._trend_logs.values()
+            for trend_log in trend_logs
+        )
+        self._trend_logs = {}
+        for trend_log in BACnetTrendLog.objects.filter(
+            active=True,
+            bacnet_variable__bacnet_variable__active=True,
+            bacnet_variable__bacnet_variable__device_id__in=list(
+                self.remote_devices.keys()
+            )
+            or [self.device.pk],
+        ).select_related("bacnet_variable__bacnet_variable__device__bacnetdevice"):
+            device_id = trend_log.bacnet_variable.bacnet_variable.device_id
+            self._trend_logs.setdefault(device_id, []).append(trend_log)
+            if trend_log.pk not in loaded:
+                self._backfill_pending.add(device_id)
+
+    @staticmethod
+    def address(bacnet_device):
+        """
+        BACnet/IP address of a remote device, the port is only added when it
+        is not the default port, network:mac for a device behind a router
+        """
+        if bacnet_device.network_number is not None:
+            return "%d:%s" % (bacnet_device.network_number, bacnet_device.mac_address)
+        if str(bacnet_device.port) in ("", "47808"):
+            return str(bacnet_device.ip_address)
+        return "%s:%s" % (bacnet_device.ip_address, bacnet_device.port)
+
+    def _references(self, item, address, quarantined=False):
+        """
+        validated read references of a variable, the mapped property first
+        and the quality properties when they are needed, without the
+        quarantined quality properties
+
+        :param quarantined: include the quarantined properties
+        """
+        object_type = item.bacnetvariable.object_type_choises[
+            item.bacnetvariable.object_type
+        ][1]
+        if not _get_object_class(object_type):
+            raise ValueError("unknown object type %s" % object_type)
+        properties = [
+            (
+                _property_name(item.bacnetvariable.property_id),
+                item.bacnetvariable.property_array_index,
+            )
+        ]
+        if (
+            item.bacnetvariable.read_quality
+            or item.bacnetvariable.discard_bad_quality
+            or item.bacnetvariable.pk in self._quality_variables
+        ):
+            properties += [(property_id, None) for property_id in QUALITY_PROPERTIES]
+        if item.bacnetvariable.read_quality == 2:
+            properties.append(("outOfService", None))
+        if not quarantined and item.pk in self._quarantine:
+            properties = properties[:1] + [
+                (property_id, array_index)
+                for property_id, array_index in properties[1:]
+                if property_id not in self._quarantine[item.pk]
+            ]
+        return tuple(
+            ReadReference(
+                address,
+                object_type,
+                item.bacnetvariable.object_identifier,
+                property_id,
+                array_index,
+                _reference_datatype(object_type, property_id, array_index),
+            )
+            for property_id, array_index in properties
+        )
+
+    def _build_poll_plan(self):
+        """
+        precompute the validated read references of the point table, grouped
+        by the device the variables belong to and split into the requests of
+        a cycle
+
+        the properties of an object are read with one ReadPropertyMultiple
+        request, ReadPropertyMultiple devices pack several objects in a
+        request, the present values of the COV devices are received by
+        subscriptions
+        """
+        self._quality_variables = {}
+        for item in self.variables.values():
+            if item.bacnetvariable.quality_of_id is not None:
+                self._quality_variables.setdefault(
+                    item.bacnetvariable.quality_of_id, []
+                ).append(item)
+
+        addresses = {}
+        objects = {}
+        cov_plan = {}
+        for item in self.variables.values():
+            if item.bacnetvariable.quality_of_id is not None:
+                continue
+            if _property_name(item.bacnetvariable.property_id) in (
+                self._quarantine.get(item.pk, ())
+            ):
+                continue
+            address = self.address(item.device.bacnetdevice)
+            try:
+                if address not in addresses:
+                    addresses[address] = Address(address)
+                references = self._references(item, addresses[address])
+            except (ValueError, IndexError) as e:
+                logger.warning("%s is not read : %s" % (item, e))
+                continue
+            if (
+                len(references) == 1
+                and self._cov(item.device_id)
+                and subscribable(references[0])
+                and references[0] not in self._cov_refused
+            ):
+                cov_plan.setdefault(item.device_id, {}).setdefault(
+                    references[0], []
+                ).append(item)
+                continue
+            objects.setdefault(
+                (
+                    item.device_id,
+                    address,
+                    references[0].object_type,
+                    references[0].object_instance,
+                ),
+                [],
+            ).append(
+                (
+                    item,
+                    references,
+                    self._quality_variables.get(item.bacnetvariable.pk, []),
+                )
+            )
+
+        self._poll_plan = {}
+        sizes = {}
+        duplicates = 0
+        for (device_id, address, _, _), entries in objects.items():
+            requests = self._poll_plan.setdefault(device_id, [])
+            size = self.rpm_object_size + self.rpm_property_size * len(
+                set(
+                    reference
+                    for _, references, _ in entries
+                    for reference in references
+                )
+            )
+            if (
+                self._acquisition(device_id) == "read_multiple"
+                and requests
+                and requests[-1].references[0].address == addresses[address]
+                and sizes[device_id] + size <= self._max_apdu(device_id)
+            ):
+                request = requests[-1]
+                sizes[device_id] += size
+            else:
+                request = PollRequest([], [])
+                requests.append(request)
+                sizes[device_id] = self.rpm_header_size + size
+            # identical references of several variables are read once
+            positions = {reference: i for i, reference in enumerate(request.references)}
+            for item, references, quality_variables in entries:
+                indexes = []
+                for reference in references:
+                    if reference in positions:
+                        duplicates += 1
+                    else:
+                        positions[reference] = len(request.references)
+                        request.references.append(reference)
+                    indexes.append(positions[reference])
+                request.entries.append((item, references, indexes, quality_variables))
+        if duplicates:
+            logger.info(
+                "%s : %d duplicated references read once" % (self.device, duplicates)
+            )
+        self._cov_plan = cov_plan
+        self._update_subscriptions()
+
+    def _acquisition(self, device_id):
+        """
+        acquisition strategy of a device: "read_multiple" packs several
+        objects in a ReadPropertyMultiple request, "read" reads the objects
+        one by one, property by property when the device does not support
+        ReadPropertyMultiple or rejected it
+        """
+        bacnetdevice = self.remote_devices.get(device_id, self.device).bacnetdevice
+        capabilities = self._capabilities.get(device_id, Capabilities())
+        if capabilities.supports("readPropertyMultiple") is False:
+            return "read_property"
+        if bacnetdevice.acquisition_mode == 0:
+            return "read"
+        if bacnetdevice.acquisition_mode == 1:
+            return "read_multiple"
+        return capabilities.acquisition()
+
+    def _cov(self, device_id):
+        """
+        True if the present values of a device are received by COV
+        subscriptions: COV acquisition mode, unless the device does not
+        support SubscribeCOV
+        """
+        bacnetdevice = self.remote_devices.get(device_id, self.device).bacnetdevice
+        if bacnetdevice.acquisition_mode != 3:
+            return False
+        capabilities = self._capabilities.get(device_id, Capabilities())
+        return capabilities.supports("subscribeCOV") is not False
+
+    def _update_subscriptions(self):
+        """
+        cancel the subscriptions of the references not received by COV
+        anymore
+        """
+        planned = set(
+            reference
+            for references in self._cov_plan.values()
+            for reference in references
+        )
+        for reference in list(self._subscriptions):
+            if reference in planned:
+                continue
+            subscription = self._subscriptions.pop(reference)
+            if self.server is None:
+                continue
+            self.server.subscription_contexts.pop(
+                subscription.subscriberProcessIdentifier, None
+            )
+            if subscription.renew:
+                deferred(
+                    self.server.this_application.request_io,
+                    IOCB(subscription.request(cancel=True)),
+                )
+
+    def _max_apdu(self, device_id):
+        """
+        estimated size limit of the answers to the ReadPropertyMultiple
+        requests of a device: its maxApduLengthAccepted, the answers of a
+        device sending segmented answers are limited by the local device,
+        rpm_max_apdu when the capabilities are unknown
+        """
+        capabilities = self._capabilities.get(device_id)
+        if not capabilities or not capabilities.max_apdu:
+            return self.rpm_max_apdu
+        if capabilities.segmentation in ("segmentedBoth", "segmentedTransmit"):
+            return self.local_max_apdu
+        return min(capabilities.max_apdu, self.local_max_apdu)
+
+    def _adapt(self, device_id, exception):
+        """
+        adapt the requests to a device rejecting a ReadPropertyMultiple:
+        read property by property when the service is not supported, halve
+        the size of the requests when they are too large
+
+        the adaptation is stored with the capabilities of the device, the
+        next starts use it without failing again
+
+        :return: True when the requests of the device changed
+        """
+        reason = error_code(exception)
+        device = self.remote_devices.get(device_id, self.device)
+        capabilities = self._capabilities.setdefault(device_id, Capabilities())
+        if reason in UNSUPPORTED_REASONS:
+            capabilities.reject("readPropertyMultiple")
+            capabilities.store(device.bacnetdevice, ["protocolServicesSupported"])
+            logger.warning(
+                "%s : ReadPropertyMultiple not supported, read property by "
+                "property" % device
+            )
+        elif reason in TOO_LARGE_REASONS:
+            limit = self._max_apdu(device_id) // 2
+            if limit < self.rpm_header_size + self.rpm_object_size:
+                return False
+            capabilities.limit(limit)
+            capabilities.store(
+                device.bacnetdevice, ["maxApduLengthAccepted", "segmentationSupported"]
+            )
+            logger.warning(
+                "%s : %s, requests limited to %d bytes" % (device, reason, limit)
+            )
+        else:
+            return False
+        self._plan_outdated = True
+        return True
+
+    def _update_profilers(self):
+        """
+        start or stop the profiling of the devices with profile_cycles set
+        """
+        devices = dict(self.remote_devices)
+        devices[self.device.pk] = self.device
+        for device_id, device in devices.items():
+            cycles = device.bacnetdevice.profile_cycles
+            if not cycles:
+                self._profilers.pop(device_id, None)
+            elif device_id not in self._profilers:
+                logger.info("Profiling %d cycles of %s" % (cycles, device))
+                self._profilers[device_id] = CycleProfiler(device, cycles)
+
+    def reload(self, remote_device_ids=None):
+        """
+        apply configuration changes to the point table and poll plan, the
+        BACnet stack keeps its socket and address bindings
+
+        :return: False if the stack has to be restarted
+        """
+        if self.server is None:
+            return False
+        try:
+            device = PyScadaDevice.objects.select_related("bacnetdevice").get(
+                pk=self.device.pk
+            )
+        except PyScadaDevice.DoesNotExist:
+            return False
+        for field in [
+            "device_type",
+            "ip_address",
+            "mask",
+            "port",
+            "bbmd_address",
+            "bbmd_ttl",
+            "bdt",
+        ]:
+            if getattr(device.bacnetdevice, field) != getattr(
+                self.device.bacnetdevice, field
+            ):
+                return False
+        self.device = device
+        if remote_device_ids is not None:
+            self.remote_device_ids = remote_device_ids
+        if self.stack is not None and device.bacnetdevice.device_type == 0:
+            self._discover_added()
+        self._load_point_table()
+        return True
+
+    def _discover_added(self):
+        """
+        discover the remote devices added since the point table was loaded
+        the way the start does: their capabilities are read and their
+        objects enumerated before they are read
+        """
+        added = self._remote_devices_queryset().exclude(
+            bacnet_device_id__in=list(self.remote_devices.keys())
+        )
+        if not added.exists():
+            return
+        try:
+            # the last discovery of the stack may be older than the devices
+            remote_devices = self.stack.discover(self.device, refresh=True)
+            if type(remote_devices) == list:
+                self._discover_remotes(remote_devices, added)
+        except Exception as e:
+            logger.warning(
+                "%s : discovery of the added devices failed : %s" % (self.device, e)
+            )
 
     def _connect(self):
         """
@@ -600,64 +1427,777 @@ class Device:
         """
         disconnect to the bacnet slave (server)
         """
-        if self.server is not None:
+        self._cov_plan = {}
+        self._update_subscriptions()
+        if self.stack is not None:
+            # the stack is stopped by its last local device
+            logger.debug("Releasing BACNet stack %s" % self.stack)
+            self.stack.release(self.device.pk)
+        elif self.server is not None:
             logger.debug("Disconnecting BACNet device %s" % self.server)
             status = self.server.disconnect()
             return status
 
-    def request_data(self):
-        """ """
+    def _read_property(self, reference, timer):
+        """
+        send a ReadProperty request for a reference of the poll plan and wait
+        for the answer, the time spent to build the request, wait for the
+        answer and decode it is added to the phases of timer
+        """
+        return self._receive(self._send([reference], timer), [reference], timer)[0]
+
+    def _read_multiple(self, references, timer):
+        """
+        send a ReadPropertyMultiple request for the references of one device
+        and wait for the answer, the phases are timed like _read_property
+
+        :return: list of the values in the order of the references, a failed
+            property gets its exception
+        """
+        return self._receive(self._send(references, timer), references, timer)
+
+    def _send(self, references, timer):
+        """
+        send the ReadProperty request of one reference or the
+        ReadPropertyMultiple request of several references of one device
+        without waiting for the answer, the time spent to build the request
+        is added to the encode phase of timer
+
+        :return: IOCB of the request
+        """
+        start = time()
+        if len(references) == 1:
+            reference = references[0]
+            request = ReadPropertyRequest(
+                objectIdentifier=(reference.object_type, reference.object_instance),
+                propertyIdentifier=reference.property_id,
+            )
+            if reference.array_index is not None:
+                request.propertyArrayIndex = reference.array_index
+        else:
+            specs = {}
+            for reference in references:
+                specs.setdefault(
+                    (reference.object_type, reference.object_instance), []
+                ).append(
+                    PropertyReference(
+                        propertyIdentifier=reference.property_id,
+                        propertyArrayIndex=reference.array_index,
+                    )
+                )
+            request = ReadPropertyMultipleRequest(
+                listOfReadAccessSpecs=[
+                    ReadAccessSpecification(
+                        objectIdentifier=object_identifier,
+                        listOfPropertyReferences=property_references,
+                    )
+                    for object_identifier, property_references in specs.items()
+                ]
+            )
+        request.pduDestination = references[0].address
+        iocb = IOCB(request)
+        iocb.set_timeout(self.read_timeout)
+        iocb.add_callback(_completed)
+        timer.add("encode", time() - start)
+        deferred(self.server.this_application.request_io, iocb)
+        return iocb
+
+    def _receive(self, iocb, references, timer):
+        """
+        wait for the answer of a request sent by _send and decode it, the
+        phases are timed like _read_property
+
+        :return: list of the values in the order of the references, a failed
+            ReadProperty raises, a failed property of a ReadPropertyMultiple
+            gets its exception
+        """
+        start = time()
+        iocb.wait()
+        now = time()
+        timer.add("network", now - start)
+        start = now
+        try:
+            if len(references) == 1:
+                return [self._decode_read_property(iocb, references[0])]
+            return self._decode_read_multiple(iocb, references)
+        finally:
+            timer.add("decode", time() - start)
+
+    @staticmethod
+    def _decode_read_property(iocb, reference):
+        if iocb.ioError:
+            reason = find_reason(iocb.ioError)
+            if reason == "unknownProperty":
+                raise UnknownPropertyError("Unknown property %s" % (reference,))
+            elif reason == "unknownObject":
+                raise UnknownObjectError("Unknown object %s" % (reference,))
+            raise NoResponseFromController("APDU Abort Reason : %s" % reason)
+        apdu = iocb.ioResponse
+        if not isinstance(apdu, ReadPropertyACK):
+            return None
+        return decode_value(
+            apdu.propertyValue,
+            reference.datatype,
+            apdu.objectIdentifier[0],
+            apdu.propertyIdentifier,
+        )
+
+    @staticmethod
+    def _decode_read_multiple(iocb, references):
+        if iocb.ioError:
+            raise NoResponseFromController(
+                "APDU Abort Reason : %s" % find_reason(iocb.ioError)
+            )
+        apdu = iocb.ioResponse
+        if not isinstance(apdu, ReadPropertyMultipleACK):
+            raise NoResponseFromController("unexpected answer %r" % apdu)
+        results = {}
+        for result in apdu.listOfReadAccessResults:
+            object_type, object_instance = result.objectIdentifier
+            for element in result.listOfResults:
+                key = (
+                    object_type,
+                    object_instance,
+                    element.propertyIdentifier,
+                    element.propertyArrayIndex,
+                )
+                error = element.readResult.propertyAccessError
+                if error is not None:
+                    if error.errorCode == "unknownObject":
+                        results[key] = UnknownObjectError(
+                            "Unknown object %s %s" % key[:2]
+                        )
+                    elif error.errorCode == "unknownProperty":
+                        results[key] = UnknownPropertyError(
+                            "Unknown property %s %s %s" % key[:3]
+                        )
+                    else:
+                        results[key] = ExecutionError(error.errorClass, error.errorCode)
+                    continue
+                try:
+                    results[key] = decode_value(
+                        element.readResult.propertyValue,
+                        _reference_datatype(
+                            object_type,
+                            element.propertyIdentifier,
+                            element.propertyArrayIndex,
+                        ),
+                        object_type,
+                        element.propertyIdentifier,
+                    )
+                except Exception as e:
+                    results[key] = e
+        values = []
+        for reference in references:
+            key = (
+                reference.object_type,
+                reference.object_instance,
+                reference.property_id,
+                reference.array_index,
+            )
+            if key in results:
+                values.append(results[key])
+            else:
+                values.append(NoResponseFromController("no value %s" % (reference,)))
+        return values
+
+    def request_data(self, device_id=None):
+        """
+        read the variables of device_id (default: this device) from the poll plan
+        """
         if not driver_ok:
             return None
 
+        if device_id is None:
+            device_id = self.device.pk
+        device = self.remote_devices.get(device_id, self.device)
+        if device_id == self.device.pk and self.server is not None:
+            self._update_registration()
+            if self.exported is not None:
+                self.exported.refresh()
+            # the local device starts the pass, the requests read ahead for
+            # the remote devices of the last pass are not read anymore
+            for route in self._routes.values():
+                route.clear()
+            if self._quarantine:
+                self._recheck_quarantine()
+
+        profiler = self._profilers.get(device_id)
+        if profiler is not None:
+            profiler.enable()
+        try:
+            return self._request_data(device_id, device)
+        finally:
+            if profiler is not None and profiler.disable():
+                del self._profilers[device_id]
+                BACnetDevice.objects.filter(bacnet_device_id=device_id).update(
+                    profile_cycles=0
+                )
+
+    def _request_data(self, device_id, device):
         output = []
-        properties = []
 
-        for item in self.variables.values():
-            value = None
+        cycle_start = time()
+        timer = metrics.cycle_timer(device)
+        timer.start()
+        requests = self._poll_plan.get(device_id, [])
+        route = self._route(device) if device_id != self.device.pk else None
+        if route is not None:
+            failed = self._request_routed(device_id, device, route, timer, output)
+        else:
+            failed = 0
+            for request in requests:
+                if self.server is None:
+                    break
+                failed += self._complete(
+                    self._send_request(device_id, request, timer),
+                    device,
+                    timer,
+                    output,
+                )
+        sent = 0
+        if self._cov_plan.get(device_id) and self.server is not None:
+            sent, cov_failed = self._request_cov(device_id, device, timer, output)
+            failed += cov_failed
+        metrics.cycle_done(device)
+        if self._plan_outdated:
+            self._plan_outdated = False
+            self._build_poll_plan()
+        if self.exported is not None:
+            self.exported.update(
+                [
+                    (item.pk, item.value, item.timestamp)
+                    for item in output
+                    if item.pk in self.exported.variables
+                ]
+            )
+
+        if (requests or sent) and failed == len(requests) + sent:
+            self._offline.add(device_id)
+        elif device_id in self._offline:
+            # the device answers again after an outage
+            self._offline.discard(device_id)
+            if device_id in self._trend_logs:
+                self._backfill_pending.add(device_id)
+            # its subscriptions are lost if it restarted
+            for reference in self._cov_plan.get(device_id, ()):
+                if reference in self._subscriptions:
+                    self._subscriptions[reference].renew = 0.0
+        if device_id in self._backfill_pending and device_id not in self._offline:
+            self._backfill_pending.discard(device_id)
+            self._backfill(device_id, device, cycle_start)
+        return output
+
+    def _request_cov(self, device_id, device, timer, output):
+        """
+        subscribe to the COV of the references of a device, the
+        subscriptions are renewed after half of their lifetime, and update
+        the variables with the values notified since the last cycle
+
+        a reference whose subscription is refused is read by the poll plan
+        from the next cycle, a subscription failing otherwise is sent again
+        by the next cycle
+
+        :return: (subscription requests sent, failed)
+        """
+        references = self._cov_plan[device_id]
+        sent = 0
+        failed = 0
+        pending = deque()
+        for reference in references:
+            subscription = self._subscriptions.get(reference)
+            if subscription is None:
+                subscription = Subscription(reference, cov_lifetime())
+                self._subscriptions[reference] = subscription
+                contexts = self.server.subscription_contexts
+                contexts.setdefault("context_callback", context_callback)
+                contexts[subscription.subscriberProcessIdentifier] = subscription
+            if subscription.renew > time():
+                continue
+            if len(pending) >= self.cov_max_in_flight:
+                failed += self._subscribed(device, *pending.popleft(), timer)
+            start = time()
+            iocb = IOCB(subscription.request())
+            iocb.set_timeout(self.read_timeout)
+            iocb.add_callback(_completed)
+            timer.add("encode", time() - start)
+            deferred(self.server.this_application.request_io, iocb)
+            pending.append((subscription, iocb, start))
+            sent += 1
+        while pending:
+            failed += self._subscribed(device, *pending.popleft(), timer)
+        for reference, items in references.items():
+            values = self._subscriptions[reference].pop()
+            if values:
+                self._update_notified(reference, items, values, timer, output)
+        return sent, failed
+
+    def _subscribed(self, device, subscription, iocb, start, timer):
+        """
+        wait for the answer of a subscription request, a subscription is
+        renewed after half of its lifetime
+
+        :return: 1 if the request failed, else 0
+        """
+        wait = time()
+        iocb.wait()
+        timer.add("network", time() - wait)
+        duration = getattr(iocb, "completed", time()) - start
+        if iocb.ioError:
+            reason = find_reason(iocb.ioError)
+            metrics.request(
+                device,
+                "subscribe_cov",
+                duration,
+                NoResponseFromController("APDU Abort Reason : %s" % reason),
+            )
+            if reason in REFUSED_REASONS:
+                logger.info(
+                    "%s : COV subscription to %s refused : %s, it is polled"
+                    % (device, subscription.reference, reason)
+                )
+                self._cov_refused.add(subscription.reference)
+                self._plan_outdated = True
+            return 1
+        metrics.request(device, "subscribe_cov", duration)
+        timer.current["requests"] += 1
+        subscription.renew = start + subscription.lifetime / 2.0
+        return 0
+
+    def _route(self, device):
+        """
+        route of the requests to a remote device behind a router, None for
+        the devices of the local network
+        """
+        key = route_key(device.bacnetdevice)
+        if key is None:
+            return None
+        local = self.device.bacnetdevice
+        route = self._routes.get(key)
+        if route is None:
+            route = self._routes[key] = Route(key)
+        route.configure(local.routed_max_in_flight, local.routed_requests_per_second)
+        return route
+
+    def _route_ahead(self, route, device_id):
+        """
+        requests of the remote devices polled after device_id behind the same
+        route, not sent yet
+        """
+        sent = set(id(entry.request) for entry in route.pending)
+        after = False
+        for remote_id, remote in self.remote_devices.items():
+            if remote_id == device_id:
+                after = True
+                continue
+            if not after or route_key(remote.bacnetdevice) != route.key:
+                continue
+            for request in self._poll_plan.get(remote_id, []):
+                if id(request) not in sent:
+                    yield remote_id, request
+
+    def _request_routed(self, device_id, device, route, timer, output):
+        """
+        read the requests of a device behind a router, up to max_in_flight
+        requests of the route wait for their answers at the same time
+
+        the requests are sent as fast as the rate limit of the route allows,
+        the free places of the route are filled with the requests of the next
+        devices behind the router, their answers are read by their cycle in
+        the same pass
+
+        :return: number of failed requests
+        """
+        requests = self._poll_plan.get(device_id, [])
+        sent = set(
+            id(entry.request) for entry in route.pending if entry.device_id == device_id
+        )
+        for request in requests:
             if self.server is None:
-                return output
+                break
+            if id(request) not in sent:
+                self._send_routed(route, device_id, request, timer)
+        failed = 0
+        for request in requests:
+            entry = route.take(request)
+            if entry is None:
+                continue
+            failed += self._complete(entry, device, timer, output)
+            # read ahead for the next devices while the route has free places
+            for ahead_id, ahead in self._route_ahead(route, device_id):
+                if self.server is None or not route.ready():
+                    break
+                self._send_routed(route, ahead_id, ahead, timer)
+        return failed
+
+    def _send_routed(self, route, device_id, request, timer):
+        """
+        send a request through a route, wait for a free place and for the
+        rate limit of the route first
+        """
+        start = time()
+        while route.in_flight() >= route.max_in_flight:
+            route.oldest_in_flight().iocb.wait()
+        wait = route.acquire()
+        timer.add("network", time() - start)
+        if wait:
+            metrics.inc(
+                "bacnet_route_throttle_seconds_total", (("route", str(route)),), wait
+            )
+        route.pending.append(self._send_request(device_id, request, timer))
+
+    def _send_request(self, device_id, request, timer):
+        """
+        send a request of the poll plan
+
+        :return: SentRequest
+        """
+        start = time()
+        if (
+            len(request.references) > 1
+            and self._acquisition(device_id) == "read_property"
+        ):
+            # read property by property when the answer is read
+            return SentRequest(device_id, request, None, start)
+        try:
+            iocb = self._send(request.references, timer)
+        except Exception as e:
+            iocb = e
+        return SentRequest(device_id, request, iocb, start)
+
+    def _complete(self, entry, device, timer, output):
+        """
+        wait for the answer of a request of the poll plan and update its
+        variables
+
+        :return: 1 if the request failed, else 0
+        """
+        references = entry.request.references
+        service = "read" if len(references) == 1 else "read_multiple"
+        try:
+            if entry.iocb is None:
+                service = "read"
+                values = self._read_each(references, timer)
+                if all(isinstance(v, Exception) for v in values):
+                    raise values[0]
+            elif isinstance(entry.iocb, Exception):
+                raise entry.iocb
+            else:
+                values = self._receive(entry.iocb, references, timer)
+        except Exception as e:
+            metrics.request(device, service, self._duration(entry), e)
+            failed = 1
+            if entry.iocb is None:
+                pass
+            elif len(references) > 1 and is_permanent(e):
+                # a request failed as a whole by one of its objects
+                values = self._read_split(references, timer)
+            elif len(references) > 1 and self._adapt(entry.device_id, e):
+                if self._acquisition(entry.device_id) == "read_property":
+                    values = self._read_each(references, timer)
+                else:
+                    values = self._read_split(references, timer)
+            else:
+                values = [e] * len(references)
+            if not all(isinstance(v, Exception) for v in values):
+                failed = 0
+        else:
+            metrics.request(device, service, self._duration(entry))
+            timer.current["requests"] += 1
+            failed = 0
+        for item, refs, indexes, quality_variables in entry.request.entries:
+            for reference, i in zip(refs, indexes):
+                if is_permanent(values[i]):
+                    self._quarantine_reference(item, reference, values[i])
+                    # the quality properties of an unknown object are not
+                    # quarantined with it
+                    break
+            self._update_variable(
+                item,
+                refs,
+                [values[i] for i in indexes],
+                quality_variables,
+                timer,
+                output,
+            )
+        return failed
+
+    def _read_each(self, references, timer):
+        """
+        read references with one ReadProperty request each
+
+        :return: list of the values in the order of the references, a failed
+            reference gets its exception
+        """
+        values = []
+        for reference in references:
             try:
-                value = self.server.read(
-                    str(item.device.bacnetdevice.ip_address)
-                    + " "
-                    + str(
-                        item.bacnetvariable.object_type_choises[
-                            item.bacnetvariable.object_type
-                        ][1]
-                    )
-                    + " "
-                    + str(item.bacnetvariable.object_identifier)
-                    + " "
-                    + "presentValue"
-                )
-                value = float(value)
-            except BAC0.core.io.IOExceptions.NoResponseFromController as e:
-                logger.info("%s : %s" % (self.device, e))
-                value = None
-            except ValueError:
-                if type(value) == str:
-                    value = item.convert_string_value(value)
+                values.append(self._read_property(reference, timer))
+            except Exception as e:
+                values.append(e)
+        return values
+
+    def _read_split(self, references, timer):
+        """
+        read the references of a request failed as a whole object by object,
+        then property by property, to find the failing references
+
+        :return: list of the values in the order of the references
+        """
+        objects = {}
+        for i, reference in enumerate(references):
+            objects.setdefault(
+                (reference.object_type, reference.object_instance), []
+            ).append(i)
+        if len(objects) == 1:
+            groups = [[i] for i in range(len(references))]
+        else:
+            groups = list(objects.values())
+        values = [None] * len(references)
+        for indexes in groups:
+            group = [references[i] for i in indexes]
+            try:
+                if len(group) == 1:
+                    results = [self._read_property(group[0], timer)]
+                else:
+                    results = self._read_multiple(group, timer)
+            except Exception as e:
+                if len(group) > 1 and is_permanent(e):
+                    results = self._read_split(group, timer)
                 else:
-                    logger.info(
-                        "Value read for %s format not supported : %s"
-                        % (item, type(value))
+                    results = [e] * len(group)
+            for i, value in zip(indexes, results):
+                values[i] = value
+        return values
+
+    def _quarantine_reference(self, item, reference, exception):
+        """
+        stop reading a reference failing with a permanent error, the poll
+        plan is rebuilt without it at the end of the cycle
+        """
+        entry, _ = BACnetQuarantinedReference.objects.update_or_create(
+            bacnet_variable=item.bacnetvariable,
+            property_name=reference.property_id,
+            defaults=dict(error=error_code(exception)[:100], last_check=now()),
+        )
+        self._quarantine.setdefault(item.pk, {})[reference.property_id] = entry
+        logger.warning(
+            "%s : %s quarantined : %s" % (self.device, reference, entry.error)
+        )
+        self._update_quarantine_metric()
+        self._plan_outdated = True
+
+    def _recheck_quarantine(self):
+        """
+        read the quarantined references not checked since quarantine_recheck
+        seconds, a few per pass, a reference answering again is read by the
+        next cycles
+        """
+        due = now() - timedelta(seconds=quarantine_recheck())
+        checks = 0
+        released = False
+        for variable_id, entries in list(self._quarantine.items()):
+            item = self.variables.get(variable_id)
+            for property_name, entry in list(entries.items()):
+                if entry.last_check is not None and entry.last_check > due:
+                    continue
+                if item is None or item.device_id in self._offline:
+                    continue
+                if checks >= RECHECKS_PER_PASS:
+                    break
+                checks += 1
+                device = self.remote_devices.get(item.device_id, self.device)
+                try:
+                    references = self._references(
+                        item,
+                        Address(self.address(item.device.bacnetdevice)),
+                        quarantined=True,
                     )
-                    value = None
+                    reference = [
+                        r for r in references if r.property_id == property_name
+                    ]
+                    if reference:
+                        self._read_property(reference[0], metrics.cycle_timer(device))
+                except Exception as e:
+                    entry.last_check = now()
+                    if is_permanent(e):
+                        entry.checks += 1
+                        entry.error = error_code(e)[:100]
+                    entry.save(update_fields=["last_check", "checks", "error"])
+                    continue
+                logger.info("%s : %s-%s released" % (self.device, item, property_name))
+                entry.delete()
+                del entries[property_name]
+                if not entries:
+                    del self._quarantine[variable_id]
+                released = True
+        if released:
+            self._update_quarantine_metric()
+            self._build_poll_plan()
+
+    @staticmethod
+    def _duration(entry):
+        """
+        time from sending a request to its answer
+        """
+        return getattr(entry.iocb, "completed", time()) - entry.start
+
+    def _request(self, request, device, service):
+        """
+        send a confirmed request and wait for the answer, the request is
+        counted in the metrics of device
+        """
+        start = time()
+        iocb = IOCB(request)
+        iocb.set_timeout(self.read_timeout)
+        deferred(self.server.this_application.request_io, iocb)
+        iocb.wait()
+        if iocb.ioError:
+            e = NoResponseFromController(
+                "APDU Abort Reason : %s" % find_reason(iocb.ioError)
+            )
+            metrics.request(device, service, time() - start, e)
+            raise e
+        metrics.request(device, service, time() - start)
+        return iocb.ioResponse
+
+    def _backfill(self, device_id, device, until):
+        """
+        read the records logged by the trend logs of a device since their
+        last retrieved record, after a restart of the DAQ or an outage of the
+        device, records logged after until are skipped
+        """
+        if self.server is None:
+            return
+        for trend_log in self._trend_logs.get(device_id, []):
+            address = self.address(
+                trend_log.bacnet_variable.bacnet_variable.device.bacnetdevice
+            )
+            try:
+                records = backfill(
+                    trend_log,
+                    Address(address),
+                    lambda request: self._request(request, device, "read_range"),
+                    self.rpm_max_apdu,
+                    until,
+                )
             except Exception as e:
-                logger.info("%s : %s" % (self.device, e))
+                logger.info("%s : backfill of %s failed : %s" % (device, trend_log, e))
+                continue
+            if records:
+                logger.info(
+                    "%s : %d records of %s backfilled" % (device, records, trend_log)
+                )
+
+    def _convert(self, item, value, datatype=None):
+        """
+        convert a value read to the float stored by a variable
+        """
+        if isinstance(value, Exception):
+            logger.info("%s : %s" % (self.device, value))
+            return None
+        labels = self._enumeration_labels(item, datatype)
+        if labels is not None and isinstance(value, float) and int(value) in labels:
+            # stored with the dictionary of the variable as before
+            name = labels[int(value)]
+            if name not in item.bacnet_enumeration_values:
+                item.bacnet_enumeration_values[name] = float(
+                    item.convert_string_value(name)
+                )
+            return item.bacnet_enumeration_values[name]
+        try:
+            return float(value)
+        except ValueError:
+            if type(value) == str:
+                return item.convert_string_value(value)
+            logger.info(
+                "Value read for %s format not supported : %s" % (item, type(value))
+            )
+        except Exception as e:
+            logger.info("%s : %s" % (self.device, e))
+        return None
+
+    @staticmethod
+    def _enumeration_labels(item, datatype):
+        """
+        names of the values of an enumerated property (inactive and active
+        of a binary presentValue...) for a variable whose dictionary maps the
+        names: before the enumerated values were decoded from their tag, the
+        names were stored with a dictionary created by the first values
+        read. None for the other variables, which store the value
+        """
+        if not hasattr(item, "bacnet_enumeration_labels"):
+            labels = None
+            enumerations = getattr(datatype, "enumerations", None)
+            if item.dictionary_id is not None and enumerations:
+                names = set(
+                    item.dictionary.dictionaryitem_set.values_list("label", flat=True)
+                )
+                if names.intersection(enumerations):
+                    labels = {number: name for name, number in enumerations.items()}
+            item.bacnet_enumeration_labels = labels
+            item.bacnet_enumeration_values = {}
+        return item.bacnet_enumeration_labels
+
+    def _update_variable(
+        self, item, references, values, quality_variables, timer, output
+    ):
+        """
+        update a variable and its quality variables with the values read for
+        its references
+        """
+        start = time()
+        value = self._convert(item, values[0], references[0].datatype)
+        quality = None
+        if len(references) > 1:
+            properties = {
+                reference.property_id: v
+                for reference, v in zip(references[1:], values[1:])
+                if not isinstance(v, Exception)
+            }
+            quality = quality_bits(
+                properties.get("statusFlags"),
+                properties.get("reliability"),
+                properties.get("outOfService"),
+            )
+            if item.bacnetvariable.discard_bad_quality and is_bad(quality):
                 value = None
-            if value is not None and item.update_values([value], [time()]):
+        now = time()
+        timer.add("convert", now - start)
+        if value is not None:
+            timer.current["points"] += 1
+            if item.update_values([value], [now]):
                 output.append(item)
-            # properties.append([item.bacnetvariable.object_type_choises[item.bacnetvariable.object_type][1], item.bacnetvariable.object_identifier, [('presentValue', 0)]])
-
-        # if self.server.this_application is not None:
-        #    logger.debug(self.server.this_application.do_read(self.device.bacnetdevice.ip_address, properties))
+        if quality is not None and not isinstance(values[0], Exception):
+            for quality_variable in quality_variables:
+                if quality_variable.update_values([quality], [now]):
+                    output.append(quality_variable)
+        timer.add("update", time() - now)
 
-        # for item in self.variables.values():
-        #    if value is not None and item.update_values([value], [time]):
-        #        output.append(item)
-        return output
+    def _update_notified(self, reference, items, values, timer, output):
+        """
+        update the variables of a COV subscription with the values notified,
+        at the time they were received
+        """
+        start = time()
+        converted = {}
+        for item in items:
+            converted[item.pk] = [
+                (t, self._convert(item, value, reference.datatype))
+                for t, value in values
+            ]
+        now = time()
+        timer.add("convert", now - start)
+        for item in items:
+            times = [t for t, value in converted[item.pk] if value is not None]
+            if not times:
+                continue
+            timer.current["points"] += len(times)
+            if item.update_values(
+                [value for t, value in converted[item.pk] if value is not None], times
+            ):
+                output.append(item)
+        timer.add("update", time() - now)
 
     def write_data(self, variable_id, value, task):
         """ """
@@ -678,49 +2218,32 @@ class Device:
             logger.debug("%s is not writeable" % v)
             return output
         read_value = None
+        service = "write"
+        start = time()
         try:
+            address = self.address(v.device.bacnetdevice)
+            reference = self._references(v, Address(address))[0]
             self.server.write(
-                str(v.device.bacnetdevice.ip_address)
-                + " "
-                + str(
-                    v.bacnetvariable.object_type_choises[v.bacnetvariable.object_type][
-                        1
-                    ]
+                "%s %s %s %s %s %s"
+                % (
+                    address,
+                    reference.object_type,
+                    reference.object_instance,
+                    reference.property_id,
+                    value,
+                    "-" if reference.array_index is None else reference.array_index,
                 )
-                + " "
-                + str(v.bacnetvariable.object_identifier)
-                + " "
-                + "presentValue "
-                + str(value)
-                + " "
-            )
-            read_value = self.server.read(
-                str(v.device.bacnetdevice.ip_address)
-                + " "
-                + str(
-                    v.bacnetvariable.object_type_choises[v.bacnetvariable.object_type][
-                        1
-                    ]
-                )
-                + " "
-                + str(v.bacnetvariable.object_identifier)
-                + " "
-                + "presentValue"
             )
-            read_value = float(read_value)
-        except BAC0.core.io.IOExceptions.NoResponseFromController as e:
-            logger.info("%s : %s" % (self.device, e))
-            read_value = None
-        except ValueError:
-            if type(read_value) == str:
-                read_value = v.convert_string_value(read_value)
-            else:
-                logger.info(
-                    "Value read for %s format not supported : %s"
-                    % (v, type(read_value))
-                )
-                read_value = None
+            metrics.request(v.device, service, time() - start)
+            service = "read"
+            start = time()
+            read_value = self._read_property(reference, metrics.cycle_timer(v.device))
+            metrics.request(v.device, service, time() - start)
+            service = None
+            read_value = self._convert(v, read_value, reference.datatype)
         except Exception as e:
+            if service is not None:
+                metrics.request(v.device, service, time() - start, e)
             logger.info("%s : %s" % (self.device, e))
             read_value = None
         if read_value is not None and v.update_values([read_value], [time()]):
@@ -729,38 +2252,114 @@ class Device:
         return output
 
 
+class RemoteDevice:
+    """
+    BACNet remote device, read and written through its local device
+    """
+
+    def __init__(self, local_device, device):
+        self.local_device = local_device
+        self.device = device
+
+    def request_data(self):
+        return self.local_device.request_data(self.device.pk)
+
+    def write_data(self, variable_id, value, task):
+        return self.local_device.write_data(variable_id, value, task)
+
+
 class Process(MultiDeviceDAQProcess):
     device_filter = dict(bacnetdevice__isnull=False, protocol_id=PROTOCOL_ID)
     bp_label = "pyscada.bacnet-%s"
+    shard = None
+    # shard of each local device id of the process
+    shards = None
 
     def init_process(self):
-        r = super(Process, self).init_process()
-        for d in self.devices:
-            if self.devices[d].device.bacnetdevice.device_type > 0:
-                logger.debug(
-                    "Change device instance for %s to %s"
-                    % (
-                        self.devices[d].device.bacnetdevice,
-                        self.devices[d].device.bacnetdevice.bacnet_local_device,
+        """
+        init the local device of the process with the remote devices of its
+        shard, the remote devices are read through their local device
+        """
+        self.devices = {}
+        # Reset dt_query_data to allow an increasing change of the polling interval from the admin
+        self.dt_query_data = 3600.0
+        for item in PyScadaDevice.objects.filter(
+            protocol__daq_daemon=1, id__in=self.device_ids, active=True
+        ).order_by("bacnetdevice__device_type"):
+            try:
+                if item.bacnetdevice.device_type == 0:
+                    self.devices[item.pk] = Device(
+                        item, remote_device_ids=self.device_ids, shard=self._shard(item)
+                    )
+                elif item.bacnetdevice.bacnet_local_device_id in self.devices:
+                    self.devices[item.pk] = RemoteDevice(
+                        self.devices[item.bacnetdevice.bacnet_local_device_id], item
                     )
+                else:
+                    continue
+                self.dt_set = min(self.dt_set, item.polling_interval)
+                self.dt_query_data = min(self.dt_query_data, item.polling_interval)
+            except:
+                logger.error(
+                    f"Exception while initialisation of DAQ Process for Device {item.pk}",
+                    exc_info=True,
                 )
-                self.devices[d] = self.devices[
-                    self.devices[d].device.bacnetdevice.bacnet_local_device.id
-                ]
-        return r
+        if len(self.devices.items()) == 0:
+            return False
+        return True
+
+    def _shard(self, local_device):
+        if self.shards:
+            return self.shards.get(str(local_device.pk), 0)
+        return self.shard
+
+    def loop(self):
+        start = time()
+        result = super().loop()
+        duration = time() - start
+        labels = (("process", str(self.process_id)),)
+        metrics.observe("bacnet_cycle_duration_seconds", duration, labels)
+        if duration > self.dt_set:
+            metrics.inc("bacnet_cycle_overruns_total", labels)
+        metrics.flush()
+        return result
+
+    def cleanup(self):
+        metrics.remove()
+        super().cleanup()
 
     def restart(self):
         """
-        just re-init
+        apply configuration changes to the running devices, a BACnet stack is
+        only restarted when its network settings changed
         """
-        r = False
-        for d in self.devices:
-            if PyScadaDevice.objects.get(id=d).bacnetdevice.device_type == 0:
-                self.devices[d]._disconnect()
-                # if self.device.device.bacnetdevice.device_type == 0:
-                # r = super(Process, self).restart()
-                r = True
-            else:
-                logger.debug("Not a local bacnet device : not restarting %s" % d)
-                self.stop()
-        return r
+        # Reset last query to resfresh all variables values
+        self.last_query = 0
+        bp = BackgroundProcess.objects.filter(pk=self.process_id).first()
+        if bp is not None:
+            try:
+                kwargs = json.loads(bp.process_class_kwargs)
+                self.device_ids = kwargs.get("device_ids", self.device_ids)
+                self.shards = kwargs.get("shards", self.shards)
+            except ValueError:
+                pass
+        local_devices = {}
+        for device_id, device in self.devices.items():
+            if isinstance(device, Device):
+                local_devices[device_id] = device
+        for device in local_devices.values():
+            if not device.reload(self.device_ids):
+                logger.info("Restarting the BACnet stack of %s" % device.device)
+                for d in local_devices.values():
+                    d._disconnect()
+                return self.init_process()
+
+        self.devices = dict(local_devices)
+        self.dt_query_data = 3600.0
+        for device in local_devices.values():
+            self.dt_query_data = min(self.dt_query_data, device.device.polling_interval)
+            for device_id, item in device.remote_devices.items():
+                self.devices[device_id] = RemoteDevice(device, item)
+                self.dt_set = min(self.dt_set, item.polling_interval)
+                self.dt_query_data = min(self.dt_query_data, item.polling_interval)
+        return True
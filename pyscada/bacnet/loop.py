@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+try:
+    import asyncore
+
+    import BAC0
+    from bacpypes import core
+    from bacpypes.task import TaskManager
+
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+
+from threading import Thread, Event
+from time import time, sleep, process_time
+import selectors
+import logging
+
+logger = logging.getLogger(__name__)
+
+# core loops of the BACnet stack: the bacpypes loop sleeps 0.5 ms per pass
+# and polls the sockets at least once per second, the selector loop blocks
+# until socket activity, the next task or a deferred function
+CORE_LOOPS = ("bacpypes", "selector")
+
+
+def core_loop():
+    """
+    core loop of the BACnet stacks, setting core_loop, default bacpypes
+    """
+    from django.conf import settings
+
+    if hasattr(settings, "PYSCADA_BACNET"):
+        if "core_loop" in settings.PYSCADA_BACNET:
+            if settings.PYSCADA_BACNET["core_loop"] in CORE_LOOPS:
+                return settings.PYSCADA_BACNET["core_loop"]
+            logger.warning(
+                "unknown BACnet core loop %s" % settings.PYSCADA_BACNET["core_loop"]
+            )
+    return "bacpypes"
+
+
+def _sync(selector, registered):
+    """
+    register the asyncore dispatchers in the selector with the events they
+    wait for, dispatchers can be added, closed or change their state
+    between two passes
+    """
+    for fd in list(registered):
+        if fd not in asyncore.socket_map:
+            selector.unregister(fd)
+            del registered[fd]
+    for fd, dispatcher in list(asyncore.socket_map.items()):
+        events = 0
+        if dispatcher.readable():
+            events |= selectors.EVENT_READ
+        if dispatcher.writable() and not dispatcher.accepting:
+            events |= selectors.EVENT_WRITE
+        if events == registered.get(fd, 0):
+            continue
+        if not events:
+            selector.unregister(fd)
+            del registered[fd]
+        elif fd in registered:
+            selector.modify(fd, events)
+            registered[fd] = events
+        else:
+            selector.register(fd, events)
+            registered[fd] = events
+
+
+def run_selector(spin=1.0):
+    """
+    run the bacpypes core: tasks, socket activity and deferred functions,
+    without sleeping and polling. The selector waits until the next task,
+    deferred functions and tasks installed by other threads wake it up
+    through the trigger of the task manager
+
+    :param spin: longest wait without a trigger to wake up the loop
+    """
+    task_manager = TaskManager()
+    # deferred() and stop() wake up the loop through core.taskManager
+    core.taskManager = task_manager
+    selector = selectors.DefaultSelector()
+    registered = {}
+    core.running = True
+    try:
+        while core.running:
+            task, delta = task_manager.get_next_task()
+            try:
+                if task:
+                    task_manager.process_task(task)
+                if core.deferredFns:
+                    delta = 0.0
+                elif task_manager.trigger is None:
+                    delta = spin if delta is None else min(delta, spin)
+
+                _sync(selector, registered)
+                for key, events in selector.select(delta):
+                    dispatcher = asyncore.socket_map.get(key.fd)
+                    if dispatcher is None:
+                        continue
+                    if events & selectors.EVENT_READ:
+                        asyncore.read(dispatcher)
+                    if events & selectors.EVENT_WRITE:
+                        asyncore.write(dispatcher)
+
+                while core.deferredFns:
+                    functions = core.deferredFns
+                    core.deferredFns = []
+                    for fn, args, kwargs in functions:
+                        fn(*args, **kwargs)
+            except KeyboardInterrupt:
+                core.running = False
+            except Exception as e:
+                logger.error("BACnet core loop : %s" % e, exc_info=True)
+    finally:
+        core.running = False
+        selector.close()
+
+
+if driver_ok:
+
+    class SelectorLite(BAC0.lite):
+        """
+        BAC0 lite running the bacpypes core with run_selector
+
+        the BAC0 task thread polls every 10 ms while it has tasks, the ping
+        of the BAC0 devices is disabled, the DAQ tracks the devices offline
+        """
+
+        def __init__(self, *args, **kwargs):
+            kwargs.setdefault("ping", False)
+            super().__init__(*args, **kwargs)
+
+        def _startAppThread(self):
+            self.t = Thread(target=run_selector, daemon=True)
+            self.t.start()
+            self._started = True
+
+
+def start_server(loop=None, **kwargs):
+    """
+    start a BAC0 lite with a core loop, default: the core_loop setting
+
+    the exported objects notify their COV subscriptions when their values
+    are set, the BAC0 task checking all of them every second is stopped
+    """
+    if (loop or core_loop()) == "selector":
+        server = SelectorLite(**kwargs)
+    else:
+        server = BAC0.lite(**kwargs)
+    # private task of BAC0, missing in other releases
+    update_local_cov_task = getattr(server, "_update_local_cov_task", None)
+    if update_local_cov_task is not None:
+        update_local_cov_task.task.stop()
+    return server
+
+
+def measure_core_loop(loop, results, ip, port, peer, duration=5.0, requests=200):
+    """
+    idle cpu and latencies of a BACnet stack with a core loop, run in a
+    child process to measure the cpu of the stack alone
+
+    the wake up latency is the time until a function deferred by another
+    thread runs, the request latency the time of a ReadProperty of the
+    first analog input of the device at the peer address
+    """
+    BAC0.log_level("silence")
+    server = start_server(loop, ip=ip, port=port)
+    try:
+        sleep(1.0)
+        cpu = process_time()
+        sleep(duration)
+        idle_cpu = (process_time() - cpu) / duration
+
+        wake_up = []
+        done = Event()
+        for i in range(requests):
+            done.clear()
+            start = time()
+            core.deferred(done.set)
+            done.wait(5)
+            wake_up.append(time() - start)
+            sleep(0.005)
+
+        request = []
+        for i in range(requests):
+            start = time()
+            server.read("%s analogInput 1 presentValue" % peer)
+            request.append(time() - start)
+            sleep(0.005)
+        results.put(
+            dict(loop=loop, idle_cpu=idle_cpu, wake_up=wake_up, request=request)
+        )
+    finally:
+        server.disconnect()
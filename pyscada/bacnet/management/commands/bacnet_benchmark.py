@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.bacnet.benchmark import (
+    SCENARIOS,
+    ACQUISITION_MODES,
+    run_benchmark,
+    decoder_benchmark,
+    core_loop_benchmark,
+    compare,
+    read_results,
+    write_results,
+)
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "measure the acquisition throughput against simulated BACnet devices "
+        "and compare it with a baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario",
+            dest="scenarios",
+            action="append",
+            choices=list(SCENARIOS.keys()),
+            help="points of the scenario, can be repeated, default: 100 and 1k",
+        )
+        parser.add_argument(
+            "--mode",
+            dest="modes",
+            action="append",
+            choices=list(ACQUISITION_MODES.keys()),
+            help="acquisition mode, can be repeated, default: all modes",
+        )
+        parser.add_argument("--cycles", dest="cycles", default=5, type=int)
+        parser.add_argument(
+            "--latency",
+            dest="latency",
+            default=0.0,
+            type=float,
+            help="response latency of the simulated devices in ms",
+        )
+        parser.add_argument(
+            "--jitter",
+            dest="jitter",
+            default=0.0,
+            type=float,
+            help="response latency jitter in ms",
+        )
+        parser.add_argument(
+            "--loss",
+            dest="loss",
+            default=0.0,
+            type=float,
+            help="share of the packets which are dropped, 0 to 1",
+        )
+        parser.add_argument(
+            "--duplicate",
+            dest="duplicate",
+            default=0.0,
+            type=float,
+            help="share of the packets which are sent twice, 0 to 1",
+        )
+        parser.add_argument(
+            "--reorder",
+            dest="reorder",
+            default=0.0,
+            type=float,
+            help="share of the packets which are held back, 0 to 1",
+        )
+        parser.add_argument(
+            "--abort",
+            dest="abort",
+            default=0.0,
+            type=float,
+            help="share of the requests answered with an abort, 0 to 1",
+        )
+        parser.add_argument(
+            "--reject",
+            dest="reject",
+            default=0.0,
+            type=float,
+            help="share of the requests answered with a reject, 0 to 1",
+        )
+        parser.add_argument(
+            "--faulty-devices",
+            dest="faulty_devices",
+            default=None,
+            type=int,
+            help="number of devices with the faults, default: all devices",
+        )
+        parser.add_argument(
+            "--timeout",
+            dest="timeout",
+            default=None,
+            type=float,
+            help="seconds to wait for an answer, default: the DAQ read timeout",
+        )
+        parser.add_argument(
+            "--decoders",
+            dest="decoders",
+            action="store_true",
+            help="only compare the generic and the fast presentValue decoders",
+        )
+        parser.add_argument(
+            "--core-loop",
+            dest="core_loop",
+            action="store_true",
+            help="only compare the idle cpu and latencies of the core loops",
+        )
+        parser.add_argument(
+            "--output", dest="output", default=None, type=str, help="json file"
+        )
+        parser.add_argument(
+            "--baseline",
+            dest="baseline",
+            default=None,
+            type=str,
+            help="json file of the results to compare with",
+        )
+        parser.add_argument(
+            "--tolerance",
+            dest="tolerance",
+            default=0.1,
+            type=float,
+            help="accepted relative regression, default 0.1",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            dest="save_baseline",
+            action="store_true",
+            help="write the results to the baseline file instead of comparing",
+        )
+
+    def handle(self, *args, **options):
+        if options["decoders"]:
+            try:
+                results = decoder_benchmark()
+            except ImportError as e:
+                raise CommandError(e)
+            for result in results:
+                self.stdout.write(
+                    "%(type)s : generic %(generic_us).2fus, fast %(fast_us).2fus, "
+                    "%(speedup).1fx" % result
+                )
+            return
+        if options["core_loop"]:
+            try:
+                results = core_loop_benchmark()
+            except (ImportError, RuntimeError) as e:
+                raise CommandError(e)
+            for result in results:
+                self.stdout.write(
+                    "%(loop)s : idle cpu %(idle_cpu).2f%%, wake up p50 "
+                    "%(wake_up_p50).6fs p99 %(wake_up_p99).6fs, request p50 "
+                    "%(request_p50).6fs p99 %(request_p99).6fs"
+                    % dict(result, idle_cpu=result["idle_cpu"] * 100)
+                )
+            return
+        if options["save_baseline"] and options["baseline"] is None:
+            raise CommandError("--save-baseline needs --baseline")
+        results = []
+        for name in options["scenarios"] or ["100", "1k"]:
+            points, devices = SCENARIOS[name]
+            for mode in options["modes"] or list(ACQUISITION_MODES.keys()):
+                try:
+                    result = run_benchmark(
+                        points,
+                        devices,
+                        mode=mode,
+                        cycles=options["cycles"],
+                        timeout=options["timeout"],
+                        latency=options["latency"] / 1000.0,
+                        jitter=options["jitter"] / 1000.0,
+                        loss=options["loss"],
+                        duplicate=options["duplicate"],
+                        reorder=options["reorder"],
+                        abort=options["abort"],
+                        reject=options["reject"],
+                        faulty_devices=options["faulty_devices"],
+                    )
+                except (ImportError, RuntimeError) as e:
+                    raise CommandError(e)
+                result["name"] = name
+                results.append(result)
+                self.stdout.write(
+                    "%s %s : %d points from %d devices, %d failed reads, "
+                    "%.0f points/s, "
+                    "cycle p50 %.3fs p95 %.3fs p99 %.3fs, "
+                    "%.3fs cpu per 1k points, %d kB max rss"
+                    % (
+                        name,
+                        mode,
+                        result["points"],
+                        result["devices"],
+                        result["points_failed"] or 0,
+                        result["points_per_second"] or 0,
+                        result["cycle_p50"] or 0,
+                        result["cycle_p95"] or 0,
+                        result["cycle_p99"] or 0,
+                        result["cpu_per_1k_points"] or 0,
+                        result["max_rss_kb"],
+                    )
+                )
+                if result["simulator_statistics"]:
+                    self.stdout.write(
+                        "    simulator : "
+                        + ", ".join(
+                            "%d %s" % (value, key)
+                            for key, value in sorted(
+                                result["simulator_statistics"].items()
+                            )
+                        )
+                    )
+
+        if options["output"] is not None:
+            write_results(options["output"], results)
+        if options["baseline"] is None:
+            return
+        if options["save_baseline"]:
+            write_results(options["baseline"], results)
+            self.stdout.write("baseline written to %s" % options["baseline"])
+            return
+        try:
+            baseline = read_results(options["baseline"])
+        except (OSError, ValueError) as e:
+            raise CommandError("baseline %s : %s" % (options["baseline"], e))
+        regressions = compare(results, baseline, options["tolerance"])
+        if regressions:
+            raise CommandError(
+                "regressions beyond %.0f%% :\n%s"
+                % (options["tolerance"] * 100, "\n".join(regressions))
+            )
+        self.stdout.write("no regression beyond %.0f%%" % (options["tolerance"] * 100))
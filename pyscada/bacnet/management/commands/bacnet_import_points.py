@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import Device
+from pyscada.bacnet.models import BACnetDevice
+from pyscada.bacnet.points import read_ede, read_csv, import_points
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "import BACnet points of a remote device from an EDE file or a csv point list"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("filename", type=str, help="EDE or csv file to import")
+        parser.add_argument(
+            "--device",
+            dest="device",
+            required=True,
+            type=str,
+            help="id or short name of the remote BACnet device",
+        )
+        parser.add_argument(
+            "--format",
+            dest="format",
+            default=None,
+            choices=["ede", "csv"],
+            help="file format, default: ede for .ede files, csv otherwise",
+        )
+        parser.add_argument(
+            "--state-texts",
+            dest="state_texts",
+            default=None,
+            type=str,
+            help="EDE state text file",
+        )
+        parser.add_argument(
+            "--device-instance",
+            dest="device_instance",
+            default=None,
+            type=int,
+            help="only import the EDE objects of this BACnet device instance",
+        )
+        parser.add_argument(
+            "--encoding", dest="encoding", default="utf-8-sig", type=str
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options["device"].isdigit():
+                device = Device.objects.get(pk=int(options["device"]))
+            else:
+                device = Device.objects.get(short_name=options["device"])
+        except (Device.DoesNotExist, Device.MultipleObjectsReturned) as e:
+            raise CommandError("device %s : %s" % (options["device"], e))
+        if not hasattr(device, "bacnetdevice") or device.bacnetdevice.device_type != 1:
+            raise CommandError("%s is not a remote BACnet device" % device)
+
+        with open(options["filename"], encoding=options["encoding"]) as f:
+            text = f.read()
+        file_format = options["format"]
+        if file_format is None:
+            file_format = (
+                "ede" if options["filename"].lower().endswith(".ede") else "csv"
+            )
+        if file_format == "ede":
+            state_texts = None
+            if options["state_texts"] is not None:
+                with open(options["state_texts"], encoding=options["encoding"]) as f:
+                    state_texts = f.read()
+            points = read_ede(text, state_texts, options["device_instance"])
+        else:
+            points = read_csv(text)
+
+        result = import_points(device, points)
+        self.stdout.write(
+            "%d points read, %d created, %d updated, %d unchanged"
+            % (len(points), result["created"], result["updated"], result["unchanged"])
+        )
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import Device
+from pyscada.bacnet.points import (
+    object_types,
+    read_discovered_objects,
+    provision_points,
+)
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "create the variables of a remote BACnet device from its discovered objects"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "device", type=str, help="id or short name of the remote BACnet device"
+        )
+        parser.add_argument(
+            "--object-type",
+            dest="object_types",
+            action="append",
+            default=[],
+            help="object type name or number, can be repeated",
+        )
+        parser.add_argument(
+            "--name",
+            dest="name_pattern",
+            default=None,
+            type=str,
+            help="object name pattern, e.g. *temp*",
+        )
+        parser.add_argument(
+            "--units",
+            dest="units",
+            action="append",
+            default=[],
+            help="BACnet engineering units name, can be repeated",
+        )
+        parser.add_argument(
+            "--dry-run",
+            dest="dry_run",
+            action="store_true",
+            help="only list the matching objects",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options["device"].isdigit():
+                device = Device.objects.get(pk=int(options["device"]))
+            else:
+                device = Device.objects.get(short_name=options["device"])
+        except (Device.DoesNotExist, Device.MultipleObjectsReturned) as e:
+            raise CommandError("device %s : %s" % (options["device"], e))
+        if not hasattr(device, "bacnetdevice") or device.bacnetdevice.device_type != 1:
+            raise CommandError("%s is not a remote BACnet device" % device)
+
+        object_type_ids = []
+        for object_type in options["object_types"]:
+            if object_type.isdigit():
+                object_type_ids.append(int(object_type))
+            elif object_type in object_types:
+                object_type_ids.append(object_types[object_type])
+            else:
+                raise CommandError("unknown object type %s" % object_type)
+
+        if options["dry_run"]:
+            points = read_discovered_objects(
+                device.bacnetdevice,
+                object_type_ids,
+                options["name_pattern"],
+                options["units"],
+            )
+            for point in points:
+                self.stdout.write(
+                    "%s %d %s %s"
+                    % (
+                        point["object_type"],
+                        point["object_identifier"],
+                        point["name"],
+                        point["unit"],
+                    )
+                )
+            return
+        result = provision_points(
+            device, object_type_ids, options["name_pattern"], options["units"]
+        )
+        self.stdout.write(
+            "%d points read, %d created, %d updated, %d unchanged"
+            % (
+                sum(result.values()),
+                result["created"],
+                result["updated"],
+                result["unchanged"],
+            )
+        )
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import Device
+from pyscada.bacnet import PROTOCOL_ID
+from pyscada.bacnet.models import BACnetDevice, BACnetVariable, BACnetTrendLog
+from pyscada.bacnet.points import (
+    save_discovered_objects,
+    provision_points,
+    object_types,
+)
+from pyscada.bacnet.simulator import DeviceFarm
+
+from django.core.management.base import BaseCommand, CommandError
+
+from threading import Timer
+
+
+class Command(BaseCommand):
+    help = "run simulated BACnet/IP devices, device n listens on port + n"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--devices", dest="devices", default=1, type=int)
+        parser.add_argument(
+            "--objects",
+            dest="objects",
+            default=10,
+            type=int,
+            help="analog, binary and multistate inputs per device",
+        )
+        parser.add_argument(
+            "--writeable",
+            dest="writeable",
+            default=1,
+            type=int,
+            help="analog, binary and multistate values per device",
+        )
+        parser.add_argument("--ip", dest="ip", default="127.0.0.1", type=str)
+        parser.add_argument("--port", dest="port", default=47809, type=int)
+        parser.add_argument(
+            "--device-instance",
+            dest="device_instance",
+            default=100000,
+            type=int,
+            help="device instance of the first device",
+        )
+        parser.add_argument(
+            "--latency",
+            dest="latency",
+            default=0.0,
+            type=float,
+            help="response latency in ms",
+        )
+        parser.add_argument(
+            "--jitter",
+            dest="jitter",
+            default=0.0,
+            type=float,
+            help="response latency jitter in ms",
+        )
+        parser.add_argument(
+            "--loss",
+            dest="loss",
+            default=0.0,
+            type=float,
+            help="share of the packets which are dropped, 0 to 1",
+        )
+        parser.add_argument(
+            "--duplicate",
+            dest="duplicate",
+            default=0.0,
+            type=float,
+            help="share of the packets which are sent twice, 0 to 1",
+        )
+        parser.add_argument(
+            "--reorder",
+            dest="reorder",
+            default=0.0,
+            type=float,
+            help="share of the packets which are held back, 0 to 1",
+        )
+        parser.add_argument(
+            "--abort",
+            dest="abort",
+            default=0.0,
+            type=float,
+            help="share of the confirmed requests answered with an abort, 0 to 1",
+        )
+        parser.add_argument(
+            "--reject",
+            dest="reject",
+            default=0.0,
+            type=float,
+            help="share of the confirmed requests answered with a reject, 0 to 1",
+        )
+        parser.add_argument(
+            "--faulty-devices",
+            dest="faulty_devices",
+            default=None,
+            type=int,
+            help="number of devices with the faults, default: all devices",
+        )
+        parser.add_argument("--max-apdu", dest="max_apdu", default=1024, type=int)
+        parser.add_argument(
+            "--trend-logs",
+            dest="trend_logs",
+            default=0,
+            type=int,
+            help="trend logs per device logging the first analog inputs at "
+            "each value update",
+        )
+        parser.add_argument(
+            "--buffer-size",
+            dest="buffer_size",
+            default=1000,
+            type=int,
+            help="records kept by the trend logs",
+        )
+        parser.add_argument(
+            "--update-interval",
+            dest="update_interval",
+            default=1.0,
+            type=float,
+            help="seconds between value changes",
+        )
+        parser.add_argument(
+            "--duration",
+            dest="duration",
+            default=0.0,
+            type=float,
+            help="stop after seconds, default: run until interrupted",
+        )
+        parser.add_argument(
+            "--provision",
+            dest="provision",
+            default=None,
+            type=str,
+            help="id or short name of a local BACnet device, create the "
+            "simulated devices and their variables as its remote devices",
+        )
+
+    def handle(self, *args, **options):
+        farm = DeviceFarm(
+            devices=options["devices"],
+            ip=options["ip"],
+            port=options["port"],
+            device_instance=options["device_instance"],
+            update_interval=options["update_interval"],
+            objects=options["objects"],
+            writeable=options["writeable"],
+            max_apdu=options["max_apdu"],
+            trend_logs=options["trend_logs"],
+            buffer_size=options["buffer_size"],
+            latency=options["latency"] / 1000.0,
+            jitter=options["jitter"] / 1000.0,
+            loss=options["loss"],
+            duplicate=options["duplicate"],
+            reorder=options["reorder"],
+            abort=options["abort"],
+            reject=options["reject"],
+            faulty_devices=options["faulty_devices"],
+        )
+        if options["provision"] is not None:
+            self.provision(farm, options["provision"], options["trend_logs"])
+        for address, device_instance in farm.addresses():
+            self.stdout.write("device %d at %s" % (device_instance, address))
+
+        if options["duration"] > 0:
+            Timer(options["duration"], farm.stop).start()
+        try:
+            farm.run()
+        finally:
+            farm.close()
+        self.stdout.write(
+            ", ".join(
+                "%d %s" % (value, key)
+                for key, value in sorted(farm.statistics().items())
+            )
+        )
+
+    def provision(self, farm, local_device, trend_logs=0):
+        try:
+            if local_device.isdigit():
+                local = Device.objects.get(pk=int(local_device))
+            else:
+                local = Device.objects.get(short_name=local_device)
+        except (Device.DoesNotExist, Device.MultipleObjectsReturned) as e:
+            raise CommandError("device %s : %s" % (local_device, e))
+        if not hasattr(local, "bacnetdevice") or local.bacnetdevice.device_type != 0:
+            raise CommandError("%s is not a local BACnet device" % local)
+
+        objects = farm.discovered_objects()
+        for address, device_instance in farm.addresses():
+            ip, port = address.split(":")
+            device, _ = Device.objects.get_or_create(
+                short_name="sim-%d" % device_instance,
+                defaults=dict(
+                    protocol_id=PROTOCOL_ID,
+                    description="simulated BACnet device",
+                    polling_interval=local.polling_interval,
+                ),
+            )
+            bacnet_device = BACnetDevice.objects.filter(bacnet_device=device).first()
+            if bacnet_device is None:
+                bacnet_device = BACnetDevice(bacnet_device=device)
+            bacnet_device.device_type = 1
+            bacnet_device.ip_address = ip
+            bacnet_device.port = port
+            bacnet_device.bacnet_local_device = local
+            bacnet_device.save()
+            device.bacnetdevice = bacnet_device
+            save_discovered_objects(bacnet_device, objects[address])
+            result = provision_points(device)
+            for bacnet_variable in BACnetVariable.objects.filter(
+                bacnet_variable__device=device,
+                object_type=object_types["analogInput"],
+                object_identifier__lte=trend_logs,
+            ):
+                BACnetTrendLog.objects.get_or_create(
+                    bacnet_variable=bacnet_variable,
+                    defaults=dict(trend_log_instance=bacnet_variable.object_identifier),
+                )
+            self.stdout.write(
+                "%s : %d variables created, %d updated"
+                % (device, result["created"], result["updated"])
+            )
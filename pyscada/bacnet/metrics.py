@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+
+from collections import deque
+from time import time, strftime
+import cProfile
+import glob
+import json
+import os
+import tempfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from bacpypes.apdu import AbortReason, RejectReason
+
+    abort_reasons = set(AbortReason.enumerations.keys())
+    reject_reasons = set(RejectReason.enumerations.keys())
+except ImportError:
+    abort_reasons = set()
+    reject_reasons = set()
+
+# abort reasons of requests without answer
+timeout_reasons = {"Timeout", "noResponse", "tsmTimeout", "serverTimeout"}
+
+# name: (type, help)
+METRICS = {
+    "bacnet_requests_total": ("counter", "BACnet requests sent"),
+    "bacnet_request_errors_total": (
+        "counter",
+        "BACnet requests failed, by kind: timeout, abort, reject or error",
+    ),
+    "bacnet_request_duration_seconds": (
+        "histogram",
+        "duration of the BACnet requests",
+    ),
+    "bacnet_cycle_duration_seconds": (
+        "histogram",
+        "duration of the DAQ process cycles",
+    ),
+    "bacnet_cycle_overruns_total": (
+        "counter",
+        "DAQ process cycles longer than the polling interval",
+    ),
+    "bacnet_discovered_devices": ("gauge", "remote devices found by the discovery"),
+    "bacnet_cycle_phase_seconds_total": (
+        "counter",
+        "time spent by the acquisition cycles of a device in each phase",
+    ),
+    "bacnet_foreign_device_registered": (
+        "gauge",
+        "1 when the BBMD accepted the foreign device registration",
+    ),
+    "bacnet_quarantined_references": (
+        "gauge",
+        "references not read anymore after a permanent error",
+    ),
+    "bacnet_route_throttle_seconds_total": (
+        "counter",
+        "time the requests to the devices behind a router waited for the rate "
+        "limit of the route",
+    ),
+}
+
+# phases of an acquisition cycle: build the requests, wait for the answers,
+# decode the answers, convert the values, update the variables
+PHASES = ("encode", "network", "decode", "convert", "update")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def metrics_dir():
+    if hasattr(settings, "PYSCADA_BACNET"):
+        if "metrics_dir" in settings.PYSCADA_BACNET:
+            return os.path.expanduser(settings.PYSCADA_BACNET["metrics_dir"])
+    return os.path.join(tempfile.gettempdir(), "pyscada_bacnet_metrics")
+
+
+def metrics_stale_after():
+    if hasattr(settings, "PYSCADA_BACNET"):
+        if "metrics_stale_after" in settings.PYSCADA_BACNET:
+            return float(settings.PYSCADA_BACNET["metrics_stale_after"])
+    return 600.0
+
+
+def cycle_history():
+    if hasattr(settings, "PYSCADA_BACNET"):
+        if "cycle_history" in settings.PYSCADA_BACNET:
+            return int(settings.PYSCADA_BACNET["cycle_history"])
+    return 100
+
+
+def error_kind(exception):
+    """
+    classify a failed request as timeout, abort, reject or error, BAC0 raises
+    aborts and rejects as NoResponseFromController with the reason in the
+    message
+    """
+    message = str(exception)
+    reason = message.rsplit(":", 1)[-1].strip()
+    if reason in timeout_reasons:
+        return "timeout"
+    if reason in abort_reasons:
+        return "abort"
+    if reason in reject_reasons:
+        return "reject"
+    if type(exception).__name__ in ("NoResponseFromController", "Timeout"):
+        return "timeout"
+    return "error"
+
+
+def device_labels(device):
+    """
+    labels of the metrics of a device, the short name of a device is not
+    unique
+    """
+    return (("device_id", str(device.pk)), ("device", str(device)))
+
+
+class CycleTimer:
+    """
+    time spent in each phase by the acquisition cycles of a device, the last
+    cycles are kept in a ring buffer
+    """
+
+    def __init__(self, size, name=""):
+        self.cycles = deque(maxlen=size)
+        self.current = None
+        self.name = name
+
+    def start(self):
+        self.current = dict(start=time(), duration=0.0, requests=0, points=0)
+        for phase in PHASES:
+            self.current[phase] = 0.0
+
+    def add(self, phase, duration):
+        if self.current is not None:
+            self.current[phase] += duration
+
+    def stop(self):
+        cycle = self.current
+        self.current = None
+        if cycle is not None:
+            cycle["duration"] = time() - cycle["start"]
+            self.cycles.append(cycle)
+        return cycle
+
+
+class CycleProfiler:
+    """
+    cProfile of the next cycles of a device, the statistics are written to
+    the metrics directory after the last cycle
+    """
+
+    def __init__(self, device, cycles):
+        self.device = device
+        self.remaining = cycles
+        self.profile = cProfile.Profile()
+
+    def enable(self):
+        self.profile.enable()
+
+    def disable(self):
+        """
+        :return: True after the last cycle
+        """
+        self.profile.disable()
+        self.remaining -= 1
+        if self.remaining > 0:
+            return False
+        path = os.path.join(
+            metrics_dir(),
+            "bacnet-profile-%d-%s.prof" % (self.device.pk, strftime("%Y%m%d-%H%M%S")),
+        )
+        try:
+            os.makedirs(metrics_dir(), exist_ok=True)
+            self.profile.dump_stats(path)
+            logger.info("BACnet profile of %s written to %s" % (self.device, path))
+        except OSError as e:
+            logger.warning("BACnet profile not written to %s : %s" % (path, e))
+        return True
+
+
+class Metrics:
+    """
+    counters, gauges and histograms of a DAQ process, written to a json file
+    per process and aggregated by the metrics view
+    """
+
+    flush_interval = 10.0
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.timers = {}
+        self._last_flush = 0
+
+    def _check_pid(self):
+        # a forked process starts with empty metrics
+        if self.pid != os.getpid():
+            self.__init__()
+
+    def inc(self, name, labels=(), value=1):
+        self._check_pid()
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, labels=()):
+        self._check_pid()
+        self.gauges[(name, labels)] = value
+
+    def observe(self, name, value, labels=()):
+        self._check_pid()
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            # bucket counts, +Inf count, sum
+            histogram = self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram[i] += 1
+                break
+        else:
+            histogram[len(BUCKETS)] += 1
+        histogram[-1] += value
+
+    def cycle_timer(self, device):
+        """
+        return the cycle timer of device
+        """
+        self._check_pid()
+        timer = self.timers.get(device.pk)
+        if timer is None:
+            timer = self.timers[device.pk] = CycleTimer(cycle_history(), str(device))
+        return timer
+
+    def cycle_done(self, device):
+        """
+        stop the current cycle of device and add its phases to the counters
+        """
+        cycle = self.cycle_timer(device).stop()
+        if cycle is not None:
+            for phase in PHASES:
+                self.inc(
+                    "bacnet_cycle_phase_seconds_total",
+                    device_labels(device) + (("phase", phase),),
+                    cycle[phase],
+                )
+        return cycle
+
+    def request(self, device, service, duration, exception=None):
+        """
+        count a request to device and its duration
+        """
+        labels = device_labels(device) + (("service", service),)
+        self.inc("bacnet_requests_total", labels)
+        self.observe("bacnet_request_duration_seconds", duration, labels)
+        if exception is not None:
+            self.inc(
+                "bacnet_request_errors_total",
+                labels + (("kind", error_kind(exception)),),
+            )
+
+    def flush(self, force=False):
+        """
+        write the metrics file of this process, at most every flush_interval
+        seconds
+        """
+        self._check_pid()
+        if not force and time() - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = time()
+        data = []
+        for (name, labels), value in self.counters.items():
+            data.append([name, dict(labels), value])
+        for (name, labels), value in self.gauges.items():
+            data.append([name, dict(labels), value])
+        for (name, labels), value in self.histograms.items():
+            data.append([name, dict(labels), value])
+        cycles = {}
+        for device_id, timer in self.timers.items():
+            cycles[device_id] = dict(device=timer.name, cycles=list(timer.cycles))
+        path = os.path.join(metrics_dir(), "bacnet-%d.json" % self.pid)
+        try:
+            os.makedirs(metrics_dir(), exist_ok=True)
+            with open(path + ".tmp", "w") as f:
+                json.dump(dict(metrics=data, cycles=cycles), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.debug("BACnet metrics not written to %s : %s" % (path, e))
+
+    def remove(self):
+        """
+        remove the metrics file of this process
+        """
+        try:
+            os.remove(os.path.join(metrics_dir(), "bacnet-%d.json" % self.pid))
+        except OSError:
+            pass
+
+
+metrics = Metrics()
+
+
+def _read_files():
+    stale = time() - metrics_stale_after()
+    for path in glob.glob(os.path.join(metrics_dir(), "bacnet-*.json")):
+        try:
+            if os.path.getmtime(path) < stale:
+                continue
+            with open(path) as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def read_cycles():
+    """
+    the last acquisition cycles of the devices of the running DAQ processes
+
+    :return: dict {device id: {"device": name, "cycles": [cycle, ...]}}
+    """
+    result = {}
+    for data in _read_files():
+        for device_id, timer in data.get("cycles", {}).items():
+            device = result.setdefault(
+                device_id, dict(device=timer["device"], cycles=[])
+            )
+            device["cycles"].extend(timer["cycles"])
+    return result
+
+
+def read_metrics():
+    """
+    aggregate the metrics files of the running DAQ processes
+
+    :return: dict {(name, labels): value}
+    """
+    result = {}
+    for data in _read_files():
+        for name, labels, value in data.get("metrics", []):
+            key = (name, tuple(sorted(labels.items())))
+            if name not in METRICS:
+                continue
+            if METRICS[name][0] == "histogram":
+                if key in result:
+                    value = [a + b for a, b in zip(result[key], value)]
+            elif METRICS[name][0] == "counter":
+                value = result.get(key, 0) + value
+            result[key] = value
+    return result
+
+
+def _labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(
+            '%s="%s"'
+            % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " "))
+            for k, v in labels
+        )
+        + "}"
+    )
+
+
+def prometheus_text(data):
+    """
+    render the aggregated metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        items = sorted((k[1], v) for k, v in data.items() if k[0] == name)
+        if not items:
+            continue
+        lines.append("# HELP %s %s" % (name, help_text))
+        lines.append("# TYPE %s %s" % (name, metric_type))
+        for labels, value in items:
+            if metric_type != "histogram":
+                lines.append("%s%s %s" % (name, _labels(labels), repr(float(value))))
+                continue
+            count = 0
+            for bound, bucket in zip(BUCKETS + ("+Inf",), value[:-1]):
+                count += bucket
+                lines.append(
+                    "%s_bucket%s %d" % (name, _labels(labels, (("le", bound),)), count)
+                )
+            lines.append("%s_sum%s %s" % (name, _labels(labels), repr(value[-1])))
+            lines.append("%s_count%s %d" % (name, _labels(labels), count))
+    return "\n".join(lines) + "\n"
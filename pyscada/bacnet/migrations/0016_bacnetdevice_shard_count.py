@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0015_auto_20220203_1442"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="shard_count",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                help_text="Local device only: number of DAQ processes sharing the remote devices. Shard n binds to port + n",
+            ),
+        ),
+    ]
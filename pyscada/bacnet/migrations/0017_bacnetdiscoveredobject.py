@@ -0,0 +1,67 @@
+# Generated by Django 4.2 on 2026-10-19 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0016_bacnetdevice_shard_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BACnetDiscoveredObject",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("object_type", models.PositiveIntegerField()),
+                ("object_identifier", models.PositiveIntegerField()),
+                (
+                    "object_name",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                (
+                    "description",
+                    models.CharField(blank=True, default="", max_length=400),
+                ),
+                (
+                    "units",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="BACnet engineering units",
+                        max_length=80,
+                    ),
+                ),
+                (
+                    "state_texts",
+                    models.TextField(
+                        blank=True, default="", help_text="state texts separated by |"
+                    ),
+                ),
+                ("last_seen", models.DateTimeField(auto_now=True)),
+                (
+                    "bacnet_device",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="bacnet.bacnetdevice",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "BACnet Discovered Object",
+                "verbose_name_plural": "BACnet Discovered Objects",
+                "unique_together": {
+                    ("bacnet_device", "object_type", "object_identifier")
+                },
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0017_bacnetdiscoveredobject"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="profile_cycles",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                help_text="Profile the next acquisition cycles of this device with cProfile, the statistics are written to the metrics directory",
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2 on 2026-10-19 13:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0018_bacnetdevice_profile_cycles"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="acquisition_mode",
+            field=models.PositiveSmallIntegerField(
+                choices=[(0, "ReadProperty"), (1, "ReadPropertyMultiple")],
+                default=0,
+                help_text="Remote device only: ReadPropertyMultiple reads the properties of several objects with one request",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bacnetvariable",
+            name="read_quality",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (0, "presentValue only"),
+                    (1, "statusFlags and reliability"),
+                    (2, "statusFlags, reliability and outOfService"),
+                ],
+                default=0,
+                help_text="properties read with the presentValue in the same request to track the quality of the values",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bacnetvariable",
+            name="quality_of",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="store the quality bitfield of this BACnet variable instead of a value: bits 0-3 inAlarm, fault, overridden, outOfService, bits 4-19 reliability",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="quality_variables",
+                to="bacnet.bacnetvariable",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bacnetvariable",
+            name="discard_bad_quality",
+            field=models.BooleanField(
+                default=False,
+                help_text="do not store values of objects in fault, out of service or not reliable",
+            ),
+        ),
+    ]
@@ -0,0 +1,508 @@
+# Generated by Django 4.2 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0019_acquisition_mode_read_quality"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bacnetvariable",
+            name="property_id",
+            field=models.PositiveIntegerField(
+                choices=[
+                    (244, "absenteeLimit"),
+                    (175, "acceptedModes"),
+                    (245, "accessAlarmEvents"),
+                    (246, "accessDoors"),
+                    (247, "accessEvent"),
+                    (248, "accessEventAuthenticationFactor"),
+                    (249, "accessEventCredential"),
+                    (322, "accessEventTag"),
+                    (250, "accessEventTime"),
+                    (251, "accessTransactionEvents"),
+                    (252, "accompaniment"),
+                    (253, "accompanimentTime"),
+                    (0, "ackedTransitions"),
+                    (1, "ackRequired"),
+                    (2, "action"),
+                    (3, "actionText"),
+                    (254, "activationTime"),
+                    (255, "activeAuthenticationPolicy"),
+                    (481, "activeCovMultipleSubscriptions"),
+                    (152, "activeCovSubscriptions"),
+                    (4, "activeText"),
+                    (5, "activeVtSessions"),
+                    (212, "actualShedLevel"),
+                    (176, "adjustValue"),
+                    (6, "alarmValue"),
+                    (7, "alarmValues"),
+                    (193, "alignIntervals"),
+                    (8, "all"),
+                    (365, "allowGroupDelayInhibit"),
+                    (9, "allWritesSuccessful"),
+                    (399, "apduLength"),
+                    (10, "apduSegmentTimeout"),
+                    (11, "apduTimeout"),
+                    (12, "applicationSoftwareVersion"),
+                    (13, "archive"),
+                    (256, "assignedAccessRights"),
+                    (447, "assignedLandingCalls"),
+                    (124, "attemptedSamples"),
+                    (501, "auditableOperations"),
+                    (500, "auditablePriorityFilter"),
+                    (498, "auditLevel"),
+                    (499, "auditNotificationRecipient"),
+                    (497, "auditSourceReporter"),
+                    (257, "authenticationFactors"),
+                    (258, "authenticationPolicyList"),
+                    (259, "authenticationPolicyNames"),
+                    (260, "authenticationStatus"),
+                    (364, "authorizationExemptions"),
+                    (261, "authorizationMode"),
+                    (169, "autoSlaveDiscovery"),
+                    (125, "averageValue"),
+                    (338, "backupAndRestoreState"),
+                    (153, "backupFailureTimeout"),
+                    (339, "backupPreparationTime"),
+                    (407, "bacnetIPGlobalAddress"),
+                    (408, "bacnetIPMode"),
+                    (409, "bacnetIPMulticastAddress"),
+                    (410, "bacnetIPNATTraversal"),
+                    (412, "bacnetIPUDPPort"),
+                    (435, "bacnetIPv6Mode"),
+                    (440, "bacnetIPv6MulticastAddress"),
+                    (438, "bacnetIPv6UDPPort"),
+                    (327, "baseDeviceSecurityPolicy"),
+                    (413, "bbmdAcceptFDRegistrations"),
+                    (414, "bbmdBroadcastDistributionTable"),
+                    (415, "bbmdForeignDeviceTable"),
+                    (262, "belongsTo"),
+                    (14, "bias"),
+                    (342, "bitMask"),
+                    (343, "bitText"),
+                    (373, "blinkWarnEnable"),
+                    (126, "bufferSize"),
+                    (448, "carAssignedDirection"),
+                    (449, "carDoorCommand"),
+                    (450, "carDoorStatus"),
+                    (451, "carDoorText"),
+                    (452, "carDoorZone"),
+                    (453, "carDriveStatus"),
+                    (454, "carLoad"),
+                    (455, "carLoadUnits"),
+                    (456, "carMode"),
+                    (457, "carMovingDirection"),
+                    (458, "carPosition"),
+                    (15, "changeOfStateCount"),
+                    (16, "changeOfStateTime"),
+                    (416, "changesPending"),
+                    (366, "channelNumber"),
+                    (127, "clientCovIncrement"),
+                    (417, "command"),
+                    (430, "commandTimeArray"),
+                    (154, "configurationFiles"),
+                    (367, "controlGroups"),
+                    (19, "controlledVariableReference"),
+                    (20, "controlledVariableUnits"),
+                    (21, "controlledVariableValue"),
+                    (177, "count"),
+                    (178, "countBeforeChange"),
+                    (179, "countChangeTime"),
+                    (22, "covIncrement"),
+                    (180, "covPeriod"),
+                    (128, "covResubscriptionInterval"),
+                    (349, "covuPeriod"),
+                    (350, "covuRecipients"),
+                    (263, "credentialDisable"),
+                    (265, "credentials"),
+                    (266, "credentialsInZone"),
+                    (264, "credentialStatus"),
+                    (431, "currentCommandPriority"),
+                    (155, "databaseRevision"),
+                    (23, "dateList"),
+                    (24, "daylightSavingsStatus"),
+                    (267, "daysRemaining"),
+                    (25, "deadband"),
+                    (374, "defaultFadeTime"),
+                    (492, "defaultPresentValue"),
+                    (375, "defaultRampRate"),
+                    (376, "defaultStepIncrement"),
+                    (490, "defaultSubordinateRelationship"),
+                    (393, "defaultTimeout"),
+                    (502, "deleteOnForward"),
+                    (484, "deployedProfileLocation"),
+                    (26, "derivativeConstant"),
+                    (27, "derivativeConstantUnits"),
+                    (28, "description"),
+                    (29, "descriptionOfHalt"),
+                    (30, "deviceAddressBinding"),
+                    (31, "deviceType"),
+                    (507, "deviceUUID"),
+                    (156, "directReading"),
+                    (328, "distributionKeyRevision"),
+                    (329, "doNotHide"),
+                    (226, "doorAlarmState"),
+                    (227, "doorExtendedPulseTime"),
+                    (228, "doorMembers"),
+                    (229, "doorOpenTooLongTime"),
+                    (230, "doorPulseTime"),
+                    (231, "doorStatus"),
+                    (232, "doorUnlockDelayTime"),
+                    (213, "dutyWindow"),
+                    (32, "effectivePeriod"),
+                    (386, "egressActive"),
+                    (377, "egressTime"),
+                    (33, "elapsedActiveTime"),
+                    (459, "elevatorGroup"),
+                    (133, "enable"),
+                    (460, "energyMeter"),
+                    (461, "energyMeterRef"),
+                    (268, "entryPoints"),
+                    (34, "errorLimit"),
+                    (462, "escalatorMode"),
+                    (354, "eventAlgorithmInhibit"),
+                    (355, "eventAlgorithmInhibitRef"),
+                    (353, "eventDetectionEnable"),
+                    (35, "eventEnable"),
+                    (351, "eventMessageTexts"),
+                    (352, "eventMessageTextsConfig"),
+                    (83, "eventParameters"),
+                    (36, "eventState"),
+                    (130, "eventTimeStamps"),
+                    (37, "eventType"),
+                    (38, "exceptionSchedule"),
+                    (368, "executionDelay"),
+                    (269, "exitPoints"),
+                    (214, "expectedShedLevel"),
+                    (270, "expirationTime"),
+                    (271, "extendedTimeEnable"),
+                    (272, "failedAttemptEvents"),
+                    (273, "failedAttempts"),
+                    (274, "failedAttemptsTime"),
+                    (388, "faultHighLimit"),
+                    (389, "faultLowLimit"),
+                    (358, "faultParameters"),
+                    (463, "faultSignals"),
+                    (359, "faultType"),
+                    (39, "faultValues"),
+                    (418, "fdBBMDAddress"),
+                    (419, "fdSubscriptionLifetime"),
+                    (40, "feedbackValue"),
+                    (41, "fileAccessMethod"),
+                    (42, "fileSize"),
+                    (43, "fileType"),
+                    (44, "firmwareRevision"),
+                    (506, "floorNumber"),
+                    (464, "floorText"),
+                    (215, "fullDutyBaseline"),
+                    (323, "globalIdentifier"),
+                    (465, "groupID"),
+                    (346, "groupMemberNames"),
+                    (345, "groupMembers"),
+                    (467, "groupMode"),
+                    (468, "higherDeck"),
+                    (45, "highLimit"),
+                    (46, "inactiveText"),
+                    (394, "initialTimeout"),
+                    (47, "inProcess"),
+                    (378, "inProgress"),
+                    (181, "inputReference"),
+                    (469, "installationID"),
+                    (48, "instanceOf"),
+                    (379, "instantaneousPower"),
+                    (49, "integralConstant"),
+                    (50, "integralConstantUnits"),
+                    (387, "interfaceValue"),
+                    (195, "intervalOffset"),
+                    (400, "ipAddress"),
+                    (401, "ipDefaultGateway"),
+                    (402, "ipDHCPEnable"),
+                    (403, "ipDHCPLeaseTime"),
+                    (404, "ipDHCPLeaseTimeRemaining"),
+                    (405, "ipDHCPServer"),
+                    (406, "ipDNSServer"),
+                    (411, "ipSubnetMask"),
+                    (436, "ipv6Address"),
+                    (442, "ipv6AutoAddressingEnable"),
+                    (439, "ipv6DefaultGateway"),
+                    (443, "ipv6DHCPLeaseTime"),
+                    (444, "ipv6DHCPLeaseTimeRemaining"),
+                    (445, "ipv6DHCPServer"),
+                    (441, "ipv6DNSServer"),
+                    (437, "ipv6PrefixLength"),
+                    (446, "ipv6ZoneIndex"),
+                    (51, "issueConfirmedNotifications"),
+                    (344, "isUTC"),
+                    (330, "keySets"),
+                    (471, "landingCallControl"),
+                    (470, "landingCalls"),
+                    (472, "landingDoorStatus"),
+                    (275, "lastAccessEvent"),
+                    (276, "lastAccessPoint"),
+                    (432, "lastCommandTime"),
+                    (277, "lastCredentialAdded"),
+                    (278, "lastCredentialAddedTime"),
+                    (279, "lastCredentialRemoved"),
+                    (280, "lastCredentialRemovedTime"),
+                    (331, "lastKeyServer"),
+                    (173, "lastNotifyRecord"),
+                    (369, "lastPriority"),
+                    (196, "lastRestartReason"),
+                    (157, "lastRestoreTime"),
+                    (395, "lastStateChange"),
+                    (281, "lastUseTime"),
+                    (166, "lifeSafetyAlarmValues"),
+                    (380, "lightingCommand"),
+                    (381, "lightingCommandDefaultPriority"),
+                    (52, "limitEnable"),
+                    (182, "limitMonitoringInterval"),
+                    (420, "linkSpeed"),
+                    (422, "linkSpeedAutonegotiate"),
+                    (421, "linkSpeeds"),
+                    (53, "listOfGroupMembers"),
+                    (54, "listOfObjectPropertyReferences"),
+                    (55, "listOfSessionKeys"),
+                    (56, "localDate"),
+                    (360, "localForwardingOnly"),
+                    (57, "localTime"),
+                    (58, "location"),
+                    (282, "lockout"),
+                    (283, "lockoutRelinquishTime"),
+                    (233, "lockStatus"),
+                    (131, "logBuffer"),
+                    (132, "logDeviceObjectProperty"),
+                    (183, "loggingObject"),
+                    (184, "loggingRecord"),
+                    (197, "loggingType"),
+                    (134, "logInterval"),
+                    (390, "lowDiffLimit"),
+                    (473, "lowerDeck"),
+                    (59, "lowLimit"),
+                    (423, "macAddress"),
+                    (474, "machineRoomID"),
+                    (158, "maintenanceRequired"),
+                    (475, "makingCarCall"),
+                    (60, "manipulatedVariableReference"),
+                    (170, "manualSlaveAddressBinding"),
+                    (234, "maskedAlarmValues"),
+                    (284, "masterExemption"),
+                    (382, "maxActualValue"),
+                    (62, "maxApduLengthAccepted"),
+                    (285, "maxFailedAttempts"),
+                    (61, "maximumOutput"),
+                    (503, "maximumSendDelay"),
+                    (135, "maximumValue"),
+                    (149, "maximumValueTimestamp"),
+                    (63, "maxInfoFrames"),
+                    (64, "maxMaster"),
+                    (65, "maxPresValue"),
+                    (167, "maxSegmentsAccepted"),
+                    (159, "memberOf"),
+                    (286, "members"),
+                    (347, "memberStatusFlags"),
+                    (383, "minActualValue"),
+                    (66, "minimumOffTime"),
+                    (67, "minimumOnTime"),
+                    (68, "minimumOutput"),
+                    (136, "minimumValue"),
+                    (150, "minimumValueTimestamp"),
+                    (69, "minPresValue"),
+                    (160, "mode"),
+                    (70, "modelName"),
+                    (71, "modificationDate"),
+                    (504, "monitoredObjects"),
+                    (287, "musterPoint"),
+                    (288, "negativeAccessRules"),
+                    (332, "networkAccessSecurityPolicies"),
+                    (424, "networkInterfaceName"),
+                    (425, "networkNumber"),
+                    (426, "networkNumberQuality"),
+                    (427, "networkType"),
+                    (476, "nextStoppingFloor"),
+                    (207, "nodeSubtype"),
+                    (208, "nodeType"),
+                    (17, "notificationClass"),
+                    (137, "notificationThreshold"),
+                    (72, "notifyType"),
+                    (73, "numberOfApduRetries"),
+                    (289, "numberOfAuthenticationPolicies"),
+                    (74, "numberOfStates"),
+                    (75, "objectIdentifier"),
+                    (76, "objectList"),
+                    (77, "objectName"),
+                    (78, "objectPropertyReference"),
+                    (79, "objectType"),
+                    (290, "occupancyCount"),
+                    (291, "occupancyCountAdjust"),
+                    (292, "occupancyCountEnable"),
+                    (293, "occupancyExemption"),
+                    (294, "occupancyLowerLimit"),
+                    (295, "occupancyLowerLimitEnforced"),
+                    (296, "occupancyState"),
+                    (297, "occupancyUpperLimit"),
+                    (298, "occupancyUpperLimitEnforced"),
+                    (477, "operationDirection"),
+                    (161, "operationExpected"),
+                    (80, "optional"),
+                    (81, "outOfService"),
+                    (82, "outputUnits"),
+                    (333, "packetReorderTime"),
+                    (299, "passbackExemption"),
+                    (300, "passbackMode"),
+                    (301, "passbackTimeout"),
+                    (478, "passengerAlarm"),
+                    (84, "polarity"),
+                    (363, "portFilter"),
+                    (302, "positiveAccessRules"),
+                    (384, "power"),
+                    (479, "powerMode"),
+                    (185, "prescale"),
+                    (493, "presentStage"),
+                    (85, "presentValue"),
+                    (86, "priority"),
+                    (87, "priorityArray"),
+                    (88, "priorityForWriting"),
+                    (89, "processIdentifier"),
+                    (361, "processIdentifierFilter"),
+                    (485, "profileLocation"),
+                    (168, "profileName"),
+                    (90, "programChange"),
+                    (91, "programLocation"),
+                    (92, "programState"),
+                    (371, "propertyList"),
+                    (93, "proportionalConstant"),
+                    (94, "proportionalConstantUnits"),
+                    (482, "protocolLevel"),
+                    (96, "protocolObjectTypesSupported"),
+                    (139, "protocolRevision"),
+                    (97, "protocolServicesSupported"),
+                    (98, "protocolVersion"),
+                    (186, "pulseRate"),
+                    (99, "readOnly"),
+                    (303, "reasonForDisable"),
+                    (100, "reasonForHalt"),
+                    (102, "recipientList"),
+                    (141, "recordCount"),
+                    (140, "recordsSinceNotification"),
+                    (483, "referencePort"),
+                    (480, "registeredCarCall"),
+                    (103, "reliability"),
+                    (357, "reliabilityEvaluationInhibit"),
+                    (104, "relinquishDefault"),
+                    (491, "represents"),
+                    (218, "requestedShedLevel"),
+                    (348, "requestedUpdateInterval"),
+                    (105, "required"),
+                    (106, "resolution"),
+                    (202, "restartNotificationRecipients"),
+                    (340, "restoreCompletionTime"),
+                    (341, "restorePreparationTime"),
+                    (428, "routingTable"),
+                    (187, "scale"),
+                    (188, "scaleFactor"),
+                    (174, "scheduleDefault"),
+                    (235, "securedStatus"),
+                    (334, "securityPDUTimeout"),
+                    (335, "securityTimeWindow"),
+                    (107, "segmentationSupported"),
+                    (505, "sendNow"),
+                    (372, "serialNumber"),
+                    (108, "setpoint"),
+                    (109, "setpointReference"),
+                    (162, "setting"),
+                    (219, "shedDuration"),
+                    (220, "shedLevelDescriptions"),
+                    (221, "shedLevels"),
+                    (163, "silenced"),
+                    (171, "slaveAddressBinding"),
+                    (172, "slaveProxyEnable"),
+                    (495, "stageNames"),
+                    (494, "stages"),
+                    (142, "startTime"),
+                    (396, "stateChangeValues"),
+                    (222, "stateDescription"),
+                    (110, "stateText"),
+                    (111, "statusFlags"),
+                    (143, "stopTime"),
+                    (144, "stopWhenFull"),
+                    (391, "strikeCount"),
+                    (209, "structuredObjectList"),
+                    (210, "subordinateAnnotations"),
+                    (211, "subordinateList"),
+                    (487, "subordinateNodeTypes"),
+                    (489, "subordinateRelationships"),
+                    (488, "subordinateTags"),
+                    (362, "subscribedRecipients"),
+                    (305, "supportedFormatClasses"),
+                    (304, "supportedFormats"),
+                    (336, "supportedSecurityAlgorithms"),
+                    (112, "systemStatus"),
+                    (486, "tags"),
+                    (496, "targetReferences"),
+                    (306, "threatAuthority"),
+                    (307, "threatLevel"),
+                    (113, "timeDelay"),
+                    (356, "timeDelayNormal"),
+                    (114, "timeOfActiveTimeReset"),
+                    (203, "timeOfDeviceRestart"),
+                    (115, "timeOfStateCountReset"),
+                    (392, "timeOfStrikeCountReset"),
+                    (397, "timerRunning"),
+                    (398, "timerState"),
+                    (204, "timeSynchronizationInterval"),
+                    (116, "timeSynchronizationRecipients"),
+                    (145, "totalRecordCount"),
+                    (308, "traceFlag"),
+                    (164, "trackingValue"),
+                    (309, "transactionNotificationClass"),
+                    (385, "transition"),
+                    (205, "trigger"),
+                    (117, "units"),
+                    (118, "updateInterval"),
+                    (337, "updateKeySetTimeout"),
+                    (189, "updateTime"),
+                    (310, "userExternalIdentifier"),
+                    (311, "userInformationReference"),
+                    (317, "userName"),
+                    (318, "userType"),
+                    (319, "usesRemaining"),
+                    (119, "utcOffset"),
+                    (206, "utcTimeSynchronizationRecipients"),
+                    (146, "validSamples"),
+                    (190, "valueBeforeChange"),
+                    (192, "valueChangeTime"),
+                    (191, "valueSet"),
+                    (433, "valueSource"),
+                    (434, "valueSourceArray"),
+                    (151, "varianceValue"),
+                    (120, "vendorIdentifier"),
+                    (121, "vendorName"),
+                    (326, "verificationTime"),
+                    (429, "virtualMACAddressTable"),
+                    (122, "vtClassesSupported"),
+                    (123, "weeklySchedule"),
+                    (147, "windowInterval"),
+                    (148, "windowSamples"),
+                    (370, "writeStatus"),
+                    (320, "zoneFrom"),
+                    (165, "zoneMembers"),
+                    (321, "zoneTo"),
+                ],
+                default=85,
+                help_text="property of the object read and written, default presentValue",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bacnetvariable",
+            name="property_array_index",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="array index of the property, empty for the whole property",
+                null=True,
+            ),
+        ),
+    ]
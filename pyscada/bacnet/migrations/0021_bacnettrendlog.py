@@ -0,0 +1,58 @@
+# Generated by Django 4.2 on 2026-10-19 15:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0020_bacnetvariable_property_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BACnetTrendLog",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "trend_log_instance",
+                    models.PositiveIntegerField(
+                        help_text="instance of the Trend Log object of the remote device logging the variable"
+                    ),
+                ),
+                ("active", models.BooleanField(default=True)),
+                (
+                    "last_sequence_number",
+                    models.PositiveBigIntegerField(
+                        blank=True,
+                        help_text="sequence number of the last record retrieved, empty to backfill from the last stored value",
+                        null=True,
+                    ),
+                ),
+                ("last_record_time", models.DateTimeField(blank=True, null=True)),
+                ("last_backfill", models.DateTimeField(blank=True, null=True)),
+                ("records_backfilled", models.PositiveBigIntegerField(default=0)),
+                (
+                    "bacnet_variable",
+                    models.OneToOneField(
+                        help_text="variable receiving the records of the trend log",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trend_log",
+                        to="bacnet.bacnetvariable",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "BACnet Trend Log",
+                "verbose_name_plural": "BACnet Trend Logs",
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2 on 2026-10-19 15:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pyscada", "0080_variableproperty_last_modified"),
+        ("bacnet", "0021_bacnettrendlog"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BACnetExportedVariable",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "object_type",
+                    models.PositiveIntegerField(
+                        choices=[
+                            (2, "analogValue"),
+                            (5, "binaryValue"),
+                            (19, "multiStateValue"),
+                        ],
+                        default=2,
+                    ),
+                ),
+                ("object_instance", models.PositiveIntegerField()),
+                (
+                    "object_name",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="default: the name of the variable",
+                        max_length=255,
+                    ),
+                ),
+                ("active", models.BooleanField(default=True)),
+                (
+                    "bacnet_local_device",
+                    models.ForeignKey(
+                        help_text="local BACnet device serving the variable",
+                        limit_choices_to={
+                            "bacnetdevice__device_type": 0,
+                            "bacnetdevice__isnull": False,
+                        },
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bacnet_exported_variables",
+                        to="pyscada.device",
+                    ),
+                ),
+                (
+                    "variable",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bacnet_exports",
+                        to="pyscada.variable",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "BACnet Exported Variable",
+                "verbose_name_plural": "BACnet Exported Variables",
+                "unique_together": {
+                    ("bacnet_local_device", "object_type", "object_instance")
+                },
+            },
+        ),
+    ]
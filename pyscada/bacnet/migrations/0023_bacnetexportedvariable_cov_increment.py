@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0022_bacnetexportedvariable"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bacnetexportedvariable",
+            name="cov_increment",
+            field=models.FloatField(
+                default=0,
+                help_text="analogValue only: minimum change of the value notified to COV subscribers not requesting their own increment",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-19 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0023_bacnetexportedvariable_cov_increment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="bbmd_address",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Local device only: register as foreign device to the BBMD at ip:port to discover and read devices of other subnets",
+                max_length=100,
+            ),
+        ),
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="bbmd_ttl",
+            field=models.PositiveIntegerField(
+                default=900,
+                help_text="Local device only: seconds the foreign device registration is kept by the BBMD, it is renewed by the BACnet stack",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="bdt",
+            field=models.TextField(
+                blank=True,
+                default="",
+                help_text="Local device only: operate as BBMD with this broadcast distribution table, one peer BBMD ip:port per line, ip/mask to distribute with a directed broadcast. Used instead of the foreign device registration",
+            ),
+        ),
+    ]
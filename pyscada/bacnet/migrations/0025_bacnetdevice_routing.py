@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0024_bacnetdevice_bbmd"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="routed_max_in_flight",
+            field=models.PositiveSmallIntegerField(
+                default=2,
+                help_text="Local device only: requests waiting for an answer at the same time per router, for the remote devices behind a router",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="routed_requests_per_second",
+            field=models.FloatField(
+                default=10.0,
+                help_text="Local device only: requests sent per second and per router, 0 for no limit",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="network_number",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Remote device only: BACnet network of a device behind a router, for example a MS/TP network, empty for the local network",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="mac_address",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Remote device only: address of the device on its network, the MS/TP station for a MS/TP network",
+                max_length=100,
+            ),
+        ),
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="router_address",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Remote device only: router to the network of the device, found by the discovery",
+                max_length=100,
+            ),
+        ),
+    ]
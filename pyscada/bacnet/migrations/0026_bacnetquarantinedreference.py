@@ -0,0 +1,62 @@
+# Generated by Django 4.2 on 2026-10-19 17:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0025_bacnetdevice_routing"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BACnetQuarantinedReference",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "property_name",
+                    models.CharField(
+                        help_text="property of the object not read anymore",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "error",
+                    models.CharField(
+                        help_text="error code of the last failed read",
+                        max_length=100,
+                    ),
+                ),
+                ("since", models.DateTimeField(auto_now_add=True)),
+                ("last_check", models.DateTimeField(blank=True, null=True)),
+                (
+                    "checks",
+                    models.PositiveIntegerField(
+                        default=0, help_text="failed re-checks since the quarantine"
+                    ),
+                ),
+                (
+                    "bacnet_variable",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="quarantine",
+                        to="bacnet.bacnetvariable",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "BACnet Quarantined Reference",
+                "verbose_name_plural": "BACnet Quarantined References",
+                "unique_together": {("bacnet_variable", "property_name")},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-19 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0026_bacnetquarantinedreference"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="bacnetdevice",
+            name="acquisition_mode",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (0, "ReadProperty"),
+                    (1, "ReadPropertyMultiple"),
+                    (2, "Automatic"),
+                ],
+                default=2,
+                help_text="Remote device only: ReadPropertyMultiple reads the properties of several objects with one request, Automatic uses it when the device supports it",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-19 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0027_bacnetdevice_acquisition_mode_automatic"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bacnetdevice",
+            name="objects_enumerated",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Remote device only: last enumeration of the objects by the discovery, empty to enumerate them again at the next start",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-19 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bacnet", "0028_bacnetdevice_objects_enumerated"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="bacnetdevice",
+            name="acquisition_mode",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (0, "ReadProperty"),
+                    (1, "ReadPropertyMultiple"),
+                    (2, "Automatic"),
+                    (3, "COV"),
+                ],
+                default=2,
+                help_text="Remote device only: ReadPropertyMultiple reads the properties of several objects with one request, Automatic uses it when the device supports it, COV subscribes to the changes of the present values and reads the other properties like Automatic",
+            ),
+        ),
+    ]
@@ -11,6 +11,7 @@ from django.dispatch import receiver
 from django.forms.models import BaseInlineFormSet
 from django import forms
 
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
@@ -64,21 +65,156 @@ class BACnetDevice(models.Model):
         help_text="After creating a remote device, "
         "refresh the page until you see the result",
     )
+    shard_count = models.PositiveSmallIntegerField(
+        default=1,
+        help_text="Local device only: number of DAQ processes sharing "
+        "the remote devices. Shard n binds to port + n",
+    )
+    bbmd_address = models.CharField(
+        default="",
+        max_length=100,
+        blank=True,
+        help_text="Local device only: register as foreign device to the BBMD "
+        "at ip:port to discover and read devices of other subnets",
+    )
+    bbmd_ttl = models.PositiveIntegerField(
+        default=900,
+        help_text="Local device only: seconds the foreign device registration "
+        "is kept by the BBMD, it is renewed by the BACnet stack",
+    )
+    bdt = models.TextField(
+        default="",
+        blank=True,
+        help_text="Local device only: operate as BBMD with this broadcast "
+        "distribution table, one peer BBMD ip:port per line, ip/mask to "
+        "distribute with a directed broadcast. Used instead of the foreign "
+        "device registration",
+    )
+    routed_max_in_flight = models.PositiveSmallIntegerField(
+        default=2,
+        help_text="Local device only: requests waiting for an answer at the "
+        "same time per router, for the remote devices behind a router",
+    )
+    routed_requests_per_second = models.FloatField(
+        default=10.0,
+        help_text="Local device only: requests sent per second and per "
+        "router, 0 for no limit",
+    )
+    network_number = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Remote device only: BACnet network of a device behind a "
+        "router, for example a MS/TP network, empty for the local network",
+    )
+    mac_address = models.CharField(
+        default="",
+        max_length=100,
+        blank=True,
+        help_text="Remote device only: address of the device on its network, "
+        "the MS/TP station for a MS/TP network",
+    )
+    router_address = models.CharField(
+        default="",
+        max_length=100,
+        blank=True,
+        help_text="Remote device only: router to the network of the device, "
+        "found by the discovery",
+    )
+    objects_enumerated = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Remote device only: last enumeration of the objects by the "
+        "discovery, empty to enumerate them again at the next start",
+    )
+    acquisition_mode_choices = (
+        (0, "ReadProperty"),
+        (1, "ReadPropertyMultiple"),
+        (2, "Automatic"),
+        (3, "COV"),
+    )
+    acquisition_mode = models.PositiveSmallIntegerField(
+        default=2,
+        choices=acquisition_mode_choices,
+        help_text="Remote device only: ReadPropertyMultiple reads the "
+        "properties of several objects with one request, Automatic uses it "
+        "when the device supports it, COV subscribes to the changes of the "
+        "present values and reads the other properties like Automatic",
+    )
+    profile_cycles = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Profile the next acquisition cycles of this device with "
+        "cProfile, the statistics are written to the metrics directory",
+    )
 
     def __str__(self):
         return self.bacnet_device.short_name
 
+    def shard_index(self, device_id):
+        """
+        return the shard of this local device handling the remote device
+
+        rendezvous hashing keeps the assignment stable: adding a remote
+        device never moves the other ones to another process
+        """
+        if self.shard_count <= 1:
+            return 0
+        return max(
+            range(self.shard_count),
+            key=lambda shard: hashlib.md5(
+                ("%s-%s" % (device_id, shard)).encode()
+            ).hexdigest(),
+        )
+
+    def bdt_entries(self):
+        """
+        broadcast distribution table as a list of addresses, empty when the
+        local device is not a BBMD
+        """
+        return [line.strip() for line in self.bdt.splitlines() if line.strip()]
+
     fk_name = "bacnet_device"
 
     fieldsets = (
-        (None, {"fields": ("bacnet_device", "device_type", "ip_address")}),
+        (
+            None,
+            {
+                "fields": (
+                    "bacnet_device",
+                    "device_type",
+                    "ip_address",
+                    "profile_cycles",
+                )
+            },
+        ),
         (
             "Local BACnet device parameters",
-            {"fields": ("mask", "port", "remote_devices_discovered")},
+            {
+                "fields": (
+                    "mask",
+                    "port",
+                    "shard_count",
+                    "bbmd_address",
+                    "bbmd_ttl",
+                    "bdt",
+                    "routed_max_in_flight",
+                    "routed_requests_per_second",
+                    "remote_devices_discovered",
+                )
+            },
         ),
         (
             "Remote BACnet device parameter",
-            {"fields": ("bacnet_local_device", "remote_devices_variables")},
+            {
+                "fields": (
+                    "bacnet_local_device",
+                    "network_number",
+                    "mac_address",
+                    "router_address",
+                    "acquisition_mode",
+                    "remote_devices_variables",
+                    "objects_enumerated",
+                )
+            },
         ),
     )
 
@@ -121,10 +257,41 @@ class BACnetDeviceProperty(models.Model):
         verbose_name_plural = "BACnet Device Properties"
 
     def name(self):
-        return "none"  # TODO get name from choices
+        try:
+            from bacpypes.basetypes import PropertyIdentifier
+
+            for name, value in PropertyIdentifier.enumerations.items():
+                if value == self.property_id:
+                    return name
+        except ImportError:
+            pass
+        return str(self.property_id)
 
     def __str__(self):
-        return self.bacnet_device.short_name
+        return "%s-%s" % (self.bacnet_device, self.name())
+
+
+class BACnetDiscoveredObject(models.Model):
+    bacnet_device = models.ForeignKey(BACnetDevice, on_delete=models.CASCADE)
+    object_type = models.PositiveIntegerField()
+    object_identifier = models.PositiveIntegerField()
+    object_name = models.CharField(default="", max_length=255, blank=True)
+    description = models.CharField(default="", max_length=400, blank=True)
+    units = models.CharField(
+        default="", max_length=80, blank=True, help_text="BACnet engineering units"
+    )
+    state_texts = models.TextField(
+        default="", blank=True, help_text="state texts separated by |"
+    )
+    last_seen = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "BACnet Discovered Object"
+        verbose_name_plural = "BACnet Discovered Objects"
+        unique_together = (("bacnet_device", "object_type", "object_identifier"),)
+
+    def __str__(self):
+        return "%s-%d" % (self.object_name, self.object_identifier)
 
 
 class BACnetVariable(models.Model):
@@ -146,6 +313,55 @@ class BACnetVariable(models.Model):
     except ImportError:
         pass
     object_type = models.PositiveIntegerField(choices=object_type_choises)
+    property_id_choices = ()
+    try:
+        from bacpypes.basetypes import PropertyIdentifier
+
+        for key, val in PropertyIdentifier.enumerations.items():
+            property_id_choices += (
+                (
+                    val,
+                    key,
+                ),
+            )
+    except ImportError:
+        pass
+    property_id = models.PositiveIntegerField(
+        default=85,
+        choices=property_id_choices,
+        help_text="property of the object read and written, default presentValue",
+    )
+    property_array_index = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="array index of the property, empty for the whole property",
+    )
+    read_quality_choices = (
+        (0, "presentValue only"),
+        (1, "statusFlags and reliability"),
+        (2, "statusFlags, reliability and outOfService"),
+    )
+    read_quality = models.PositiveSmallIntegerField(
+        default=0,
+        choices=read_quality_choices,
+        help_text="properties read with the presentValue in the same request "
+        "to track the quality of the values",
+    )
+    quality_of = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="quality_variables",
+        help_text="store the quality bitfield of this BACnet variable instead "
+        "of a value: bits 0-3 inAlarm, fault, overridden, outOfService, "
+        "bits 4-19 reliability",
+    )
+    discard_bad_quality = models.BooleanField(
+        default=False,
+        help_text="do not store values of objects in fault, out of service "
+        "or not reliable",
+    )
 
     def __str__(self):
         return self.bacnet_variable.name
@@ -157,6 +373,106 @@ class BACnetVariable(models.Model):
     protocol_id = PROTOCOL_ID
 
 
+class BACnetTrendLog(models.Model):
+    bacnet_variable = models.OneToOneField(
+        BACnetVariable,
+        on_delete=models.CASCADE,
+        related_name="trend_log",
+        help_text="variable receiving the records of the trend log",
+    )
+    trend_log_instance = models.PositiveIntegerField(
+        help_text="instance of the Trend Log object of the remote device "
+        "logging the variable"
+    )
+    active = models.BooleanField(default=True)
+    last_sequence_number = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        help_text="sequence number of the last record retrieved, empty to "
+        "backfill from the last stored value",
+    )
+    last_record_time = models.DateTimeField(null=True, blank=True)
+    last_backfill = models.DateTimeField(null=True, blank=True)
+    records_backfilled = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return "%s-%d" % (self.bacnet_variable, self.trend_log_instance)
+
+    class Meta:
+        verbose_name = "BACnet Trend Log"
+        verbose_name_plural = "BACnet Trend Logs"
+
+
+class BACnetQuarantinedReference(models.Model):
+    bacnet_variable = models.ForeignKey(
+        BACnetVariable,
+        on_delete=models.CASCADE,
+        related_name="quarantine",
+    )
+    property_name = models.CharField(
+        max_length=100, help_text="property of the object not read anymore"
+    )
+    error = models.CharField(
+        max_length=100, help_text="error code of the last failed read"
+    )
+    since = models.DateTimeField(auto_now_add=True)
+    last_check = models.DateTimeField(null=True, blank=True)
+    checks = models.PositiveIntegerField(
+        default=0, help_text="failed re-checks since the quarantine"
+    )
+
+    def __str__(self):
+        return "%s-%s" % (self.bacnet_variable, self.property_name)
+
+    class Meta:
+        verbose_name = "BACnet Quarantined Reference"
+        verbose_name_plural = "BACnet Quarantined References"
+        unique_together = (("bacnet_variable", "property_name"),)
+
+
+class BACnetExportedVariable(models.Model):
+    variable = models.ForeignKey(
+        Variable, on_delete=models.CASCADE, related_name="bacnet_exports"
+    )
+    bacnet_local_device = models.ForeignKey(
+        Device,
+        on_delete=models.CASCADE,
+        related_name="bacnet_exported_variables",
+        limit_choices_to={
+            "bacnetdevice__isnull": False,
+            "bacnetdevice__device_type": 0,
+        },
+        help_text="local BACnet device serving the variable",
+    )
+    object_type_choices = (
+        (2, "analogValue"),
+        (5, "binaryValue"),
+        (19, "multiStateValue"),
+    )
+    object_type = models.PositiveIntegerField(default=2, choices=object_type_choices)
+    object_instance = models.PositiveIntegerField()
+    object_name = models.CharField(
+        default="",
+        max_length=255,
+        blank=True,
+        help_text="default: the name of the variable",
+    )
+    cov_increment = models.FloatField(
+        default=0,
+        help_text="analogValue only: minimum change of the value notified to "
+        "COV subscribers not requesting their own increment",
+    )
+    active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return "%s-%d" % (self.get_object_type_display(), self.object_instance)
+
+    class Meta:
+        verbose_name = "BACnet Exported Variable"
+        verbose_name_plural = "BACnet Exported Variables"
+        unique_together = (("bacnet_local_device", "object_type", "object_instance"),)
+
+
 class BACnetVariableProperty(models.Model):
     bacnet_variable = models.ForeignKey(BACnetVariable, on_delete=models.CASCADE)
     id_choices = ()
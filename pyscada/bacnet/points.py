@@ -0,0 +1,553 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import Variable, Unit, Dictionary, DictionaryItem
+from pyscada.bacnet.models import (
+    BACnetVariable,
+    BACnetVariableProperty,
+    BACnetDiscoveredObject,
+)
+from pyscada.bacnet.signals import reinit_daq_daemons
+
+from django.db import transaction
+from django.utils.text import slugify
+
+import csv
+import fnmatch
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from bacpypes.basetypes import EngineeringUnits
+
+    engineering_units = {val: key for key, val in EngineeringUnits.enumerations.items()}
+except ImportError:
+    engineering_units = {}
+
+# pyscada unit names of common BACnet engineering units
+unit_names = {
+    "noUnits": "-",
+    "percent": "%",
+    "degreesCelsius": "°C",
+    "degreesKelvin": "K",
+    "degreesFahrenheit": "°F",
+    "kilowatts": "kW",
+    "watts": "W",
+    "kilowattHours": "kWh",
+    "wattHours": "Wh",
+    "cubicMeters": "m³",
+    "cubicMetersPerHour": "m³/h",
+    "litersPerSecond": "l/s",
+    "bars": "bar",
+    "millibars": "mbar",
+    "pascals": "Pa",
+    "kilopascals": "kPa",
+    "seconds": "sec",
+    "hours": "h",
+    "volts": "V",
+    "amperes": "A",
+    "hertz": "Hz",
+    "percentRelativeHumidity": "%rH",
+    "partsPerMillion": "ppm",
+    "luxes": "lx",
+}
+
+object_types = {key: val for val, key in BACnetVariable.object_type_choises}
+
+# object types written by the provisioning as writeable variables
+writeable_object_types = set(
+    object_types.get(name)
+    for name in ("analogOutput", "binaryOutput", "multiStateOutput")
+)
+
+# fields of the variables set from a point list, a point holds the fields
+# given by the point list, the fields derived from the object type are in its
+# defaults and only set when a variable is created
+VARIABLE_FIELDS = (
+    "description",
+    "unit",
+    "writeable",
+    "value_class",
+    "value_min",
+    "value_max",
+)
+
+# property read by the variables of the points
+PRESENT_VALUE = 85
+
+# BACnet property identifiers stored as BACnetVariableProperty
+HIGH_LIMIT = 45
+LOW_LIMIT = 59
+
+# EDE 2.x columns
+EDE_DEVICE_INSTANCE = 1
+EDE_OBJECT_NAME = 2
+EDE_OBJECT_TYPE = 3
+EDE_OBJECT_INSTANCE = 4
+EDE_DESCRIPTION = 5
+EDE_MIN_PRESENT_VALUE = 7
+EDE_MAX_PRESENT_VALUE = 8
+EDE_SETTABLE = 9
+EDE_HIGH_LIMIT = 11
+EDE_LOW_LIMIT = 12
+EDE_STATE_TEXT_REFERENCE = 13
+EDE_UNIT_CODE = 14
+
+
+def default_value_class(object_type):
+    """
+    value class of the present value of an object type
+    """
+    if object_type in (
+        object_types.get("binaryInput"),
+        object_types.get("binaryOutput"),
+        object_types.get("binaryValue"),
+    ):
+        return "BOOLEAN"
+    if object_type in (
+        object_types.get("multiStateInput"),
+        object_types.get("multiStateOutput"),
+        object_types.get("multiStateValue"),
+    ):
+        return "UINT16"
+    if object_type == object_types.get("accumulator"):
+        return "UINT32"
+    return "FLOAT32"
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rows(text):
+    """
+    split a ; or , separated text in rows
+    """
+    dialect = ";" if text.count(";") >= text.count(",") else ","
+    return [
+        [col.strip() for col in row]
+        for row in csv.reader(io.StringIO(text), delimiter=dialect)
+    ]
+
+
+def read_state_texts(text):
+    """
+    read an EDE state text file, return the texts by reference number
+    """
+    state_texts = {}
+    for row in _rows(text):
+        if len(row) < 2 or not row[0].isdigit():
+            continue
+        state_texts[int(row[0])] = [t for t in row[1:] if t != ""]
+    return state_texts
+
+
+def read_ede(text, state_texts_text=None, device_instance=None):
+    """
+    read the points of an EDE (Engineering Data Exchange) file
+
+    :param device_instance: only read the objects of this BACnet device
+    """
+    state_texts = read_state_texts(state_texts_text) if state_texts_text else {}
+    points = []
+    for row in _rows(text):
+        if len(row) <= EDE_UNIT_CODE:
+            row = row + [""] * (EDE_UNIT_CODE + 1 - len(row))
+        if not (row[EDE_OBJECT_TYPE].isdigit() and row[EDE_OBJECT_INSTANCE].isdigit()):
+            # header, comment or column title line
+            continue
+        if device_instance is not None and row[EDE_DEVICE_INSTANCE] != "":
+            if not row[EDE_DEVICE_INSTANCE].isdigit():
+                logger.info("BACnet point import, invalid device instance : %s" % row)
+                continue
+            if int(row[EDE_DEVICE_INSTANCE]) != int(device_instance):
+                continue
+        object_type = int(row[EDE_OBJECT_TYPE])
+        if object_type == object_types.get("device"):
+            continue
+        unit = ""
+        if row[EDE_UNIT_CODE].isdigit():
+            unit = engineering_units.get(int(row[EDE_UNIT_CODE]), row[EDE_UNIT_CODE])
+        properties = {}
+        if _float(row[EDE_HIGH_LIMIT]) is not None:
+            properties[HIGH_LIMIT] = _float(row[EDE_HIGH_LIMIT])
+        if _float(row[EDE_LOW_LIMIT]) is not None:
+            properties[LOW_LIMIT] = _float(row[EDE_LOW_LIMIT])
+        reference = row[EDE_STATE_TEXT_REFERENCE]
+        point = dict(
+            name=row[EDE_OBJECT_NAME],
+            object_type=object_type,
+            object_identifier=int(row[EDE_OBJECT_INSTANCE]),
+            description=row[EDE_DESCRIPTION],
+            unit=unit,
+            defaults=dict(value_class=default_value_class(object_type)),
+            properties=properties,
+            state_texts=(
+                state_texts.get(int(reference), []) if reference.isdigit() else []
+            ),
+        )
+        if row[EDE_SETTABLE]:
+            point["writeable"] = row[EDE_SETTABLE].upper() in ("Y", "1", "TRUE")
+        _set_limits(point, row[EDE_MIN_PRESENT_VALUE], row[EDE_MAX_PRESENT_VALUE])
+        points.append(point)
+    return points
+
+
+def read_csv(text):
+    """
+    read the points of a csv point list with a header line, the columns are
+    name, object_type (name or number), object_instance and optionally
+    description, unit, value_class, writeable, value_min, value_max and
+    state_texts (separated by |)
+    """
+    points = []
+    rows = _rows(text)
+    if not rows:
+        return points
+    header = [h.lower() for h in rows[0]]
+    for row in rows[1:]:
+        item = dict(zip(header, row))
+        object_type = item.get("object_type", "")
+        object_type = (
+            int(object_type) if object_type.isdigit() else object_types.get(object_type)
+        )
+        instance = item.get("object_instance", item.get("object_identifier", ""))
+        if object_type is None or not instance.isdigit():
+            logger.info("BACnet point import, invalid line : %s" % row)
+            continue
+        point = dict(
+            name=item.get("name", ""),
+            object_type=object_type,
+            object_identifier=int(instance),
+            description=item.get("description", ""),
+            unit=item.get("unit", ""),
+            defaults=dict(value_class=default_value_class(object_type)),
+            properties={},
+            state_texts=[t for t in item.get("state_texts", "").split("|") if t],
+        )
+        if item.get("value_class"):
+            point["value_class"] = item["value_class"]
+        if item.get("writeable"):
+            point["writeable"] = item["writeable"].upper() in ("Y", "1", "TRUE")
+        _set_limits(point, item.get("value_min"), item.get("value_max"))
+        points.append(point)
+    return points
+
+
+def _set_limits(point, value_min, value_max):
+    """
+    set the limits of a point given in the point list
+    """
+    if _float(value_min) is not None:
+        point["value_min"] = _float(value_min)
+    if _float(value_max) is not None:
+        point["value_max"] = _float(value_max)
+
+
+def _variable_values(point):
+    """
+    values of the fields of a new variable, the defaults of the point and
+    the values given in the point list
+    """
+    values = dict(point.get("defaults", {}))
+    values.update({field: point[field] for field in VARIABLE_FIELDS if field in point})
+    return values
+
+
+def _get_units(names):
+    """
+    return the pyscada units by name, missing units are created
+    """
+    names = set(unit_names.get(name, name) for name in names if name)
+    units = {u.unit: u for u in Unit.objects.filter(unit__in=names)}
+    missing = [Unit(unit=name, description=name) for name in names if name not in units]
+    if missing:
+        Unit.objects.bulk_create(missing)
+        units = {u.unit: u for u in Unit.objects.filter(unit__in=names)}
+    return units
+
+
+def _unique_name(name, used):
+    """
+    return a variable name based on name which is not in used
+    """
+    name = slugify(name)[:190] or "bacnet"
+    candidate = name
+    i = 1
+    while candidate in used:
+        candidate = "%s-%d" % (name, i)
+        i += 1
+    used.add(candidate)
+    return candidate
+
+
+def import_points(device, points):
+    """
+    create or update the BACnet variables of a remote device from a point
+    list, with bulk queries and a single daq daemon reinit
+
+    points are matched to the existing variables reading the presentValue
+    of their object by object type and instance, the existing variables are
+    only updated with the fields given by the point list, an empty unit or
+    description keeps the configured one
+
+    :return: dict with the count of created, updated and unchanged points
+    """
+    result = dict(created=0, updated=0, unchanged=0)
+    fields = list(VARIABLE_FIELDS)
+    with transaction.atomic():
+        existing = {}
+        # the variables of other properties and the quality variables of an
+        # object are not points
+        for bv in BACnetVariable.objects.filter(
+            bacnet_variable__device=device,
+            property_id=PRESENT_VALUE,
+            property_array_index__isnull=True,
+            quality_of__isnull=True,
+        ).select_related("bacnet_variable"):
+            existing[(bv.object_type, bv.object_identifier)] = bv
+        units = _get_units([p.get("unit") for p in points] + ["-"])
+
+        new_points = []
+        updated_variables = []
+        for point in points:
+            for field in ("unit", "description"):
+                if not point.get(field):
+                    # not given by the point list
+                    point.pop(field, None)
+            if "unit" in point:
+                point["unit"] = units[unit_names.get(point["unit"], point["unit"])]
+            bv = existing.get((point["object_type"], point["object_identifier"]))
+            if bv is None:
+                new_points.append(point)
+                continue
+            point["bacnet_variable_id"] = bv.pk
+            var = bv.bacnet_variable
+            changed = False
+            if "unit" in point and var.unit_id != point["unit"].pk:
+                var.unit = point["unit"]
+                changed = True
+            for field in fields[:1] + fields[2:]:
+                if field in point and getattr(var, field) != point[field]:
+                    setattr(var, field, point[field])
+                    changed = True
+            if changed:
+                updated_variables.append(var)
+                result["updated"] += 1
+            else:
+                result["unchanged"] += 1
+        Variable.objects.bulk_update(updated_variables, fields, batch_size=1000)
+
+        # the variable names start with the device name, the primary keys
+        # of the created variables are read back by name
+        prefix = slugify(device.short_name)
+        used_names = set(
+            Variable.objects.filter(name__startswith=prefix).values_list(
+                "name", flat=True
+            )
+        )
+        variables = []
+        for point in new_points:
+            point["variable_name"] = _unique_name(
+                "%s-%s"
+                % (
+                    prefix,
+                    point["name"]
+                    or "%s-%d" % (point["object_type"], point["object_identifier"]),
+                ),
+                used_names,
+            )
+            values = _variable_values(point)
+            values.setdefault("unit", units["-"])
+            variables.append(
+                Variable(
+                    name=point["variable_name"],
+                    short_name=point["name"][:80],
+                    device=device,
+                    **values,
+                )
+            )
+        Variable.objects.bulk_create(variables, batch_size=1000)
+        variable_ids = dict(
+            Variable.objects.filter(
+                device=device, name__in=[p["variable_name"] for p in new_points]
+            ).values_list("name", "pk")
+        )
+        bacnet_variables = []
+        for point in new_points:
+            point["variable_id"] = variable_ids[point["variable_name"]]
+            bacnet_variables.append(
+                BACnetVariable(
+                    bacnet_variable_id=point["variable_id"],
+                    object_type=point["object_type"],
+                    object_identifier=point["object_identifier"],
+                )
+            )
+        BACnetVariable.objects.bulk_create(bacnet_variables, batch_size=1000)
+        bacnet_variable_ids = dict(
+            BACnetVariable.objects.filter(
+                bacnet_variable_id__in=variable_ids.values()
+            ).values_list("bacnet_variable_id", "pk")
+        )
+        for point in new_points:
+            point["bacnet_variable_id"] = bacnet_variable_ids[point["variable_id"]]
+        result["created"] = len(new_points)
+
+        _import_properties(points)
+        _import_state_texts(new_points)
+
+        if result["created"] or result["updated"]:
+            reinit_daq_daemons(device)
+    return result
+
+
+def _import_properties(points):
+    """
+    create or update the BACnetVariableProperty values of the points
+    """
+    points = [p for p in points if p["properties"]]
+    if not points:
+        return
+    existing = {}
+    for prop in BACnetVariableProperty.objects.filter(
+        bacnet_variable_id__in=[p["bacnet_variable_id"] for p in points]
+    ):
+        existing[(prop.bacnet_variable_id, prop.property_id)] = prop
+    created = []
+    updated = []
+    for point in points:
+        for property_id, value in point["properties"].items():
+            prop = existing.get((point["bacnet_variable_id"], property_id))
+            if prop is None:
+                created.append(
+                    BACnetVariableProperty(
+                        bacnet_variable_id=point["bacnet_variable_id"],
+                        property_id=property_id,
+                        value=value,
+                    )
+                )
+            elif prop.value != value:
+                prop.value = value
+                updated.append(prop)
+    BACnetVariableProperty.objects.bulk_create(created, batch_size=1000)
+    BACnetVariableProperty.objects.bulk_update(updated, ["value"], batch_size=1000)
+
+
+def _import_state_texts(points):
+    """
+    create the dictionaries of the state texts of new multistate points
+    """
+    points = [p for p in points if p["state_texts"]]
+    if not points:
+        return
+    dictionaries = []
+    for point in points:
+        dictionaries.append(Dictionary(name=point["variable_name"] + "_state_texts"))
+    Dictionary.objects.bulk_create(dictionaries)
+    dictionary_ids = dict(
+        Dictionary.objects.filter(name__in=[d.name for d in dictionaries]).values_list(
+            "name", "pk"
+        )
+    )
+    items = []
+    variables = []
+    for point in points:
+        dictionary_id = dictionary_ids[point["variable_name"] + "_state_texts"]
+        value_class = _variable_values(point).get("value_class")
+        start = 0 if value_class == "BOOLEAN" else 1
+        for i, text in enumerate(point["state_texts"]):
+            items.append(
+                DictionaryItem(
+                    label=text, value=str(i + start), dictionary_id=dictionary_id
+                )
+            )
+        variables.append(Variable(pk=point["variable_id"], dictionary_id=dictionary_id))
+    DictionaryItem.objects.bulk_create(items, batch_size=1000)
+    Variable.objects.bulk_update(variables, ["dictionary"], batch_size=1000)
+
+
+def save_discovered_objects(bacnet_device, objects):
+    """
+    replace the discovered objects of a remote device, objects is a list of
+    dicts with the object_type (name or number), object_identifier,
+    object_name, description, units and state_texts
+    """
+    discovered = []
+    for obj in objects:
+        object_type = obj["object_type"]
+        if not isinstance(object_type, int):
+            object_type = object_types.get(object_type)
+        if object_type is None or object_type == object_types.get("device"):
+            continue
+        discovered.append(
+            BACnetDiscoveredObject(
+                bacnet_device=bacnet_device,
+                object_type=object_type,
+                object_identifier=int(obj["object_identifier"]),
+                object_name=str(obj.get("object_name") or "")[:255],
+                description=str(obj.get("description") or "")[:400],
+                units=str(obj.get("units") or "")[:80],
+                state_texts="|".join(obj.get("state_texts") or []),
+            )
+        )
+    with transaction.atomic():
+        BACnetDiscoveredObject.objects.filter(bacnet_device=bacnet_device).delete()
+        BACnetDiscoveredObject.objects.bulk_create(
+            discovered, batch_size=1000, ignore_conflicts=True
+        )
+
+
+def read_discovered_objects(
+    bacnet_device, object_type_ids=None, name_pattern=None, units=None
+):
+    """
+    return the discovered objects of a remote device as points
+
+    :param object_type_ids: list of object type numbers
+    :param name_pattern: shell style pattern matched against the object name
+    :param units: list of BACnet engineering unit names
+    """
+    queryset = BACnetDiscoveredObject.objects.filter(bacnet_device=bacnet_device)
+    if object_type_ids:
+        queryset = queryset.filter(object_type__in=object_type_ids)
+    if units:
+        queryset = queryset.filter(units__in=units)
+    points = []
+    for obj in queryset.order_by("object_type", "object_identifier"):
+        if name_pattern and not fnmatch.fnmatch(
+            obj.object_name.lower(), name_pattern.lower()
+        ):
+            continue
+        points.append(
+            dict(
+                name=obj.object_name,
+                object_type=obj.object_type,
+                object_identifier=obj.object_identifier,
+                description=obj.description,
+                unit=obj.units,
+                defaults=dict(
+                    value_class=default_value_class(obj.object_type),
+                    writeable=obj.object_type in writeable_object_types,
+                ),
+                properties={},
+                state_texts=[t for t in obj.state_texts.split("|") if t],
+            )
+        )
+    return points
+
+
+def provision_points(device, object_type_ids=None, name_pattern=None, units=None):
+    """
+    create the variables of a remote device from its discovered objects
+
+    :return: dict with the count of created, updated and unchanged points
+    """
+    points = read_discovered_objects(
+        device.bacnetdevice, object_type_ids, name_pattern, units
+    )
+    return import_points(device, points)
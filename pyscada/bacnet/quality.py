@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+try:
+    from bacpypes.basetypes import Reliability
+
+    reliabilities = Reliability.enumerations
+except ImportError:
+    reliabilities = {}
+
+# quality bitfield of a sample:
+# bit 0 to 3: statusFlags inAlarm, fault, overridden, outOfService
+# bit 4 to 19: reliability, 0 is noFaultDetected
+IN_ALARM = 1
+FAULT = 2
+OVERRIDDEN = 4
+OUT_OF_SERVICE = 8
+RELIABILITY_SHIFT = 4
+
+# properties read with the presentValue of the variables with read_quality
+QUALITY_PROPERTIES = ("statusFlags", "reliability")
+
+
+def quality_bits(status_flags=None, reliability=None, out_of_service=None):
+    """
+    compact quality bitfield of the statusFlags, reliability and
+    outOfService of an object, missing properties are not set
+
+    :param status_flags: list of the 4 status flags bits
+    :param reliability: reliability number or name
+    """
+    quality = 0
+    if status_flags:
+        for bit, flag in enumerate(list(status_flags)[:4]):
+            if flag:
+                quality |= 1 << bit
+    if isinstance(reliability, str):
+        reliability = reliabilities.get(reliability)
+    if reliability:
+        quality |= (int(reliability) & 0xFFFF) << RELIABILITY_SHIFT
+    if out_of_service:
+        quality |= OUT_OF_SERVICE
+    return quality
+
+
+def is_bad(quality):
+    """
+    a sample is bad when its object is in fault, out of service or not
+    reliable
+    """
+    return bool(quality & (FAULT | OUT_OF_SERVICE)) or quality >> RELIABILITY_SHIFT != 0
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# error codes of a reference failing until the device or the variable is
+# configured again, the other errors (timeout, abort, reject, busy...) are
+# transient and the reference is read again by the next cycle
+PERMANENT_ERRORS = (
+    "unknownObject",
+    "unknownProperty",
+    "propertyIsNotAnArray",
+    "invalidArrayIndex",
+    "unsupportedObjectType",
+    "readAccessDenied",
+)
+
+# quarantined references re-checked by an acquisition pass of a local device
+RECHECKS_PER_PASS = 5
+
+
+def quarantine_recheck():
+    """
+    seconds between two re-checks of a quarantined reference, setting
+    quarantine_recheck, default one hour
+    """
+    if hasattr(settings, "PYSCADA_BACNET"):
+        if "quarantine_recheck" in settings.PYSCADA_BACNET:
+            return float(settings.PYSCADA_BACNET["quarantine_recheck"])
+    return 3600.0
+
+
+def error_code(exception):
+    """
+    BACnet error code of a failed read, BAC0 raises the errors of a
+    ReadProperty as UnknownObjectError, UnknownPropertyError or
+    NoResponseFromController with the reason in the message
+    """
+    name = type(exception).__name__
+    if name == "UnknownObjectError":
+        return "unknownObject"
+    if name == "UnknownPropertyError":
+        return "unknownProperty"
+    if getattr(exception, "errorCode", None):
+        return str(exception.errorCode)
+    return str(exception).rsplit(":", 1)[-1].strip()
+
+
+def is_permanent(exception):
+    """
+    True if a read failed with an error which repeats on each cycle
+    """
+    return isinstance(exception, Exception) and (
+        error_code(exception) in PERMANENT_ERRORS
+    )
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from time import time, sleep
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    rate limit: rate requests per second, burst requests at once after an
+    idle time
+    """
+
+    def __init__(self, rate, burst=1.0):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.tokens = self.burst
+        self.last = time()
+
+    def acquire(self):
+        """
+        take a token, wait for it when the bucket is empty
+
+        :return: seconds waited
+        """
+        now = time()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        wait = (1.0 - self.tokens) / self.rate
+        sleep(wait)
+        self.tokens = 0.0
+        self.last = time()
+        return wait
+
+    def available(self):
+        """
+        True when a token can be taken without waiting
+        """
+        return self.tokens + (time() - self.last) * self.rate >= 1.0
+
+
+class Route:
+    """
+    path to the remote devices behind a router or on a remote network: the
+    requests sent at the same time and per second are limited to keep the
+    slow segment behind the router busy without overrunning it
+    """
+
+    def __init__(self, key, max_in_flight=1, rate=0.0):
+        self.key = key
+        self.bucket = None
+        # requests sent and not read yet, in sending order
+        self.pending = []
+        self.configure(max_in_flight, rate)
+
+    def __str__(self):
+        return str(self.key)
+
+    def configure(self, max_in_flight, rate):
+        """
+        set the limits, the bucket keeps its tokens when the limits are
+        unchanged, a full window of requests can be sent at once
+        """
+        self.max_in_flight = max(int(max_in_flight or 1), 1)
+        rate = float(rate or 0.0)
+        if rate <= 0:
+            self.bucket = None
+        elif (
+            self.bucket is None
+            or self.bucket.rate != rate
+            or self.bucket.burst != self.max_in_flight
+        ):
+            self.bucket = TokenBucket(rate, self.max_in_flight)
+
+    def acquire(self):
+        """
+        wait for the rate limit before sending a request
+
+        :return: seconds waited
+        """
+        if self.bucket is None:
+            return 0.0
+        return self.bucket.acquire()
+
+    def in_flight(self):
+        """
+        number of requests waiting for their answers
+        """
+        return sum(1 for entry in self.pending if not _complete(entry))
+
+    def oldest_in_flight(self):
+        for entry in self.pending:
+            if not _complete(entry):
+                return entry
+        return None
+
+    def ready(self):
+        """
+        True when a request can be sent without waiting
+        """
+        return self.in_flight() < self.max_in_flight and (
+            self.bucket is None or self.bucket.available()
+        )
+
+    def take(self, request):
+        """
+        remove and return the pending entry of a request, None if it was not
+        sent
+        """
+        for i, entry in enumerate(self.pending):
+            if entry.request is request:
+                return self.pending.pop(i)
+        return None
+
+    def clear(self):
+        """
+        forget the requests read ahead and not read by their devices
+        """
+        if self.pending:
+            logger.debug(
+                "%s : %d requests read ahead dropped" % (self, len(self.pending))
+            )
+        self.pending = []
+
+
+def _complete(entry):
+    """
+    True when the request of a pending entry got its answer or was not sent
+    """
+    complete = getattr(entry.iocb, "ioComplete", None)
+    return complete is None or complete.is_set()
+
+
+def route_key(bacnet_device):
+    """
+    key of the route to a remote device: its router, else its network, None
+    for the devices of the local network
+    """
+    if bacnet_device.router_address:
+        return "router %s" % bacnet_device.router_address
+    if bacnet_device.network_number is not None:
+        return "network %d" % bacnet_device.network_number
+    return None
+
+
+def router_address(application, network):
+    """
+    address of the router to network learned by the stack, from the I-Am
+    of the devices behind it or the I-Am-Router-To-Network of the router
+    """
+    nsap = getattr(application, "nsap", None)
+    if nsap is None:
+        return None
+    for snet in nsap.adapters:
+        info = nsap.router_info_cache.get_router_info(snet, network)
+        if info is not None:
+            return str(info.address)
+    return None
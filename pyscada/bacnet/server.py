@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+try:
+    from bacpypes.core import deferred
+    from bacpypes.task import TaskManager
+    from bacpypes.iocb import IOCB
+    from bacpypes.errors import ExecutionError
+    from bacpypes.apdu import (
+        ConfirmedCOVNotificationRequest,
+        UnconfirmedCOVNotificationRequest,
+    )
+    from bacpypes.basetypes import PropertyValue
+    from bacpypes.constructeddata import Any
+    from bacpypes.service.cov import COVDetection
+    from bacpypes.object import (
+        AnalogValueObject,
+        BinaryValueObject,
+        MultiStateValueObject,
+    )
+    from bacpypes.basetypes import EngineeringUnits
+    from bacpypes.primitivedata import CharacterString
+    from bacpypes.constructeddata import ArrayOf
+
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+
+from pyscada.models import RecordedData, DictionaryItem
+from pyscada.bacnet.models import BACnetExportedVariable
+
+from django.db.models import Max
+from django.utils.timezone import now
+
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+# variables queried at once when the values are refreshed
+QUERY_CHUNK_SIZE = 1000
+
+# values saved by other processes are read again for this time, their
+# transaction may be committed after the last refresh
+REFRESH_OVERLAP = timedelta(seconds=10)
+
+# properties a SubscribeCOVProperty request can monitor
+COV_PROPERTIES = ("presentValue", "statusFlags")
+
+
+def _value(row):
+    """
+    value of a RecordedData values_list row, the first value field set
+    """
+    for value in row:
+        if value is not None:
+            return value
+    return None
+
+
+class COVNotifier:
+    """
+    send the COV notifications of the exported objects
+
+    a subscriber gets one confirmed notification at a time: the changes
+    happening until it acknowledges it are coalesced, each subscription is
+    notified once more with its last values
+    """
+
+    def __init__(self, application):
+        self.application = application
+        # subscriber addresses with an unacknowledged notification
+        self.busy = set()
+        # subscriber address: {subscription: detection}
+        self.pending = {}
+
+    def notify(self, detection, cov):
+        if cov.confirmed:
+            if cov.client_addr in self.busy:
+                self.pending.setdefault(cov.client_addr, {})[cov] = detection
+                return
+            self.busy.add(cov.client_addr)
+        iocb = IOCB(detection.notification(cov))
+        iocb.cov = cov
+        iocb.add_callback(self._complete)
+        self.application.request_io(iocb)
+
+    def _complete(self, iocb):
+        cov = iocb.cov
+        if iocb.ioError is not None:
+            logger.debug(
+                "COV notification to %s failed : %r" % (cov.client_addr, iocb.ioError)
+            )
+        if not cov.confirmed:
+            return
+        self.busy.discard(cov.client_addr)
+        pending = self.pending.get(cov.client_addr, {})
+        while pending:
+            cov = next(iter(pending))
+            detection = pending.pop(cov)
+            # skip the subscriptions canceled since
+            if cov.obj_ref is not None:
+                self.notify(detection, cov)
+                break
+        if not pending:
+            self.pending.pop(cov.client_addr, None)
+
+
+if driver_ok:
+
+    class ExportedCOVDetection(COVDetection):
+        """
+        COV detection of an exported object
+
+        the stack runs it once per batch of value updates, each subscription
+        is checked against the values last sent to it with its own increment
+        """
+
+        properties_tracked = COV_PROPERTIES
+        properties_reported = COV_PROPERTIES
+        monitored_property_reference = "presentValue"
+
+        def __init__(self, obj, notifier):
+            COVDetection.__init__(self, obj)
+            self.notifier = notifier
+
+        def execute(self):
+            for cov in list(self.cov_subscriptions):
+                if self.changed(cov):
+                    self.notifier.notify(self, cov)
+
+        def send_cov_notifications(self, subscription=None):
+            # called by the stack for new and renewed subscriptions, a
+            # periodic call for all subscriptions only sends the changes
+            if subscription is None:
+                self.execute()
+            else:
+                self.notifier.notify(self, subscription)
+
+        def changed(self, cov):
+            """
+            True when the values changed enough to notify the subscription
+            """
+            reported = getattr(cov, "_reported", None)
+            if reported is None:
+                return True
+            value, flags = reported
+            if list(self.statusFlags) != flags:
+                return True
+            if self.presentValue == value:
+                return False
+            if isinstance(value, float):
+                increment = cov.covIncrement
+                if increment is None:
+                    increment = self.obj.covIncrement or 0.0
+                return abs(self.presentValue - value) >= increment
+            return True
+
+        def notification(self, cov):
+            """
+            notification request of the current values for a subscription
+            """
+            cov._reported = (self.presentValue, list(self.statusFlags))
+            values = []
+            for property_name in self.properties_reported:
+                datatype = self.obj.get_datatype(property_name)
+                values.append(
+                    PropertyValue(
+                        propertyIdentifier=property_name,
+                        value=Any(datatype(self.obj._values[property_name])),
+                    )
+                )
+            if not cov.lifetime:
+                time_remaining = 0
+            else:
+                time_remaining = max(1, int(cov.taskTime - TaskManager().get_time()))
+            if cov.confirmed:
+                request = ConfirmedCOVNotificationRequest()
+            else:
+                request = UnconfirmedCOVNotificationRequest()
+            request.pduDestination = cov.client_addr
+            request.subscriberProcessIdentifier = cov.proc_id
+            request.initiatingDeviceIdentifier = (
+                self.obj._app.localDevice.objectIdentifier
+            )
+            request.monitoredObjectIdentifier = cov.obj_id
+            request.timeRemaining = time_remaining
+            request.listOfValues = values
+            return request
+
+
+class ExportedObjects:
+    """
+    BACnet value objects of the PyScada variables exported by the local
+    BACnet devices of a stack
+
+    the objects are added to the application of the BACnet stack and keep the
+    last value of their variable, the stack answers ReadProperty and
+    ReadPropertyMultiple requests from them without querying the database.
+    The values of the variables acquired by the process are updated directly,
+    the other ones are refreshed with one query per refresh.
+    COV subscriptions to the objects are notified when their values are set
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.notifier = COVNotifier(application)
+        # the subscriptions to the exported objects are checked and notified
+        # by ExportedCOVDetection, the stack handles the other ones
+        for name in ("do_SubscribeCOVRequest", "do_SubscribeCOVPropertyRequest"):
+            setattr(
+                application,
+                name,
+                self._subscription_handler(getattr(application, name)),
+            )
+        # object identifier: object
+        self.objects = {}
+        # variable id: list of objects
+        self.variables = {}
+        # time of the value of each object
+        self.timestamps = {}
+        self.last_refresh = None
+
+    def load(self, device):
+        """
+        (re)load the active exported variables of a local BACnet device,
+        unchanged objects keep their value. The local devices sharing a stack
+        serve their objects together, an object identifier or name is used
+        once
+        """
+        exports = {}
+        for export in BACnetExportedVariable.objects.filter(
+            bacnet_local_device=device, active=True, variable__active=True
+        ).select_related("variable", "variable__unit"):
+            object_identifier = (
+                export.get_object_type_display(),
+                export.object_instance,
+            )
+            exports[object_identifier] = export
+
+        names = set()
+        for object_identifier, obj in list(self.objects.items()):
+            export = exports.get(object_identifier)
+            if obj._device_id != device.pk:
+                names.add(obj.objectName)
+                if export is not None:
+                    logger.warning(
+                        "%s : %s already served by another local device"
+                        % (device, export)
+                    )
+                    del exports[object_identifier]
+            elif (
+                export is None
+                or obj._variable_id != export.variable_id
+                or obj.objectName != (export.object_name or export.variable.name)
+            ):
+                deferred(self._delete, obj)
+                del self.objects[object_identifier]
+                self.timestamps.pop(object_identifier, None)
+            elif export.object_type == 2 and obj.covIncrement != export.cov_increment:
+                deferred(setattr, obj, "covIncrement", float(export.cov_increment))
+        for object_identifier, export in list(exports.items()):
+            if (export.object_name or export.variable.name) in names:
+                logger.warning(
+                    "%s : object name of %s already used by another local device"
+                    % (device, export)
+                )
+                del exports[object_identifier]
+
+        states = {}
+        dictionary_ids = set(
+            export.variable.dictionary_id
+            for export in exports.values()
+            if export.object_type == 19 and export.variable.dictionary_id
+        )
+        for dictionary_id, value, label in DictionaryItem.objects.filter(
+            dictionary_id__in=dictionary_ids
+        ).values_list("dictionary_id", "value", "label"):
+            try:
+                states.setdefault(dictionary_id, {})[int(float(value))] = label
+            except ValueError:
+                continue
+        for object_identifier, export in exports.items():
+            if object_identifier not in self.objects:
+                obj = self.create_object(
+                    export, states.get(export.variable.dictionary_id, {})
+                )
+                self.objects[object_identifier] = obj
+                deferred(self.application.add_object, obj)
+
+        self._index()
+        # read the last values of new variables
+        self.last_refresh = None
+
+    def unload(self, device_id):
+        """
+        remove the objects of a local BACnet device
+        """
+        for object_identifier, obj in list(self.objects.items()):
+            if obj._device_id == device_id:
+                deferred(self._delete, obj)
+                del self.objects[object_identifier]
+                self.timestamps.pop(object_identifier, None)
+        self._index()
+
+    def _index(self):
+        self.variables = {}
+        for obj in self.objects.values():
+            self.variables.setdefault(obj._variable_id, []).append(obj)
+
+    @staticmethod
+    def create_object(export, states=None):
+        """
+        value object of an exported variable, in fault until its first value
+        """
+        variable = export.variable
+        kwargs = dict(
+            objectIdentifier=(export.get_object_type_display(), export.object_instance),
+            objectName=export.object_name or variable.name,
+            description=variable.description[:255],
+            statusFlags=[0, 1, 0, 0],
+            eventState="normal",
+            reliability="communicationFailure",
+            outOfService=False,
+        )
+        if export.object_type == 5:
+            obj = BinaryValueObject(presentValue="inactive", **kwargs)
+        elif export.object_type == 19:
+            texts = [states[n] for n in sorted(states) if n > 0] if states else []
+            obj = MultiStateValueObject(
+                presentValue=1, numberOfStates=max(len(texts), 1), **kwargs
+            )
+            if texts:
+                obj.stateText = ArrayOf(CharacterString)(texts)
+        else:
+            units = variable.unit.unit if variable.unit is not None else ""
+            obj = AnalogValueObject(
+                presentValue=0.0,
+                covIncrement=float(export.cov_increment),
+                units=units if units in EngineeringUnits.enumerations else "noUnits",
+                **kwargs
+            )
+        obj._variable_id = variable.pk
+        obj._device_id = export.bacnet_local_device_id
+        return obj
+
+    def _subscription_handler(self, handler):
+        """
+        wrap a subscription service of the stack to use ExportedCOVDetection
+        for the exported objects
+        """
+
+        def do_subscribe(apdu):
+            obj = self.application.get_object_id(apdu.monitoredObjectIdentifier)
+            if obj is not None and getattr(obj, "_variable_id", None) is not None:
+                reference = getattr(apdu, "monitoredPropertyIdentifier", None)
+                if (
+                    reference is not None
+                    and reference.propertyIdentifier not in COV_PROPERTIES
+                ):
+                    raise ExecutionError(
+                        errorClass="property", errorCode="notCovProperty"
+                    )
+                if (
+                    apdu.issueConfirmedNotifications is not None
+                    and apdu.lifetime is None
+                ):
+                    # no lifetime is an indefinite subscription
+                    apdu.lifetime = 0
+                if obj not in self.application.cov_detections:
+                    self.application.cov_detections[obj] = ExportedCOVDetection(
+                        obj, self.notifier
+                    )
+            return handler(apdu)
+
+        return do_subscribe
+
+    def _delete(self, obj):
+        """
+        cancel the subscriptions to an object and remove it
+        """
+        detection = self.application.cov_detections.get(obj)
+        if detection is not None:
+            for cov in list(detection.cov_subscriptions):
+                cov.cancel_subscription()
+        self.application.delete_object(obj)
+
+    def update(self, values):
+        """
+        set the values of variables
+
+        :param values: list of (variable id, value, timestamp)
+        """
+        changes = []
+        for variable_id, value, timestamp in values:
+            for obj in self.variables.get(variable_id, []):
+                object_identifier = obj.objectIdentifier
+                if timestamp < self.timestamps.get(object_identifier, 0):
+                    continue
+                self.timestamps[object_identifier] = timestamp
+                changes.append((obj, value))
+        if changes:
+            # the objects are read and their subscriptions notified by the stack
+            deferred(self._apply, changes)
+
+    @staticmethod
+    def _apply(changes):
+        for obj, value in changes:
+            try:
+                if isinstance(obj, BinaryValueObject):
+                    value = "active" if value else "inactive"
+                elif isinstance(obj, MultiStateValueObject):
+                    value = int(value)
+                    if value < 1:
+                        raise ValueError("state %d" % value)
+                    if value > obj.numberOfStates:
+                        obj.numberOfStates = value
+                else:
+                    value = float(value)
+                if obj.presentValue != value:
+                    obj.presentValue = value
+                if obj.reliability != "noFaultDetected":
+                    obj.statusFlags = [0, 0, 0, 0]
+                    obj.reliability = "noFaultDetected"
+            except (TypeError, ValueError) as e:
+                logger.info("%s : invalid value %r : %s" % (obj.objectName, value, e))
+
+    def refresh(self):
+        """
+        read the last values saved since the last refresh, at most one hour
+        old for the first refresh
+        """
+        if not self.variables:
+            return
+        start = now()
+        if self.last_refresh is None:
+            since = start - timedelta(seconds=3660)
+        else:
+            since = self.last_refresh - REFRESH_OVERLAP
+        self.last_refresh = start
+        variable_ids = list(self.variables.keys())
+        values = []
+        for i in range(0, len(variable_ids), QUERY_CHUNK_SIZE):
+            last_ids = (
+                RecordedData.objects.filter(
+                    date_saved__gt=since,
+                    variable_id__in=variable_ids[i : i + QUERY_CHUNK_SIZE],
+                )
+                .values("variable_id")
+                .annotate(last_id=Max("id"))
+                .values_list("last_id", flat=True)
+            )
+            for row in RecordedData.objects.filter(pk__in=list(last_ids)).values_list(
+                "variable_id",
+                "id",
+                "value_float64",
+                "value_int64",
+                "value_int32",
+                "value_int16",
+                "value_boolean",
+            ):
+                value = _value(row[2:])
+                if value is not None:
+                    values.append((row[0], value, (row[1] - row[0]) / 2097152 / 1000.0))
+        self.update(values)
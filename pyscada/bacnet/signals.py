@@ -1,21 +1,115 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from pyscada.models import Device, Variable
+from pyscada.models import BackgroundProcess, Device, Variable
 from pyscada.bacnet.models import (
     BACnetDevice,
+    BACnetQuarantinedReference,
     BACnetVariable,
     ExtendedBACnetDevice,
     ExtendedBACnetVariable,
 )
 
+from django.db import transaction
 from django.dispatch import receiver
 from django.db.models.signals import post_save, pre_delete
 
+from functools import partial
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+# on_commit callbacks of the notifications waiting for the commit of the
+# current transaction, by notification
+_pending = threading.local()
+
+
+def _waiting(callback):
+    """
+    True while callback waits for the commit, a rolled back transaction or
+    savepoint drops its callbacks
+    """
+    connection = transaction.get_connection()
+    return any(hook[1] is callback for hook in connection.run_on_commit)
+
+
+def _queue(key, callback):
+    """
+    run callback after the commit of the current transaction, once per key
+    """
+    if not hasattr(_pending, "callbacks"):
+        _pending.callbacks = {}
+    previous = _pending.callbacks.get(key)
+    if previous is not None and _waiting(previous):
+        return
+    _pending.callbacks[key] = callback
+    # run at once outside of a transaction
+    transaction.on_commit(callback)
+
+
+def _queue_notification(device_id=None, deleted_device=None):
+    """
+    queue a daq daemon notification, all notifications of a transaction are
+    sent once per device after the commit
+    """
+    if device_id is not None:
+        _queue(("saved", device_id), partial(_send_notification, device_id))
+    elif deleted_device is not None:
+        # the device is gone after the commit, its protocol is read now
+        _queue(
+            ("deleted", deleted_device.pk),
+            partial(
+                _send_deleted_notification,
+                deleted_device.pk,
+                deleted_device.protocol_id,
+            ),
+        )
+
+
+def _send_notification(device_id):
+    """
+    update the daq daemon configuration of a device
+    """
+    _pending.callbacks.pop(("saved", device_id), None)
+    for device in Device.objects.filter(pk=device_id):
+        post_save.send_robust(sender=Device, instance=device)
+
+
+def _send_deleted_notification(device_id, protocol_id):
+    """
+    restart the worker of the protocol of a deleted device, it stops the
+    process of a deleted local device and updates the device list of the
+    other processes
+    """
+    _pending.callbacks.pop(("deleted", device_id), None)
+    for bp in BackgroundProcess.objects.filter(
+        pk=protocol_id, done=False, failed=False
+    ):
+        bp.restart()
+
+
+def reinit_daq_daemons(device):
+    """
+    update the daq daemon configuration of device after the commit, to be
+    used after bulk operations which do not send model signals
+    """
+    _queue_notification(device_id=device.pk)
+
+
+def _variable_device_id(bacnet_variable):
+    """
+    device of a BACnet variable, without a query when the variable is loaded
+    """
+    field = BACnetVariable._meta.get_field("bacnet_variable")
+    if field.is_cached(bacnet_variable):
+        return bacnet_variable.bacnet_variable.device_id
+    return (
+        Variable.objects.filter(pk=bacnet_variable.bacnet_variable_id)
+        .values_list("device_id", flat=True)
+        .first()
+    )
+
 
 @receiver(post_save, sender=BACnetDevice)
 @receiver(post_save, sender=BACnetVariable)
@@ -26,17 +120,15 @@ def _reinit_daq_daemons(sender, instance, **kwargs):
     update the daq daemon configuration when changes be applied in the models
     """
     if type(instance) is BACnetDevice:
-        post_save.send_robust(sender=Device, instance=instance.bacnet_device)
+        _queue_notification(device_id=instance.bacnet_device_id)
     elif type(instance) is BACnetVariable:
-        post_save.send_robust(sender=Variable, instance=instance.bacnet_variable)
+        # a changed variable reads its object again
+        BACnetQuarantinedReference.objects.filter(bacnet_variable=instance).delete()
+        _queue_notification(device_id=_variable_device_id(instance))
     elif type(instance) is ExtendedBACnetVariable:
-        post_save.send_robust(
-            sender=Variable, instance=Variable.objects.get(pk=instance.pk)
-        )
+        _queue_notification(device_id=instance.device_id)
     elif type(instance) is ExtendedBACnetDevice:
-        post_save.send_robust(
-            sender=Device, instance=Device.objects.get(pk=instance.pk)
-        )
+        _queue_notification(device_id=instance.pk)
 
 
 @receiver(pre_delete, sender=BACnetDevice)
@@ -48,14 +140,12 @@ def _del_daq_daemons(sender, instance, **kwargs):
     update the daq daemon configuration when changes be applied in the models
     """
     if type(instance) is BACnetDevice:
-        pre_delete.send_robust(sender=Device, instance=instance.bacnet_device)
+        if instance.bacnet_device_id is not None:
+            _queue_notification(deleted_device=instance.bacnet_device)
     elif type(instance) is BACnetVariable:
-        pre_delete.send_robust(sender=Variable, instance=instance.bacnet_variable)
+        # the variable is gone after the commit, its device is read now
+        _queue_notification(device_id=_variable_device_id(instance))
     elif type(instance) is ExtendedBACnetVariable:
-        pre_delete.send_robust(
-            sender=Variable, instance=Variable.objects.get(pk=instance.pk)
-        )
+        _queue_notification(device_id=instance.device_id)
     elif type(instance) is ExtendedBACnetDevice:
-        pre_delete.send_robust(
-            sender=Device, instance=Device.objects.get(pk=instance.pk)
-        )
+        _queue_notification(deleted_device=instance)
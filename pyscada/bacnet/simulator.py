@@ -0,0 +1,555 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+try:
+    from bacpypes.core import run, stop
+    from bacpypes.comm import Client, Server, bind
+    from bacpypes.task import OneShotTask, RecurringTask
+    from bacpypes.app import BIPSimpleApplication
+    from bacpypes.apdu import ConfirmedRequestPDU, ReadRangeACK
+    from bacpypes.errors import AbortOther, RejectOther, ExecutionError
+    from bacpypes.capability import Capability
+    from bacpypes.local.device import LocalDeviceObject
+    from bacpypes.local.object import (
+        AnalogValueCmdObject,
+        BinaryValueCmdObject,
+        MultiStateValueCmdObject,
+    )
+    from bacpypes.object import (
+        AnalogInputObject,
+        BinaryInputObject,
+        MultiStateInputObject,
+        TrendLogObject,
+        register_object_type,
+    )
+    from bacpypes.primitivedata import CharacterString, Date, Time
+    from bacpypes.constructeddata import ArrayOf, ListOf, SequenceOfAny
+    from bacpypes.basetypes import (
+        DateTime,
+        DeviceObjectPropertyReference,
+        LogRecord,
+        LogRecordLogDatum,
+    )
+    from bacpypes.service.object import ReadWritePropertyMultipleServices
+    from bacpypes.service.cov import ChangeOfValueServices
+
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+    BIPSimpleApplication = object
+    OneShotTask = RecurringTask = Client = Server = Capability = object
+    TrendLogObject = object
+
+from collections import deque
+from math import sin, pi
+from time import time
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATE_TEXTS = ["Auto", "Manual", "Off"]
+VENDOR_ID = 15
+
+# fault injection options of a simulated device
+FAULTS = ("latency", "jitter", "loss", "duplicate", "reorder", "abort", "reject")
+
+if driver_ok:
+    # the commandable objects are not registered by bacpypes, without the
+    # registration their present value is read only
+    for cls in (AnalogValueCmdObject, BinaryValueCmdObject, MultiStateValueCmdObject):
+        register_object_type(cls, vendor_id=VENDOR_ID)
+
+
+class DelayedPacket(OneShotTask):
+    def __init__(self, injector, pdu):
+        OneShotTask.__init__(self)
+        self.injector = injector
+        self.pdu = pdu
+
+    def process_task(self):
+        self.injector.request(self.pdu)
+
+
+class FaultInjector(Client, Server):
+    """
+    shim between the BVLL codec and the UDP socket of a simulated device,
+    the packets sent by the device are delayed, dropped, duplicated or
+    reordered
+
+    :param latency: seconds added to each packet
+    :param jitter: random seconds added to or removed from the latency
+    :param loss: share of the packets which are dropped, 0 to 1
+    :param duplicate: share of the packets which are sent twice
+    :param reorder: share of the packets which are held back until the
+        next ones are sent
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, duplicate=0.0, reorder=0.0):
+        Client.__init__(self)
+        Server.__init__(self)
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.duplicate = duplicate
+        self.reorder = reorder
+        self.counters = dict(dropped=0, duplicated=0, reordered=0)
+
+    def delay(self):
+        delay = self.latency
+        if self.jitter:
+            delay = max(0.0, delay + random.uniform(-self.jitter, self.jitter))
+        if self.reorder and random.random() < self.reorder:
+            self.counters["reordered"] += 1
+            delay += max(self.latency, 0.01) * 2
+        return delay
+
+    def send(self, pdu):
+        delay = self.delay()
+        if delay > 0:
+            DelayedPacket(self, pdu).install_task(delta=delay)
+        else:
+            self.request(pdu)
+
+    def indication(self, pdu):
+        # downstream, from the device to the socket
+        if self.loss and random.random() < self.loss:
+            self.counters["dropped"] += 1
+            return
+        self.send(pdu)
+        if self.duplicate and random.random() < self.duplicate:
+            self.counters["duplicated"] += 1
+            self.send(pdu)
+
+    def confirmation(self, pdu):
+        # upstream, from the socket to the device
+        self.response(pdu)
+
+
+class SimulatedTrendLog(TrendLogObject):
+    """
+    trend log of a simulated device logging the present value of an object,
+    the records are kept apart from the logBuffer property and read with
+    ReadRange
+    """
+
+    def __init__(self, monitored, **kwargs):
+        TrendLogObject.__init__(
+            self,
+            logDeviceObjectProperty=DeviceObjectPropertyReference(
+                objectIdentifier=monitored.objectIdentifier,
+                propertyIdentifier="presentValue",
+            ),
+            **kwargs
+        )
+        self._monitored = monitored
+        self._records = deque(maxlen=self.bufferSize)
+        self._sequence_number = 0
+
+    def log(self, t):
+        self._sequence_number += 1
+        timestamp = DateTime(date=Date().now(t).value, time=Time().now(t).value)
+        self._records.append(
+            (
+                self._sequence_number,
+                timestamp.date[:3] + timestamp.time,
+                LogRecord(
+                    timestamp=timestamp,
+                    logDatum=LogRecordLogDatum(
+                        realValue=float(self._monitored.presentValue)
+                    ),
+                    statusFlags=[0, 0, 0, 0],
+                ),
+            )
+        )
+        self.recordCount = len(self._records)
+        self.totalRecordCount = self._sequence_number
+
+    def read_range(self, reference, max_items):
+        """
+        records of a ReadRange request, at most max_items
+
+        :return: list of (sequence number, record), firstItem, lastItem and
+            moreItems flags
+        """
+        records = list(self._records)
+        if reference is None:
+            count, matching = len(records), records
+        elif reference.byPosition is not None:
+            index, count = (
+                reference.byPosition.referenceIndex,
+                reference.byPosition.count,
+            )
+            matching = records[index - 1 :] if count >= 0 else records[:index]
+        elif reference.bySequenceNumber is not None:
+            start = reference.bySequenceNumber.referenceSequenceNumber
+            count = reference.bySequenceNumber.count
+            matching = [
+                r for r in records if (r[0] >= start if count >= 0 else r[0] <= start)
+            ]
+        else:
+            start = reference.byTime.referenceTime
+            start = start.date[:3] + start.time
+            count = reference.byTime.count
+            matching = [
+                r for r in records if (r[1] > start if count >= 0 else r[1] < start)
+            ]
+        limit = min(abs(count), max_items)
+        if count >= 0:
+            selected = matching[:limit]
+        else:
+            selected = matching[len(matching) - limit :]
+        more = len(selected) < len(matching)
+        first = bool(selected) and selected[0] is records[0]
+        last = bool(selected) and selected[-1] is records[-1]
+        return [(r[0], r[2]) for r in selected], first, last, more
+
+
+class ReadRangeServices(Capability):
+    """
+    ReadRange of the log buffer of the simulated trend logs
+    """
+
+    def do_ReadRangeRequest(self, apdu):
+        obj = self.get_object_id(apdu.objectIdentifier)
+        if not isinstance(obj, SimulatedTrendLog):
+            raise ExecutionError(errorClass="object", errorCode="unknownObject")
+        if apdu.propertyIdentifier != "logBuffer":
+            raise ExecutionError(errorClass="property", errorCode="unknownProperty")
+        records, first, last, more = obj.read_range(
+            apdu.range, max(1, (self.localDevice.maxApduLengthAccepted - 24) // 24)
+        )
+        data = SequenceOfAny()
+        data.cast_in(ListOf(LogRecord)([record for _, record in records]))
+        response = ReadRangeACK(
+            context=apdu,
+            objectIdentifier=apdu.objectIdentifier,
+            propertyIdentifier=apdu.propertyIdentifier,
+            resultFlags=[first, last, more],
+            itemCount=len(records),
+            itemData=data,
+        )
+        if records:
+            response.firstSequenceNumber = records[0][0]
+        self.response(response)
+
+
+class SimulatedApplication(BIPSimpleApplication):
+    """
+    BACnet/IP application of a simulated device, the faults of the network
+    are injected below the application and confirmed requests can be
+    answered with an abort or a reject
+    """
+
+    # replaceable by a Client/Server shim with the same options
+    fault_injector = FaultInjector
+
+    def __init__(self, device, address, abort=0.0, reject=0.0, **faults):
+        BIPSimpleApplication.__init__(self, device, address)
+        self.add_capability(ReadWritePropertyMultipleServices)
+        self.add_capability(ReadRangeServices)
+        self.add_capability(ChangeOfValueServices)
+        self.injector = self.fault_injector(**faults)
+        bind(self.annexj, self.injector, self.mux.annexJ)
+        self.abort = abort
+        self.reject = reject
+        self.requests = 0
+        self.counters = dict(aborted=0, rejected=0)
+
+    def indication(self, apdu):
+        self.requests += 1
+        if isinstance(apdu, ConfirmedRequestPDU):
+            if self.abort and random.random() < self.abort:
+                self.counters["aborted"] += 1
+                raise AbortOther()
+            if self.reject and random.random() < self.reject:
+                self.counters["rejected"] += 1
+                raise RejectOther()
+        BIPSimpleApplication.indication(self, apdu)
+
+    def statistics(self):
+        """
+        :return: dict of the count of requests and injected faults
+        """
+        result = dict(requests=self.requests)
+        result.update(self.counters)
+        result.update(self.injector.counters)
+        return result
+
+
+class ValueUpdater(RecurringTask):
+    """
+    change the present values of the input objects of the simulated devices
+    """
+
+    def __init__(self, objects, interval):
+        RecurringTask.__init__(self, int(interval * 1000))
+        self.objects = objects
+
+    def process_task(self):
+        t = time()
+        trend_logs = []
+        for obj in self.objects:
+            if isinstance(obj, AnalogInputObject):
+                phase = obj.objectIdentifier[1] / 10.0
+                obj.presentValue = round(
+                    20.0 + 5.0 * sin(2 * pi * t / 300.0 + phase), 3
+                )
+            elif isinstance(obj, BinaryInputObject):
+                if random.random() < 0.05:
+                    obj.presentValue = (
+                        "inactive" if obj.presentValue == "active" else "active"
+                    )
+            elif isinstance(obj, MultiStateInputObject):
+                if random.random() < 0.05:
+                    obj.presentValue = random.randint(1, obj.numberOfStates)
+            elif isinstance(obj, SimulatedTrendLog):
+                trend_logs.append(obj)
+        for obj in trend_logs:
+            obj.log(t)
+
+
+def create_device(
+    address,
+    device_instance,
+    objects=10,
+    writeable=1,
+    max_apdu=1024,
+    trend_logs=0,
+    buffer_size=1000,
+    **faults
+):
+    """
+    create a simulated device with objects analog, binary and multistate
+    inputs and writeable values of each kind, faults are the FAULTS options
+    of SimulatedApplication and FaultInjector
+
+    :param trend_logs: trend logs of the first analog inputs, logging at each
+        value update
+    :param buffer_size: records kept by the trend logs
+    :return: the application of the device
+    """
+    device = LocalDeviceObject(
+        objectName="sim-%d" % device_instance,
+        objectIdentifier=("device", device_instance),
+        maxApduLengthAccepted=max_apdu,
+        segmentationSupported="noSegmentation",
+        vendorIdentifier=VENDOR_ID,
+    )
+    application = SimulatedApplication(device, address, **faults)
+    for i in range(1, objects + 1):
+        application.add_object(
+            AnalogInputObject(
+                objectIdentifier=("analogInput", i),
+                objectName="ai-%d" % i,
+                presentValue=20.0,
+                units="degreesCelsius",
+                covIncrement=0.01,
+                statusFlags=[0, 0, 0, 0],
+                eventState="normal",
+                reliability="noFaultDetected",
+                outOfService=False,
+            )
+        )
+        application.add_object(
+            BinaryInputObject(
+                objectIdentifier=("binaryInput", i),
+                objectName="bi-%d" % i,
+                presentValue="inactive",
+                polarity="normal",
+                statusFlags=[0, 0, 0, 0],
+                eventState="normal",
+                reliability="noFaultDetected",
+                outOfService=False,
+            )
+        )
+        application.add_object(
+            MultiStateInputObject(
+                objectIdentifier=("multiStateInput", i),
+                objectName="msi-%d" % i,
+                presentValue=1,
+                numberOfStates=len(STATE_TEXTS),
+                stateText=ArrayOf(CharacterString)(STATE_TEXTS),
+                statusFlags=[0, 0, 0, 0],
+                eventState="normal",
+                reliability="noFaultDetected",
+                outOfService=False,
+            )
+        )
+    for i in range(1, writeable + 1):
+        application.add_object(
+            AnalogValueCmdObject(
+                objectIdentifier=("analogValue", i),
+                objectName="av-%d" % i,
+                presentValue=0.0,
+                units="percent",
+                covIncrement=0.1,
+                statusFlags=[0, 0, 0, 0],
+                eventState="normal",
+                reliability="noFaultDetected",
+                outOfService=False,
+            )
+        )
+        application.add_object(
+            BinaryValueCmdObject(
+                objectIdentifier=("binaryValue", i),
+                objectName="bv-%d" % i,
+                presentValue="inactive",
+                statusFlags=[0, 0, 0, 0],
+                eventState="normal",
+                reliability="noFaultDetected",
+                outOfService=False,
+            )
+        )
+        application.add_object(
+            MultiStateValueCmdObject(
+                objectIdentifier=("multiStateValue", i),
+                objectName="msv-%d" % i,
+                presentValue=1,
+                numberOfStates=len(STATE_TEXTS),
+                stateText=ArrayOf(CharacterString)(STATE_TEXTS),
+                statusFlags=[0, 0, 0, 0],
+                eventState="normal",
+                reliability="noFaultDetected",
+                outOfService=False,
+            )
+        )
+    for i in range(1, min(trend_logs, objects) + 1):
+        application.add_object(
+            SimulatedTrendLog(
+                application.objectIdentifier[("analogInput", i)],
+                objectIdentifier=("trendLog", i),
+                objectName="tl-%d" % i,
+                enable=True,
+                stopWhenFull=False,
+                bufferSize=buffer_size,
+                recordCount=0,
+                totalRecordCount=0,
+                loggingType="polled",
+                statusFlags=[0, 0, 0, 0],
+                eventState="normal",
+            )
+        )
+    return application
+
+
+class DeviceFarm:
+    """
+    N simulated BACnet/IP devices, device n listens on port + n of ip
+    """
+
+    def __init__(
+        self,
+        devices=1,
+        ip="127.0.0.1",
+        port=47809,
+        device_instance=100000,
+        update_interval=1.0,
+        faulty_devices=None,
+        **kwargs
+    ):
+        """
+        :param faulty_devices: number of devices, from the first one, with
+            the injected faults, default: all devices
+        """
+        if not driver_ok:
+            raise ImportError("bacpypes is needed for the BACnet simulator")
+        self.applications = []
+        objects = []
+        clean = {k: v for k, v in kwargs.items() if k not in FAULTS}
+        for n in range(devices):
+            application = create_device(
+                "%s:%d" % (ip, port + n),
+                device_instance + n,
+                **(kwargs if faulty_devices is None or n < faulty_devices else clean)
+            )
+            self.applications.append(application)
+            objects += application.objectIdentifier.values()
+        self.updater = ValueUpdater(objects, update_interval)
+        self.updater.install_task()
+
+    def addresses(self):
+        """
+        :return: list of (address, device instance) of the devices
+        """
+        return [
+            (
+                str(application.localAddress),
+                application.localDevice.objectIdentifier[1],
+            )
+            for application in self.applications
+        ]
+
+    def discovered_objects(self):
+        """
+        the objects of each device in the format of save_discovered_objects
+        """
+        result = {}
+        for application in self.applications:
+            points = []
+            for object_type, instance in application.objectIdentifier.keys():
+                if object_type in ("device", "trendLog"):
+                    continue
+                obj = application.objectIdentifier[(object_type, instance)]
+                state_texts = []
+                if hasattr(obj, "stateText") and obj.stateText is not None:
+                    state_texts = [
+                        str(obj.stateText[i]) for i in range(1, obj.stateText[0] + 1)
+                    ]
+                points.append(
+                    dict(
+                        object_type=object_type,
+                        object_identifier=instance,
+                        object_name=obj.objectName,
+                        description="",
+                        units=getattr(obj, "units", None) or "",
+                        state_texts=state_texts,
+                    )
+                )
+            result[str(application.localAddress)] = points
+        return result
+
+    def requests(self):
+        return sum(application.requests for application in self.applications)
+
+    def statistics(self):
+        """
+        :return: dict of the count of requests and injected faults of all
+            devices
+        """
+        result = {}
+        for application in self.applications:
+            for key, value in application.statistics().items():
+                result[key] = result.get(key, 0) + value
+        return result
+
+    def close(self):
+        self.updater.suspend_task()
+        for application in self.applications:
+            application.close_socket()
+
+    def run(self):
+        run()
+
+    def stop(self):
+        stop()
+
+
+def run_farm(ready=None, statistics=None, **kwargs):
+    """
+    run a device farm until the process is stopped, to be used as target of
+    a child process
+
+    :param statistics: queue receiving the statistics of the farm when the
+        process is terminated
+    """
+    farm = DeviceFarm(**kwargs)
+    if ready is not None:
+        ready.set()
+    try:
+        # returns when the process receives SIGTERM
+        farm.run()
+    finally:
+        farm.close()
+    if statistics is not None:
+        statistics.put(farm.statistics())
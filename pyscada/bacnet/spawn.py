@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from importlib import import_module
+
+
+def run_with_django(target, *args, **kwargs):
+    """
+    call target, the dotted path of a function, in a child process started
+    with spawn: the modules using the models can only be imported once
+    django is set up, with the settings module of the parent
+    """
+    import django
+
+    django.setup()
+    module, _, name = target.rpartition(".")
+    return getattr(import_module(module), name)(*args, **kwargs)
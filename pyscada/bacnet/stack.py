@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.bacnet.metrics import metrics
+from pyscada.bacnet.server import ExportedObjects
+from pyscada.bacnet.loop import start_server
+
+from time import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# the result of a discovery is used by the other local devices of the stack
+# discovering within this time
+DISCOVERY_MAX_AGE = 60.0
+
+# BACnet stacks of the process by (ip, port)
+_stacks = {}
+
+
+class Stack:
+    """
+    BACnet stack shared by the local devices bound to the same interface and
+    port: one socket, one address binding cache and one core thread
+    """
+
+    def __init__(self, key, server):
+        self.key = key
+        self.server = server
+        # ids of the local devices using the stack
+        self.users = set()
+        self.exported = None
+        self.discovered = None
+        self.discovered_at = 0.0
+
+    def __str__(self):
+        return "%s:%d" % self.key
+
+    @classmethod
+    def get(cls, device_id, ip, mask, port, **kwargs):
+        """
+        return the stack bound to ip and port, started with the BAC0.lite
+        kwargs by its first user
+        """
+        key = (str(ip), int(port))
+        stack = _stacks.get(key)
+        if stack is None:
+            server = start_server(ip="%s/%s" % (ip, mask), port=key[1], **kwargs)
+            stack = cls(key, server)
+            _stacks[key] = stack
+        elif kwargs.get("bbmdAddress") or kwargs.get("bdtable"):
+            logger.info(
+                "BACnet stack %s shared, the BBMD settings of its first local "
+                "device are used" % stack
+            )
+        stack.users.add(device_id)
+        return stack
+
+    def release(self, device_id):
+        """
+        remove a user of the stack, the last one stops it
+        """
+        if device_id not in self.users:
+            return
+        self.users.discard(device_id)
+        if self.exported is not None:
+            self.exported.unload(device_id)
+        if self.users:
+            return
+        if _stacks.get(self.key) is self:
+            del _stacks[self.key]
+        self.server.disconnect()
+
+    def exported_objects(self):
+        """
+        value objects served by the stack, shared by its local devices
+        """
+        if self.exported is None:
+            self.exported = ExportedObjects(self.server.this_application)
+        return self.exported
+
+    def discover(self, device, refresh=False):
+        """
+        devices answering a Who-Is of device, the last discovery of the stack
+        is reused for DISCOVERY_MAX_AGE seconds
+
+        :param refresh: discover again, to find devices added since the last
+            discovery
+        """
+        if (
+            not refresh
+            and self.discovered is not None
+            and time() - self.discovered_at < DISCOVERY_MAX_AGE
+        ):
+            return self.discovered
+        start = time()
+        try:
+            self.server.discover(networks="known")
+        except Exception as e:
+            metrics.request(device, "discovery", time() - start, e)
+            raise
+        metrics.request(device, "discovery", time() - start)
+        self.discovered = self.server.devices
+        self.discovered_at = time()
+        return self.discovered
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import tempfile
+
+import django
+from django.conf import settings
+import pytest
+
+
+def pytest_configure(config):
+    """
+    minimal settings of a PyScada project with the BACnet plugin, unless a
+    settings module is given with DJANGO_SETTINGS_MODULE
+    """
+    if not settings.configured and not os.environ.get("DJANGO_SETTINGS_MODULE"):
+        base_dir = tempfile.mkdtemp()
+        settings.configure(
+            BASE_DIR=base_dir,
+            SECRET_KEY="pyscada-bacnet-tests",
+            INSTALLED_APPS=[
+                "django.contrib.admin",
+                "django.contrib.auth",
+                "django.contrib.contenttypes",
+                "django.contrib.sessions",
+                "django.contrib.messages",
+                "pyscada",
+                "pyscada.hmi",
+                "pyscada.export",
+                "pyscada.event",
+                "pyscada.mail",
+                "pyscada.log",
+                "pyscada.bacnet",
+            ],
+            DATABASES={
+                "default": {
+                    "ENGINE": "django.db.backends.sqlite3",
+                    "NAME": ":memory:",
+                }
+            },
+            USE_TZ=True,
+            PYSCADA={},
+            PYSCADA_BACNET={"metrics_dir": os.path.join(base_dir, "metrics")},
+        )
+    django.setup()
+
+
+def pytest_collection_modifyitems(items):
+    """
+    run the TransactionTestCase tests last like the django test runner, they
+    flush the database
+    """
+    from django.test import TestCase, TransactionTestCase
+
+    def flushes(item):
+        cls = getattr(item, "cls", None)
+        return (
+            cls is not None
+            and issubclass(cls, TransactionTestCase)
+            and not issubclass(cls, TestCase)
+        )
+
+    items.sort(key=flushes)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def test_database():
+    """
+    create the test database once for the session, the tests using it are
+    django TestCase classes rolling back their changes
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    yield
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+    teardown_test_environment()
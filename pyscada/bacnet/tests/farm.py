@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from multiprocessing import get_context
+
+import BAC0
+from bacpypes.basetypes import ObjectTypesSupported
+from django.test import TestCase
+
+from pyscada.models import Device as PyScadaDevice
+from pyscada.bacnet.benchmark import (
+    CLIENT_IP,
+    CLIENT_PORT,
+    SIMULATOR_IP,
+    SIMULATOR_PORT,
+    _point_table,
+)
+from pyscada.bacnet.device import Device
+from pyscada.bacnet.metrics import metrics
+from pyscada.bacnet.models import BACnetVariable
+from pyscada.bacnet.simulator import run_farm
+
+# objects of each input type of the simulated devices
+OBJECTS = 2
+
+
+class FarmTestCase(TestCase):
+    """
+    acquisition of devices simulated by a DeviceFarm in a child process, the
+    point table is created the way the benchmark does and read by a local
+    device using the BAC0 application of the test case
+    """
+
+    devices = 1
+    farm_options = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ctx = get_context("spawn")
+        ready = ctx.Event()
+        cls.farm = ctx.Process(
+            target=run_farm,
+            args=(ready,),
+            kwargs=dict(
+                devices=cls.devices,
+                ip=SIMULATOR_IP,
+                port=SIMULATOR_PORT,
+                objects=OBJECTS,
+                writeable=0,
+                **cls.farm_options
+            ),
+        )
+        cls.farm.start()
+        if not ready.wait(60):
+            cls.farm.terminate()
+            raise RuntimeError("the BACnet simulator did not start")
+        cls.server = BAC0.lite(ip="%s/8" % CLIENT_IP, port=CLIENT_PORT)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.disconnect()
+        cls.farm.terminate()
+        cls.farm.join()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.local = _point_table(self.devices, OBJECTS)
+        self.remote = self.remote_device(0)
+
+    @staticmethod
+    def remote_device(n):
+        return PyScadaDevice.objects.select_related("bacnetdevice").get(
+            short_name="bacnet-benchmark-%d" % n
+        )
+
+    def bacnet_variable(self, object_type, instance):
+        return BACnetVariable.objects.get(
+            bacnet_variable__device=self.remote,
+            object_type=ObjectTypesSupported.bitNames[object_type],
+            object_identifier=instance,
+        )
+
+    def acquisition_mode(self, mode):
+        self.remote.bacnetdevice.acquisition_mode = mode
+        self.remote.bacnetdevice.save()
+
+    def connect(self):
+        local = PyScadaDevice.objects.select_related("bacnetdevice").get(
+            pk=self.local.pk
+        )
+        return Device(local, server=self.server)
+
+    def acquire(self, daq, remote=None):
+        """
+        one cycle of a remote device, default: the first one
+
+        :return: the variables updated and the points read
+        """
+        remote = remote or self.remote
+        output = daq.request_data(remote.pk)
+        return output, metrics.cycle_timer(remote).cycles[-1]["points"]
+
+    def requests(self, daq):
+        return daq._poll_plan.get(self.remote.pk, [])
+
+    def references(self, daq):
+        return [
+            reference
+            for request in self.requests(daq)
+            for reference in request.references
+        ]
+
+    def instances(self, daq, object_type):
+        return [
+            reference.object_instance
+            for reference in self.references(daq)
+            if reference.object_type == object_type
+        ]
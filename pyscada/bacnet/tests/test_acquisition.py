@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from time import sleep
+
+import pytest
+
+pytest.importorskip("BAC0")
+
+from pyscada.models import RecordedData, Variable
+from pyscada.bacnet.models import (
+    BACnetQuarantinedReference,
+    BACnetTrendLog,
+    BACnetVariable,
+)
+from pyscada.bacnet.tests.farm import OBJECTS, FarmTestCase
+
+
+class AcquisitionTestCase(FarmTestCase):
+    def test_read_property(self):
+        self.acquisition_mode(0)
+        daq = self.connect()
+        self.assertEqual(len(self.requests(daq)), 3 * OBJECTS)
+        output, points = self.acquire(daq)
+        self.assertEqual(points, 3 * OBJECTS)
+        ai = self.bacnet_variable("analogInput", 1).bacnet_variable_id
+        self.assertTrue(15.0 <= daq.variables[ai].value <= 25.0)
+
+    def test_read_property_multiple(self):
+        self.acquisition_mode(1)
+        daq = self.connect()
+        self.assertEqual(len(self.requests(daq)), 1)
+        output, points = self.acquire(daq)
+        self.assertEqual(points, 3 * OBJECTS)
+        msi = self.bacnet_variable("multiStateInput", 1).bacnet_variable_id
+        self.assertIn(daq.variables[msi].value, (1.0, 2.0, 3.0))
+
+    def test_simulated_objects(self):
+        """
+        the variables provisioned from the objects of the farm
+        """
+        daq = self.connect()
+        self.assertEqual(list(daq.remote_devices.keys()), [self.remote.pk])
+        self.assertEqual(len(daq.variables), 3 * OBJECTS)
+
+    def test_quality(self):
+        self.acquisition_mode(1)
+        ai = self.bacnet_variable("analogInput", 1)
+        ai.read_quality = 2
+        ai.discard_bad_quality = True
+        ai.save()
+        # a variable storing the quality of the analog input
+        variable = Variable.objects.get(pk=ai.bacnet_variable_id)
+        variable.pk = None
+        variable.name = "%s-quality" % variable.name
+        variable.save()
+        BACnetVariable.objects.create(
+            bacnet_variable=variable,
+            object_type=ai.object_type,
+            object_identifier=ai.object_identifier,
+            quality_of=ai,
+        )
+        daq = self.connect()
+        self.assertEqual(
+            set(
+                reference.property_id
+                for reference in self.references(daq)
+                if reference.object_instance == 1
+                and reference.object_type == "analogInput"
+            ),
+            {"presentValue", "statusFlags", "reliability", "outOfService"},
+        )
+        output, points = self.acquire(daq)
+        self.assertEqual(points, 3 * OBJECTS)
+        self.assertIsNotNone(daq.variables[ai.bacnet_variable_id].value)
+        self.assertEqual(daq.variables[variable.pk].value, 0)
+
+
+class TrendLogTestCase(FarmTestCase):
+    farm_options = dict(trend_logs=1, update_interval=0.2)
+
+    def test_trend_log_backfill(self):
+        self.acquisition_mode(1)
+        ai = self.bacnet_variable("analogInput", 1)
+        trend_log = BACnetTrendLog.objects.create(
+            bacnet_variable=ai, trend_log_instance=1
+        )
+        # records logged by the simulated trend log before the first cycle
+        sleep(1.0)
+        daq = self.connect()
+        self.assertIn(self.remote.pk, daq._backfill_pending)
+        self.acquire(daq)
+        self.assertNotIn(self.remote.pk, daq._backfill_pending)
+        trend_log.refresh_from_db()
+        self.assertGreater(trend_log.records_backfilled, 0)
+        self.assertIsNotNone(trend_log.last_sequence_number)
+        self.assertIsNotNone(trend_log.last_backfill)
+        self.assertEqual(
+            RecordedData.objects.filter(variable_id=ai.bacnet_variable_id).count(),
+            trend_log.records_backfilled,
+        )
+
+
+class QuarantineTestCase(FarmTestCase):
+    def quarantined(self, daq, bacnet_variable):
+        """
+        quarantine a reference due for a re-check in the next pass
+        """
+        daq._quarantine[bacnet_variable.bacnet_variable_id][
+            "presentValue"
+        ].last_check = None
+
+    def test_quarantine(self):
+        self.acquisition_mode(1)
+        ai = self.bacnet_variable("analogInput", 2)
+        ai.object_identifier = 99
+        ai.save()
+        daq = self.connect()
+        output, points = self.acquire(daq)
+        # the other objects of the request are read
+        self.assertEqual(points, 3 * OBJECTS - 1)
+        entry = BACnetQuarantinedReference.objects.get(bacnet_variable=ai)
+        self.assertEqual(entry.property_name, "presentValue")
+        self.assertEqual(entry.error, "unknownObject")
+        self.assertNotIn(99, self.instances(daq, "analogInput"))
+        output, points = self.acquire(daq)
+        self.assertEqual(points, 3 * OBJECTS - 1)
+
+        # re-checked while the object is still unknown
+        self.quarantined(daq, ai)
+        daq.request_data()
+        entry.refresh_from_db()
+        self.assertEqual(entry.checks, 1)
+        self.assertIn(ai.bacnet_variable_id, daq._quarantine)
+
+    def test_release_by_recheck(self):
+        self.acquisition_mode(1)
+        ai = self.bacnet_variable("analogInput", 2)
+        # quarantined while the object was missing on the device
+        BACnetQuarantinedReference.objects.create(
+            bacnet_variable=ai, property_name="presentValue", error="unknownObject"
+        )
+        daq = self.connect()
+        self.assertNotIn(2, self.instances(daq, "analogInput"))
+        self.quarantined(daq, ai)
+        daq.request_data()
+        self.assertFalse(
+            BACnetQuarantinedReference.objects.filter(bacnet_variable=ai).exists()
+        )
+        self.assertIn(2, self.instances(daq, "analogInput"))
+        output, points = self.acquire(daq)
+        self.assertEqual(points, 3 * OBJECTS)
+
+    def test_release_by_configuration(self):
+        self.acquisition_mode(1)
+        ai = self.bacnet_variable("analogInput", 2)
+        ai.object_identifier = 99
+        ai.save()
+        daq = self.connect()
+        self.acquire(daq)
+        self.assertTrue(
+            BACnetQuarantinedReference.objects.filter(bacnet_variable=ai).exists()
+        )
+        # a changed variable is read again
+        ai.object_identifier = 2
+        ai.save()
+        self.assertFalse(
+            BACnetQuarantinedReference.objects.filter(bacnet_variable=ai).exists()
+        )
+        daq.reload()
+        output, points = self.acquire(daq)
+        self.assertEqual(points, 3 * OBJECTS)
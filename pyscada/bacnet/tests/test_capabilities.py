@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("bacpypes")
+
+from bacpypes.basetypes import ServicesSupported
+from django.test import override_settings
+from django.utils.timezone import now
+
+from pyscada.bacnet.capabilities import Capabilities, objects_cached
+from pyscada.bacnet.models import BACnetDevice
+
+
+def services(*names):
+    bits = ["0"] * ServicesSupported.bitLen
+    for name in names:
+        bits[ServicesSupported.bitNames[name]] = "1"
+    return "".join(bits)
+
+
+def test_objects_cached_never_enumerated():
+    assert not objects_cached(BACnetDevice(objects_enumerated=None), 3, 3)
+
+
+def test_objects_cached_database_revision():
+    bacnet_device = BACnetDevice(objects_enumerated=now() - timedelta(days=30))
+    assert objects_cached(bacnet_device, 3, 3)
+    assert objects_cached(bacnet_device, "3", 3)
+    assert not objects_cached(bacnet_device, 4, 3)
+    assert not objects_cached(bacnet_device, 3, None)
+
+
+@override_settings(PYSCADA_BACNET={"enumeration_max_age": 3600})
+def test_objects_cached_without_database_revision():
+    assert objects_cached(
+        BACnetDevice(objects_enumerated=now() - timedelta(minutes=10)), None, None
+    )
+    assert not objects_cached(
+        BACnetDevice(objects_enumerated=now() - timedelta(hours=2)), None, None
+    )
+
+
+def test_supports():
+    capabilities = Capabilities({"protocolServicesSupported": services("readProperty")})
+    assert capabilities.supports("readProperty")
+    assert capabilities.supports("readPropertyMultiple") is False
+    assert Capabilities().supports("readPropertyMultiple") is None
+
+
+def test_reject():
+    capabilities = Capabilities()
+    capabilities.reject("readPropertyMultiple")
+    assert capabilities.supports("readPropertyMultiple") is False
+    assert capabilities.supports("readProperty") is None
+    assert capabilities.acquisition() == "read"
+
+
+def test_limit():
+    capabilities = Capabilities({"segmentationSupported": "segmentedBoth"})
+    capabilities.limit(480)
+    assert capabilities.max_apdu == 480
+    assert capabilities.segmentation == "segmentedReceive"
+    capabilities = Capabilities()
+    capabilities.limit(206)
+    assert capabilities.segmentation == "noSegmentation"
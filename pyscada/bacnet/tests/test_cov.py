@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+pytest.importorskip("BAC0")
+
+from bacpypes.apdu import UnconfirmedCOVNotificationRequest
+from bacpypes.basetypes import PropertyValue, StatusFlags
+from bacpypes.constructeddata import Any
+from bacpypes.pdu import Address
+from bacpypes.primitivedata import Real
+
+from pyscada.bacnet.cov import Subscription, subscribable
+from pyscada.bacnet.device import ReadReference
+
+ADDRESS = Address("192.0.2.1")
+
+
+def reference(object_type="analogInput", property_id="presentValue", index=None):
+    return ReadReference(ADDRESS, object_type, 1, property_id, index, Real)
+
+
+def test_subscribable():
+    assert subscribable(reference())
+    assert subscribable(reference("multiStateValue"))
+    assert not subscribable(reference(property_id="highLimit"))
+    assert not subscribable(reference(index=1))
+    assert not subscribable(reference("accumulator"))
+
+
+def test_request():
+    subscription = Subscription(reference(), 300)
+    request = subscription.request()
+    assert request.pduDestination == ADDRESS
+    assert request.monitoredObjectIdentifier == ("analogInput", 1)
+    assert request.issueConfirmedNotifications is False
+    assert request.lifetime == 300
+    # a cancel request has no lifetime
+    request = subscription.request(cancel=True)
+    assert request.issueConfirmedNotifications is None
+    assert request.lifetime is None
+
+
+def test_cov_notification():
+    subscription = Subscription(reference(), 300)
+    notification = UnconfirmedCOVNotificationRequest(
+        subscriberProcessIdentifier=subscription.subscriberProcessIdentifier,
+        initiatingDeviceIdentifier=("device", 1),
+        monitoredObjectIdentifier=("analogInput", 1),
+        timeRemaining=300,
+        listOfValues=[
+            PropertyValue(propertyIdentifier="presentValue", value=Any(Real(21.5))),
+            PropertyValue(
+                propertyIdentifier="statusFlags",
+                value=Any(StatusFlags([0, 0, 0, 0])),
+            ),
+        ],
+    )
+    notification.pduSource = ADDRESS
+    result = subscription.cov_notification(notification)
+    assert result["properties"] == {"presentValue": 21.5}
+    values = subscription.pop()
+    assert [value for timestamp, value in values] == [21.5]
+    # the values are queued once
+    assert subscription.pop() == []
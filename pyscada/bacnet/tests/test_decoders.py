@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+bacpypes = pytest.importorskip("bacpypes")
+
+from bacpypes.basetypes import BinaryPV
+from bacpypes.constructeddata import Any
+from bacpypes.primitivedata import (
+    Boolean,
+    CharacterString,
+    Double,
+    Integer,
+    Real,
+    TagList,
+    Unsigned,
+)
+
+from pyscada.bacnet.decoders import decode_primitive, decode_value
+
+
+def received(value):
+    """
+    a property value as received, decoded from its tags
+    """
+    tags = TagList()
+    Any(value).encode(tags)
+    result = Any()
+    result.decode(TagList(tags.tagList))
+    return result
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (Real(21.5), 21.5),
+        (Double(-1.25), -1.25),
+        (Boolean(True), 1.0),
+        (Boolean(False), 0.0),
+        (Unsigned(0), 0.0),
+        (Unsigned(70000), 70000.0),
+        (Integer(-300), -300.0),
+        (BinaryPV("active"), 1.0),
+        (BinaryPV("inactive"), 0.0),
+    ],
+)
+def test_decode_primitive(value, expected):
+    assert decode_primitive(received(value)) == expected
+
+
+def test_decode_primitive_other_values():
+    assert decode_primitive(received(CharacterString("ai-1"))) is None
+
+
+def test_decode_value_generic_cast():
+    assert decode_value(received(CharacterString("ai-1")), CharacterString) == "ai-1"
+    assert decode_value(received(Real(1.5)), Real) == 1.5
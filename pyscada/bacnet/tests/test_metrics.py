@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from pyscada.models import Device
+from pyscada.bacnet import PROTOCOL_ID
+from pyscada.bacnet.metrics import (
+    BUCKETS,
+    Metrics,
+    prometheus_text,
+    read_cycles,
+    read_metrics,
+)
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        # devices with the same short name
+        self.devices = [
+            Device.objects.create(short_name="ahu", protocol_id=PROTOCOL_ID)
+            for i in range(2)
+        ]
+        self.metrics = Metrics()
+        metrics_dir = tempfile.mkdtemp()
+        self.settings = override_settings(
+            PYSCADA_BACNET={"metrics_dir": metrics_dir},
+            ROOT_URLCONF="pyscada.bacnet.urls",
+            MIDDLEWARE=[
+                "django.contrib.sessions.middleware.SessionMiddleware",
+                "django.contrib.auth.middleware.AuthenticationMiddleware",
+            ],
+        )
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+
+    def acquire(self, device, duration):
+        timer = self.metrics.cycle_timer(device)
+        timer.start()
+        timer.add("network", duration)
+        self.metrics.request(device, "readPropertyMultiple", duration)
+        self.metrics.cycle_done(device)
+
+    def test_devices_with_the_same_name(self):
+        first, second = self.devices
+        self.acquire(first, 0.02)
+        self.acquire(first, 0.02)
+        self.acquire(second, 0.2)
+        self.assertIsNot(
+            self.metrics.cycle_timer(first), self.metrics.cycle_timer(second)
+        )
+        self.assertEqual(len(self.metrics.cycle_timer(first).cycles), 2)
+        self.assertEqual(len(self.metrics.cycle_timer(second).cycles), 1)
+        labels = (
+            ("device_id", str(first.pk)),
+            ("device", "bacnet-ahu"),
+            ("service", "readPropertyMultiple"),
+        )
+        self.assertEqual(self.metrics.counters[("bacnet_requests_total", labels)], 2)
+
+        self.metrics.flush(force=True)
+        cycles = read_cycles()
+        self.assertEqual(sorted(cycles), sorted([str(first.pk), str(second.pk)]))
+        self.assertEqual(cycles[str(first.pk)]["device"], "bacnet-ahu")
+        self.assertEqual(len(cycles[str(first.pk)]["cycles"]), 2)
+
+    def test_prometheus_text(self):
+        first, second = self.devices
+        self.acquire(first, 0.02)
+        self.acquire(first, 0.02)
+        self.acquire(second, 0.2)
+        self.metrics.request(second, "readProperty", 0.5, Exception("error"))
+        self.metrics.set("bacnet_discovered_devices", 3, (("device", "local"),))
+        self.metrics.flush(force=True)
+        lines = prometheus_text(read_metrics()).splitlines()
+
+        self.assertIn("# TYPE bacnet_requests_total counter", lines)
+        self.assertIn(
+            'bacnet_requests_total{device="bacnet-ahu",device_id="%d",'
+            'service="readPropertyMultiple"} 2.0' % first.pk,
+            lines,
+        )
+        self.assertIn(
+            'bacnet_requests_total{device="bacnet-ahu",device_id="%d",'
+            'service="readPropertyMultiple"} 1.0' % second.pk,
+            lines,
+        )
+        self.assertIn(
+            'bacnet_request_errors_total{device="bacnet-ahu",device_id="%d",kind="error",'
+            'service="readProperty"} 1.0' % second.pk,
+            lines,
+        )
+        self.assertIn('bacnet_discovered_devices{device="local"} 3.0', lines)
+
+        # cumulative buckets of the histogram
+        labels = 'device="bacnet-ahu",device_id="%d",service="readPropertyMultiple"' % (
+            first.pk
+        )
+        buckets = [
+            line
+            for line in lines
+            if line.startswith("bacnet_request_duration_seconds_bucket{%s," % labels)
+        ]
+        self.assertEqual(len(buckets), len(BUCKETS) + 1)
+        self.assertEqual(
+            buckets[0],
+            'bacnet_request_duration_seconds_bucket{%s,le="0.005"} 0' % labels,
+        )
+        self.assertEqual(
+            buckets[-1],
+            'bacnet_request_duration_seconds_bucket{%s,le="+Inf"} 2' % labels,
+        )
+        self.assertIn(
+            "bacnet_request_duration_seconds_count{%s} 2" % labels,
+            lines,
+        )
+        self.assertIn(
+            'bacnet_cycle_phase_seconds_total{device="bacnet-ahu",device_id="%d",'
+            'phase="network"} 0.04' % first.pk,
+            lines,
+        )
+
+    def test_views(self):
+        self.acquire(self.devices[0], 0.02)
+        self.metrics.flush(force=True)
+
+        response = self.client.get("/metrics/bacnet/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(b"bacnet_requests_total{", response.content)
+        response = self.client.get("/metrics/bacnet/cycles/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()[str(self.devices[0].pk)]["device"], "bacnet-ahu"
+        )
+
+        # other clients are refused unless they are logged in
+        response = self.client.get("/metrics/bacnet/", REMOTE_ADDR="192.0.2.1")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get("/metrics/bacnet/cycles/", REMOTE_ADDR="192.0.2.1")
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(User.objects.create_user("metrics"))
+        response = self.client.get("/metrics/bacnet/", REMOTE_ADDR="192.0.2.1")
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.bacnet.models import BACnetDevice
+
+
+def test_shard_index_single_shard():
+    bacnet_device = BACnetDevice(shard_count=1)
+    assert {bacnet_device.shard_index(device_id) for device_id in range(50)} == {0}
+
+
+def test_shard_index_spread():
+    bacnet_device = BACnetDevice(shard_count=4)
+    shards = [bacnet_device.shard_index(device_id) for device_id in range(200)]
+    assert set(shards) == {0, 1, 2, 3}
+    assert shards == [bacnet_device.shard_index(device_id) for device_id in range(200)]
+
+
+def test_shard_index_stable_when_adding_shards():
+    """
+    a new shard only takes remote devices, the other ones keep their shard
+    """
+    before = BACnetDevice(shard_count=4)
+    after = BACnetDevice(shard_count=5)
+    for device_id in range(200):
+        shard = after.shard_index(device_id)
+        assert shard == 4 or shard == before.shard_index(device_id)
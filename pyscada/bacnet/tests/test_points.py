@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.test import TestCase
+
+from pyscada.models import Device, Unit, Variable
+from pyscada.bacnet import PROTOCOL_ID
+from pyscada.bacnet.models import BACnetDevice, BACnetVariable
+from pyscada.bacnet.points import (
+    HIGH_LIMIT,
+    import_points,
+    object_types,
+    read_csv,
+    read_ede,
+)
+
+EDE = """#Engineering-Data-Exchange - B.A.C.n.e.t EDE 2.0
+#
+# keyname;device obj.-instance;object-name;object-type;object-instance;description;present-value-default;min-present-value;max-present-value;settable;supports COV;hi-limit;low-limit;state-text-reference;unit-code;vendor-specific-address
+ahu-1;1001;supply-temp;0;1;supply air temperature;;0;50;N;;40;5;;62;
+ahu-1;1001;valve;1;2;heating valve;;0;100;Y;;;;;98;
+ahu-1;n/a;fan;3;3;supply fan;;;;N;;;;;;
+ahu-2;1002;return-temp;0;1;return air temperature;;;;N;;;;;62;
+"""
+
+EDE_WITHOUT_UNITS = """# keyname;device obj.-instance;object-name;object-type;object-instance;description
+ahu-1;1001;supply-temp;0;1;;;;;;;;;;;
+ahu-1;1001;valve;1;2;;;;;;;;;;;
+"""
+
+
+class ReadTestCase(TestCase):
+    def test_read_ede(self):
+        points = read_ede(EDE)
+        self.assertEqual(
+            [(p["name"], p["object_type"], p["object_identifier"]) for p in points],
+            [
+                ("supply-temp", 0, 1),
+                ("valve", 1, 2),
+                ("fan", 3, 3),
+                ("return-temp", 0, 1),
+            ],
+        )
+        self.assertEqual(points[0]["unit"], "degreesCelsius")
+        self.assertEqual(points[0]["properties"], {HIGH_LIMIT: 40.0, 59: 5.0})
+        self.assertEqual((points[0]["value_min"], points[0]["value_max"]), (0, 50))
+        self.assertTrue(points[1]["writeable"])
+
+    def test_read_ede_device_instance(self):
+        """
+        the rows of other devices and with an invalid device instance are
+        skipped
+        """
+        points = read_ede(EDE, device_instance=1001)
+        self.assertEqual([p["name"] for p in points], ["supply-temp", "valve"])
+
+    def test_read_csv(self):
+        points = read_csv(
+            "name;object_type;object_instance;unit;writeable\n"
+            "temp;analogInput;1;degreesCelsius;\n"
+            "setpoint;2;4;;Y\n"
+            "invalid;unknownType;1;;\n"
+        )
+        self.assertEqual(len(points), 2)
+        self.assertEqual(points[0]["object_type"], object_types["analogInput"])
+        self.assertEqual(points[1]["object_identifier"], 4)
+        self.assertTrue(points[1]["writeable"])
+
+
+class ImportTestCase(TestCase):
+    def setUp(self):
+        self.device = Device.objects.create(short_name="ahu-1", protocol_id=PROTOCOL_ID)
+        BACnetDevice.objects.create(bacnet_device=self.device, device_type=1)
+
+    def presentvalue_variable(self, object_type, instance):
+        return Variable.objects.get(
+            device=self.device,
+            bacnetvariable__object_type=object_type,
+            bacnetvariable__object_identifier=instance,
+            bacnetvariable__property_id=85,
+            bacnetvariable__property_array_index__isnull=True,
+            bacnetvariable__quality_of__isnull=True,
+        )
+
+    def copy(self, variable, suffix, **bacnet_fields):
+        """
+        another variable of the object of variable
+        """
+        bacnet_variable = variable.bacnetvariable
+        copy = Variable.objects.get(pk=variable.pk)
+        copy.pk = None
+        copy.name = "%s-%s" % (variable.name, suffix)
+        copy.save()
+        return BACnetVariable.objects.create(
+            bacnet_variable=copy,
+            object_type=bacnet_variable.object_type,
+            object_identifier=bacnet_variable.object_identifier,
+            **bacnet_fields
+        )
+
+    def test_import(self):
+        result = import_points(self.device, read_ede(EDE, device_instance=1001))
+        self.assertEqual(result, dict(created=2, updated=0, unchanged=0))
+        temp = self.presentvalue_variable(0, 1)
+        self.assertEqual(temp.unit.unit, "°C")
+        self.assertEqual(temp.description, "supply air temperature")
+        result = import_points(self.device, read_ede(EDE, device_instance=1001))
+        self.assertEqual(result, dict(created=0, updated=0, unchanged=2))
+
+    def test_reimport_with_other_variables_of_the_object(self):
+        import_points(self.device, read_ede(EDE, device_instance=1001))
+        temp = self.presentvalue_variable(0, 1)
+        high_limit = self.copy(temp, "high-limit", property_id=HIGH_LIMIT)
+        element = self.copy(temp, "element", property_array_index=1)
+        quality = self.copy(temp, "quality", quality_of=temp.bacnetvariable)
+        other_variables = {
+            bv.bacnet_variable_id: (
+                bv.bacnet_variable.description,
+                bv.bacnet_variable.value_max,
+            )
+            for bv in (high_limit, element, quality)
+        }
+
+        result = import_points(
+            self.device,
+            read_csv(
+                "name;object_type;object_instance;description;value_max\n"
+                "supply-temp;0;1;supply air;60\n"
+            ),
+        )
+        self.assertEqual(result, dict(created=0, updated=1, unchanged=0))
+        temp = self.presentvalue_variable(0, 1)
+        self.assertEqual(temp.description, "supply air")
+        self.assertEqual(temp.value_max, 60)
+        for variable in Variable.objects.filter(pk__in=other_variables.keys()):
+            self.assertEqual(
+                (variable.description, variable.value_max),
+                other_variables[variable.pk],
+            )
+
+    def test_reimport_without_units_keeps_the_configured_ones(self):
+        import_points(self.device, read_ede(EDE, device_instance=1001))
+        unit, _ = Unit.objects.get_or_create(unit="K", defaults=dict(description="K"))
+        valve = self.presentvalue_variable(1, 2)
+        valve.unit = unit
+        valve.description = "configured description"
+        valve.save()
+
+        result = import_points(self.device, read_ede(EDE_WITHOUT_UNITS))
+        self.assertEqual(result, dict(created=0, updated=0, unchanged=2))
+        valve = self.presentvalue_variable(1, 2)
+        self.assertEqual(valve.unit, unit)
+        self.assertEqual(valve.description, "configured description")
+        self.assertEqual(self.presentvalue_variable(0, 1).unit.unit, "°C")
+
+    def test_new_variable_without_unit(self):
+        import_points(self.device, read_ede(EDE_WITHOUT_UNITS))
+        self.assertEqual(self.presentvalue_variable(0, 1).unit.unit, "-")
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.bacnet.quality import (
+    FAULT,
+    IN_ALARM,
+    OUT_OF_SERVICE,
+    OVERRIDDEN,
+    RELIABILITY_SHIFT,
+    is_bad,
+    quality_bits,
+    reliabilities,
+)
+
+
+def test_quality_bits_good():
+    assert quality_bits() == 0
+    assert quality_bits([0, 0, 0, 0], "noFaultDetected", False) == 0
+
+
+def test_quality_bits_status_flags():
+    assert quality_bits([1, 0, 0, 0]) == IN_ALARM
+    assert quality_bits([0, 1, 0, 0]) == FAULT
+    assert quality_bits([0, 0, 1, 0]) == OVERRIDDEN
+    assert quality_bits([0, 0, 0, 1]) == OUT_OF_SERVICE
+    assert quality_bits([1, 1, 1, 1]) == IN_ALARM | FAULT | OVERRIDDEN | OUT_OF_SERVICE
+
+
+def test_quality_bits_reliability():
+    assert quality_bits(reliability=7) == 7 << RELIABILITY_SHIFT
+    if reliabilities:
+        assert quality_bits(reliability="overRange") == (
+            reliabilities["overRange"] << RELIABILITY_SHIFT
+        )
+
+
+def test_quality_bits_out_of_service():
+    assert quality_bits(out_of_service=True) == OUT_OF_SERVICE
+    assert quality_bits([0, 0, 0, 1], out_of_service=True) == OUT_OF_SERVICE
+
+
+def test_is_bad():
+    assert not is_bad(0)
+    assert not is_bad(IN_ALARM)
+    assert not is_bad(OVERRIDDEN)
+    assert is_bad(FAULT)
+    assert is_bad(OUT_OF_SERVICE)
+    assert is_bad(quality_bits(reliability=1))
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.bacnet.quarantine import error_code, is_permanent
+
+
+class UnknownObjectError(Exception):
+    pass
+
+
+class NoResponseFromController(Exception):
+    pass
+
+
+class ErrorPDU(Exception):
+    def __init__(self, error_code):
+        super().__init__()
+        self.errorCode = error_code
+
+
+def test_error_code():
+    assert error_code(UnknownObjectError("analogInput 99")) == "unknownObject"
+    assert error_code(ErrorPDU("unknownProperty")) == "unknownProperty"
+    assert (
+        error_code(
+            NoResponseFromController("APDU Abort Reason : segmentationNotSupported")
+        )
+        == "segmentationNotSupported"
+    )
+
+
+def test_is_permanent():
+    assert is_permanent(UnknownObjectError())
+    assert is_permanent(ErrorPDU("invalidArrayIndex"))
+    assert is_permanent(NoResponseFromController("Error : readAccessDenied"))
+    assert not is_permanent(NoResponseFromController("APDU Abort Reason : Timeout"))
+    assert not is_permanent(ErrorPDU("busy"))
+    assert not is_permanent("unknownObject")
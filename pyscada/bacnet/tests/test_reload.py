@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+pytest.importorskip("BAC0")
+
+from pyscada.models import Device as PyScadaDevice
+from pyscada.bacnet.benchmark import SIMULATOR_IP, SIMULATOR_PORT
+from pyscada.bacnet.capabilities import Capabilities
+from pyscada.bacnet.device import Process, RemoteDevice
+from pyscada.bacnet.metrics import metrics
+from pyscada.bacnet.models import BACnetDiscoveredObject
+from pyscada.bacnet.simulator import VENDOR_ID
+from pyscada.bacnet.tests.farm import OBJECTS, FarmTestCase
+
+
+class DiscoveryStack:
+    """
+    stack of a local device whose discovery finds the simulated devices
+    """
+
+    def __init__(self, devices):
+        self.discovered = [
+            (
+                "sim-%d" % (100000 + n),
+                VENDOR_ID,
+                "%s:%d" % (SIMULATOR_IP, SIMULATOR_PORT + n),
+                100000 + n,
+            )
+            for n in range(devices)
+        ]
+        self.discoveries = 0
+
+    def discover(self, device, refresh=False):
+        self.discoveries += 1
+        return self.discovered
+
+
+class ReloadTestCase(FarmTestCase):
+    devices = 2
+
+    def setUp(self):
+        super().setUp()
+        # added at runtime in the automatic mode
+        self.added = self.remote_device(1)
+        self.added.bacnetdevice.acquisition_mode = 2
+        self.added.bacnetdevice.save()
+        PyScadaDevice.objects.filter(pk=self.added.pk).update(active=False)
+
+    def connect(self):
+        daq = super().connect()
+        daq.stack = DiscoveryStack(self.devices)
+        return daq
+
+    def test_reload_discovers_added_devices(self):
+        daq = self.connect()
+        self.assertEqual(list(daq.remote_devices.keys()), [self.remote.pk])
+        PyScadaDevice.objects.filter(pk=self.added.pk).update(active=True)
+        self.assertTrue(daq.reload())
+        self.assertEqual(daq.stack.discoveries, 1)
+        self.assertIn(self.added.pk, daq.remote_devices)
+        capabilities = Capabilities.load([self.added.bacnetdevice.pk])[
+            self.added.bacnetdevice.pk
+        ]
+        self.assertTrue(capabilities.supports("readPropertyMultiple"))
+        self.assertEqual(daq._acquisition(self.added.pk), "read_multiple")
+        self.added.bacnetdevice.refresh_from_db()
+        self.assertIsNotNone(self.added.bacnetdevice.objects_enumerated)
+        self.assertTrue(
+            BACnetDiscoveredObject.objects.filter(
+                bacnet_device=self.added.bacnetdevice
+            ).exists()
+        )
+        self.assertEqual(len(daq._poll_plan[self.added.pk]), 1)
+        output, points = self.acquire(daq, self.added)
+        self.assertEqual(points, 3 * OBJECTS)
+
+    def test_reload_without_added_devices(self):
+        daq = self.connect()
+        self.assertTrue(daq.reload())
+        self.assertEqual(daq.stack.discoveries, 0)
+        self.assertIsNone(daq._capabilities[self.remote.pk].supports("readProperty"))
+
+    def test_process_restart(self):
+        daq = self.connect()
+        process = Process(
+            dt=5, device_ids=[self.local.pk, self.remote.pk, self.added.pk]
+        )
+        process.devices = {
+            self.local.pk: daq,
+            self.remote.pk: RemoteDevice(daq, self.remote),
+        }
+        PyScadaDevice.objects.filter(pk=self.added.pk).update(active=True)
+        self.assertTrue(process.restart())
+        self.assertIs(process.devices[self.local.pk], daq)
+        self.assertIsInstance(process.devices[self.added.pk], RemoteDevice)
+        process.devices[self.added.pk].request_data()
+        self.assertEqual(
+            metrics.cycle_timer(self.added).cycles[-1]["points"], 3 * OBJECTS
+        )
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.bacnet import routing
+from pyscada.bacnet.routing import TokenBucket
+
+
+class Clock:
+    """
+    time and sleep of the routing module, sleeping advances the time
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def clock(monkeypatch):
+    result = Clock()
+    monkeypatch.setattr(routing, "time", result.time)
+    monkeypatch.setattr(routing, "sleep", result.sleep)
+    return result
+
+
+def test_token_bucket_burst(monkeypatch):
+    c = clock(monkeypatch)
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.acquire() for i in range(3)] == [0.0, 0.0, 0.0]
+    assert not bucket.available()
+    assert bucket.acquire() == 0.1
+    assert c.slept == [0.1]
+
+
+def test_token_bucket_rate(monkeypatch):
+    c = clock(monkeypatch)
+    bucket = TokenBucket(rate=2)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.5
+    c.now += 0.5
+    assert bucket.available()
+    assert bucket.acquire() == 0.0
+
+
+def test_token_bucket_refill_is_capped(monkeypatch):
+    c = clock(monkeypatch)
+    bucket = TokenBucket(rate=10, burst=2)
+    c.now += 60
+    assert [bucket.acquire() for i in range(2)] == [0.0, 0.0]
+    assert bucket.acquire() > 0.0
+
+
+def test_token_bucket_minimum_burst(monkeypatch):
+    clock(monkeypatch)
+    bucket = TokenBucket(rate=1, burst=0)
+    assert bucket.burst == 1.0
+    assert bucket.acquire() == 0.0
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+pytest.importorskip("bacpypes")
+
+from bacpypes import core
+from bacpypes.apdu import (
+    SimpleAckPDU,
+    SubscribeCOVPropertyRequest,
+    SubscribeCOVRequest,
+)
+from bacpypes.app import Application
+from bacpypes.basetypes import PropertyReference
+from bacpypes.local.device import LocalDeviceObject
+from bacpypes.pdu import Address
+from bacpypes.primitivedata import Real
+from bacpypes.service.cov import ChangeOfValueServices
+from django.test import TestCase
+
+from pyscada.models import Device, Unit, Variable
+from pyscada.bacnet import PROTOCOL_ID
+from pyscada.bacnet.models import BACnetDevice, BACnetExportedVariable
+from pyscada.bacnet.server import ExportedCOVDetection, ExportedObjects
+
+SUBSCRIBER = Address("192.0.2.1")
+
+
+class ServerApplication(ChangeOfValueServices, Application):
+    """
+    application of a local BACnet device without network, the responses and
+    the requests it sends are kept
+    """
+
+    def __init__(self):
+        Application.__init__(
+            self,
+            LocalDeviceObject(
+                objectIdentifier=("device", 599),
+                objectName="pyscada",
+                maxApduLengthAccepted=1476,
+                segmentationSupported="noSegmentation",
+                vendorIdentifier=15,
+            ),
+        )
+        ChangeOfValueServices.__init__(self)
+        self.responses = []
+        self.requests = []
+
+    def response(self, apdu):
+        self.responses.append(apdu)
+
+    def request_io(self, iocb):
+        self.requests.append(iocb)
+
+
+def run_deferred():
+    """
+    run the functions deferred to the BACnet stack
+    """
+    while core.deferredFns:
+        fn, args, kwargs = core.deferredFns.pop(0)
+        fn(*args, **kwargs)
+
+
+class ServerTestCase(TestCase):
+    def setUp(self):
+        self.local = Device.objects.create(short_name="local", protocol_id=PROTOCOL_ID)
+        BACnetDevice.objects.create(bacnet_device=self.local, device_type=0)
+        self.unit, _ = Unit.objects.get_or_create(
+            unit="degreesCelsius", defaults=dict(description="degreesCelsius")
+        )
+        self.application = ServerApplication()
+        self.exported = ExportedObjects(self.application)
+
+    def export(self, name, object_type=2, object_instance=1, **kwargs):
+        variable = Variable.objects.create(name=name, device=self.local, unit=self.unit)
+        return BACnetExportedVariable.objects.create(
+            variable=variable,
+            bacnet_local_device=self.local,
+            object_type=object_type,
+            object_instance=object_instance,
+            **kwargs
+        )
+
+    def load(self):
+        self.exported.load(self.local)
+        run_deferred()
+
+
+class ExportedObjectsTestCase(ServerTestCase):
+
+    def test_load(self):
+        analog = self.export("temperature", cov_increment=0.5)
+        binary = self.export("pump", object_type=5)
+        self.load()
+        obj = self.application.get_object_id(("analogValue", 1))
+        self.assertEqual(obj.objectName, "temperature")
+        self.assertEqual(obj.units, "degreesCelsius")
+        self.assertEqual(obj.covIncrement, 0.5)
+        # in fault until the first value
+        self.assertEqual(obj.reliability, "communicationFailure")
+        self.assertEqual(list(obj.statusFlags), [0, 1, 0, 0])
+        self.assertIsNotNone(self.application.get_object_name("pump"))
+        self.assertEqual(
+            sorted(self.exported.variables),
+            sorted([analog.variable_id, binary.variable_id]),
+        )
+
+    def test_reload(self):
+        analog = self.export("temperature")
+        renamed = self.export("humidity", object_instance=2)
+        removed = self.export("pressure", object_instance=3)
+        self.load()
+        kept = self.application.get_object_id(("analogValue", 1))
+        renamed.object_name = "relative humidity"
+        renamed.save()
+        removed.active = False
+        removed.save()
+        analog.cov_increment = 1.0
+        analog.save()
+        self.load()
+        # unchanged objects keep their value
+        self.assertIs(self.application.get_object_id(("analogValue", 1)), kept)
+        self.assertEqual(kept.covIncrement, 1.0)
+        self.assertEqual(
+            self.application.get_object_id(("analogValue", 2)).objectName,
+            "relative humidity",
+        )
+        self.assertIsNone(self.application.get_object_id(("analogValue", 3)))
+        self.assertNotIn(removed.variable_id, self.exported.variables)
+
+    def test_unload(self):
+        self.export("temperature")
+        self.load()
+        self.exported.unload(self.local.pk)
+        run_deferred()
+        self.assertIsNone(self.application.get_object_id(("analogValue", 1)))
+        self.assertEqual(self.exported.objects, {})
+        self.assertEqual(self.exported.variables, {})
+
+    def test_update(self):
+        analog = self.export("temperature")
+        binary = self.export("pump", object_type=5)
+        multistate = self.export("mode", object_type=19)
+        self.load()
+        self.exported.update(
+            [
+                (analog.variable_id, 21.5, 10.0),
+                (binary.variable_id, 1, 10.0),
+                (multistate.variable_id, 3, 10.0),
+            ]
+        )
+        run_deferred()
+        obj = self.application.get_object_id(("analogValue", 1))
+        self.assertEqual(obj.presentValue, 21.5)
+        self.assertEqual(obj.reliability, "noFaultDetected")
+        self.assertEqual(list(obj.statusFlags), [0, 0, 0, 0])
+        self.assertEqual(
+            self.application.get_object_id(("binaryValue", 1)).presentValue,
+            "active",
+        )
+        obj = self.application.get_object_id(("multiStateValue", 1))
+        self.assertEqual((obj.presentValue, obj.numberOfStates), (3, 3))
+
+        # older values are ignored
+        self.exported.update([(analog.variable_id, 20.0, 5.0)])
+        run_deferred()
+        self.assertEqual(
+            self.application.get_object_id(("analogValue", 1)).presentValue, 21.5
+        )
+
+
+class COVTestCase(ServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.temperature = self.export("temperature", cov_increment=0.5)
+        self.load()
+        self.set_value(20.0)
+
+    def set_value(self, value, timestamp=None):
+        self.timestamp = timestamp or getattr(self, "timestamp", 0) + 1
+        self.exported.update([(self.temperature.variable_id, value, self.timestamp)])
+        run_deferred()
+
+    def subscribe(self, confirmed=False, cov_increment=None, process_id=1):
+        if cov_increment is None:
+            request = SubscribeCOVRequest(
+                subscriberProcessIdentifier=process_id,
+                monitoredObjectIdentifier=("analogValue", 1),
+                issueConfirmedNotifications=confirmed,
+                lifetime=300,
+            )
+        else:
+            request = SubscribeCOVPropertyRequest(
+                subscriberProcessIdentifier=process_id,
+                monitoredObjectIdentifier=("analogValue", 1),
+                issueConfirmedNotifications=confirmed,
+                lifetime=300,
+                monitoredPropertyIdentifier=PropertyReference(
+                    propertyIdentifier="presentValue"
+                ),
+                covIncrement=cov_increment,
+            )
+        request.pduSource = SUBSCRIBER
+        if cov_increment is None:
+            self.application.do_SubscribeCOVRequest(request)
+        else:
+            self.application.do_SubscribeCOVPropertyRequest(request)
+        run_deferred()
+
+    def notified(self):
+        """
+        presentValue of the notifications sent since the last call
+        """
+        values = []
+        for iocb in self.application.requests:
+            for value in iocb.args[0].listOfValues:
+                if value.propertyIdentifier == "presentValue":
+                    values.append(round(value.value.cast_out(Real), 3))
+        self.application.requests = []
+        return values
+
+    def test_subscribe(self):
+        self.subscribe()
+        detection = self.application.cov_detections[
+            self.application.get_object_id(("analogValue", 1))
+        ]
+        self.assertIsInstance(detection, ExportedCOVDetection)
+        # the current values are sent to a new subscription
+        self.assertEqual(self.notified(), [20.0])
+
+    def test_cov_increment(self):
+        self.subscribe()
+        self.notified()
+        self.set_value(20.4)
+        self.assertEqual(self.notified(), [])
+        # the change is counted from the last notified value
+        self.set_value(20.6)
+        self.assertEqual(self.notified(), [20.6])
+        self.set_value(20.6)
+        self.assertEqual(self.notified(), [])
+        self.set_value(19.0)
+        self.assertEqual(self.notified(), [19.0])
+
+    def test_cov_increment_of_the_subscription(self):
+        self.subscribe(cov_increment=2.0)
+        self.notified()
+        self.set_value(21.0)
+        self.assertEqual(self.notified(), [])
+        self.set_value(22.0)
+        self.assertEqual(self.notified(), [22.0])
+
+    def test_status_flags(self):
+        self.subscribe()
+        self.notified()
+        self.application.get_object_id(("analogValue", 1)).statusFlags = [0, 1, 0, 0]
+        run_deferred()
+        self.assertEqual(self.notified(), [20.0])
+
+    def test_confirmed_notifications_coalesced(self):
+        self.subscribe(confirmed=True)
+        self.assertEqual(len(self.application.requests), 1)
+        first = self.application.requests[0]
+        self.set_value(22.0)
+        self.set_value(24.0)
+        # waiting for the acknowledgement of the first notification
+        self.assertEqual(len(self.application.requests), 1)
+        first.complete(SimpleAckPDU())
+        self.assertEqual(self.notified(), [20.0, 24.0])
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.test import TransactionTestCase
+
+from pyscada.models import Device, DeviceProtocol
+from pyscada.bacnet import PROTOCOL_ID
+from pyscada.bacnet.models import BACnetDevice
+from pyscada.bacnet.signals import reinit_daq_daemons
+
+
+class NotificationTestCase(TransactionTestCase):
+    """
+    the daq daemon notifications of the changes of a transaction are sent
+    once per device after its commit
+    """
+
+    def setUp(self):
+        # the protocol created by the migrations is flushed by the tests
+        DeviceProtocol.objects.get_or_create(
+            pk=PROTOCOL_ID,
+            defaults=dict(
+                protocol="bacnet",
+                app_name="pyscada.bacnet",
+                device_class="pyscada.bacnet.device",
+                daq_daemon=True,
+                single_thread=True,
+            ),
+        )
+        self.devices = []
+        for n in range(2):
+            device = Device.objects.create(
+                short_name="device-%d" % n, protocol_id=PROTOCOL_ID
+            )
+            BACnetDevice.objects.create(bacnet_device=device, device_type=0)
+            self.devices.append(device)
+        self.notified = []
+        post_save.connect(self._notified, sender=Device)
+
+    def tearDown(self):
+        post_save.disconnect(self._notified, sender=Device)
+
+    def _notified(self, sender, instance, **kwargs):
+        # the notifications are sent without the arguments of a save
+        if "created" not in kwargs:
+            self.notified.append(instance.pk)
+
+    def test_once_per_device_and_commit(self):
+        first, second = self.devices
+        with transaction.atomic():
+            for i in range(3):
+                first.bacnetdevice.save()
+                second.bacnetdevice.save()
+            reinit_daq_daemons(first)
+            self.assertEqual(self.notified, [])
+        self.assertEqual(sorted(self.notified), sorted([first.pk, second.pk]))
+
+        # the next transaction notifies again
+        with transaction.atomic():
+            first.bacnetdevice.save()
+        self.assertEqual(sorted(self.notified), sorted([first.pk, first.pk, second.pk]))
+
+    def test_rollback(self):
+        first = self.devices[0]
+        try:
+            with transaction.atomic():
+                first.bacnetdevice.save()
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(self.notified, [])
+
+        # a later transaction is not coalesced with the rolled back one
+        with transaction.atomic():
+            first.bacnetdevice.save()
+        self.assertEqual(self.notified, [first.pk])
+
+    def test_savepoint_rollback(self):
+        first, second = self.devices
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    first.bacnetdevice.save()
+                    second.bacnetdevice.save()
+                    raise ValueError
+            except ValueError:
+                pass
+            # queued again after the savepoint dropped its notification
+            first.bacnetdevice.save()
+        self.assertEqual(self.notified, [first.pk])
+
+    def test_outside_transaction(self):
+        first = self.devices[0]
+        first.bacnetdevice.save()
+        self.assertEqual(self.notified, [first.pk])
+        reinit_daq_daemons(first)
+        self.assertEqual(self.notified, [first.pk, first.pk])
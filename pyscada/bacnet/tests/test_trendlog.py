@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.bacnet.trendlog import (
+    READ_RANGE_HEADER_SIZE,
+    READ_RANGE_RECORD_SIZE,
+    records_per_request,
+)
+
+
+def test_records_per_request():
+    assert records_per_request(1476) == (1476 - READ_RANGE_HEADER_SIZE) // (
+        READ_RANGE_RECORD_SIZE
+    )
+    assert records_per_request(480) == 19
+
+
+def test_records_per_request_small_apdu():
+    assert records_per_request(50) == 1
+    assert records_per_request(READ_RANGE_HEADER_SIZE) == 1
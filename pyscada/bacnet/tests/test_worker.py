@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.test import TestCase
+
+from pyscada.models import Device
+from pyscada.bacnet import PROTOCOL_ID
+from pyscada.bacnet.models import BACnetDevice
+from pyscada.bacnet.worker import Process
+
+
+def local_device(name, port="47808", shard_count=1):
+    device = Device.objects.create(short_name=name, protocol_id=PROTOCOL_ID)
+    BACnetDevice.objects.create(
+        bacnet_device=device,
+        device_type=0,
+        ip_address="127.0.0.1",
+        port=port,
+        shard_count=shard_count,
+    )
+    return device
+
+
+def remote_devices(local, count):
+    devices = []
+    for n in range(count):
+        device = Device.objects.create(
+            short_name="%s-remote-%d" % (local.short_name, n),
+            protocol_id=PROTOCOL_ID,
+        )
+        BACnetDevice.objects.create(
+            bacnet_device=device,
+            device_type=1,
+            ip_address="127.0.0.2",
+            port=str(47810 + n),
+            bacnet_local_device=local,
+        )
+        devices.append(device)
+    return devices
+
+
+class ProcessListTestCase(TestCase):
+    def setUp(self):
+        self.worker = Process(dt=5)
+
+    def test_one_process_per_address_and_shard(self):
+        local = local_device("local", shard_count=3)
+        remote_devices(local, 30)
+        process_list = self.worker.gen_process_list()
+        shards = set(
+            local.bacnetdevice.shard_index(device.pk)
+            for device in Device.objects.filter(bacnetdevice__bacnet_local_device=local)
+        )
+        self.assertEqual(
+            sorted(process_list.keys()),
+            sorted(self.worker.gen_group_id(local, shard) for shard in shards),
+        )
+        for key, (local_shards, values) in process_list.items():
+            shard = local_shards[str(local.pk)]
+            self.assertEqual(key, "%d-127.0.0.1:%d" % (local.pk, 47808 + shard))
+            self.assertEqual(values[0], local)
+
+    def test_remote_devices_in_one_shard(self):
+        local = local_device("local", shard_count=4)
+        devices = remote_devices(local, 40)
+        seen = []
+        for key, (local_shards, values) in self.worker.gen_process_list().items():
+            shard = local_shards[str(local.pk)]
+            for device in values[1:]:
+                self.assertEqual(local.bacnetdevice.shard_index(device.pk), shard)
+                seen.append(device.pk)
+        self.assertEqual(sorted(seen), sorted(device.pk for device in devices))
+
+    def test_stable_group_ids(self):
+        local = local_device("local", shard_count=2)
+        remote_devices(local, 10)
+        first = self.worker.gen_process_list()
+        remote_devices(local_device("other", port="47820"), 2)
+        second = self.worker.gen_process_list()
+        for key, (local_shards, values) in first.items():
+            self.assertIn(key, second)
+            self.assertEqual(second[key][0], local_shards)
+            self.assertEqual(second[key][1], values)
+
+    def test_shared_address(self):
+        """
+        the local devices binding the same address share a process
+        """
+        first = local_device("first")
+        second = local_device("second")
+        remote_devices(first, 2)
+        remote_devices(second, 2)
+        process_list = self.worker.gen_process_list()
+        self.assertEqual(list(process_list.keys()), ["%d-127.0.0.1:47808" % first.pk])
+        local_shards, values = process_list["%d-127.0.0.1:47808" % first.pk]
+        self.assertEqual(local_shards, {str(first.pk): 0, str(second.pk): 0})
+        self.assertEqual(len(values), 6)
+
+    def test_local_device_without_remote_devices(self):
+        local = local_device("local", shard_count=3)
+        self.assertEqual(
+            self.worker.gen_process_list(),
+            {"%d-127.0.0.1:47808" % local.pk: ({str(local.pk): 0}, [local])},
+        )
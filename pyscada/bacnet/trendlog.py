@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+try:
+    from bacpypes.apdu import (
+        ReadRangeRequest,
+        ReadRangeACK,
+        Range,
+        RangeBySequenceNumber,
+        RangeByTime,
+    )
+    from bacpypes.basetypes import DateTime, LogRecord
+    from bacpypes.primitivedata import Date, Time
+    from bacpypes.constructeddata import ListOf
+
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+
+from pyscada.models import RecordedData
+
+from django.conf import settings
+from django.utils.timezone import now
+
+from datetime import datetime
+from time import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# estimated size of a ReadRange answer: header and record with a timestamp,
+# a real value and the status flags
+READ_RANGE_HEADER_SIZE = 24
+READ_RANGE_RECORD_SIZE = 24
+
+# values of the log records stored, the other choices are status changes
+# and failures of the trend log
+LOG_DATUM_VALUES = (
+    "realValue",
+    "unsignedValue",
+    "signedValue",
+    "enumValue",
+    "booleanValue",
+)
+
+
+def _max_age():
+    """
+    seconds of history backfilled for a trend log without retrieved records
+    and stored values
+    """
+    if hasattr(settings, "PYSCADA_BACNET"):
+        if "trend_log_max_age" in settings.PYSCADA_BACNET:
+            return float(settings.PYSCADA_BACNET["trend_log_max_age"])
+    return 86400.0
+
+
+def records_per_request(max_apdu):
+    """
+    count of log records fitting in an answer of max_apdu bytes
+    """
+    return max(1, (max_apdu - READ_RANGE_HEADER_SIZE) // READ_RANGE_RECORD_SIZE)
+
+
+def bacnet_datetime(timestamp):
+    """
+    BACnet DateTime of a unix timestamp, BACnet times are local times
+    """
+    return DateTime(date=Date().now(timestamp).value, time=Time().now(timestamp).value)
+
+
+def record_timestamp(value):
+    """
+    unix timestamp of a BACnet DateTime, None when a field is unspecified
+    """
+    year, month, day, _ = value.date
+    hour, minute, second, hundredth = value.time
+    if 255 in (year, month, day, hour, minute, second) or month > 12 or day > 31:
+        return None
+    if hundredth == 255:
+        hundredth = 0
+    try:
+        return datetime(
+            year + 1900, month, day, hour, minute, second, hundredth * 10000
+        ).timestamp()
+    except ValueError:
+        return None
+
+
+def record_value(record):
+    """
+    value of a log record as float, None for status and failure records
+    """
+    for name in LOG_DATUM_VALUES:
+        value = getattr(record.logDatum, name)
+        if value is not None:
+            return float(value)
+    return None
+
+
+def read_range_request(address, instance, count, sequence_number=None, after=None):
+    """
+    ReadRange request of the next count records of the log buffer of a Trend
+    Log object, from a sequence number or after a unix timestamp
+    """
+    if sequence_number is not None:
+        reference = Range(
+            bySequenceNumber=RangeBySequenceNumber(
+                referenceSequenceNumber=sequence_number, count=count
+            )
+        )
+    else:
+        reference = Range(
+            byTime=RangeByTime(referenceTime=bacnet_datetime(after), count=count)
+        )
+    request = ReadRangeRequest(
+        objectIdentifier=("trendLog", instance),
+        propertyIdentifier="logBuffer",
+        range=reference,
+    )
+    request.pduDestination = address
+    return request
+
+
+def decode_records(apdu):
+    """
+    records of a ReadRange answer
+
+    :return: list of (timestamp, value) of the records, sequence number of
+        the first record or None, True when more records are available
+    """
+    if not isinstance(apdu, ReadRangeACK):
+        raise ValueError("unexpected answer %r" % apdu)
+    records = []
+    if apdu.itemCount:
+        for record in apdu.itemData.cast_out(ListOf(LogRecord)):
+            records.append((record_timestamp(record.timestamp), record_value(record)))
+    return records, apdu.firstSequenceNumber, bool(apdu.resultFlags[2])
+
+
+def backfill(trend_log, address, send, max_apdu, until=None, max_requests=100):
+    """
+    read the records of a trend log logged since the last retrieved one and
+    store them with their timestamps, records newer than until are skipped
+    as the variable is polled again since then
+
+    :param send: function sending a request and returning the answer
+    :param max_apdu: size of the answers, the records are read in chunks
+        fitting in it
+    :return: count of records stored
+    """
+    variable = trend_log.bacnet_variable.bacnet_variable
+    if until is None:
+        until = time()
+    count = records_per_request(max_apdu)
+    sequence_number = trend_log.last_sequence_number
+    after = None
+    if trend_log.last_record_time is not None:
+        after = trend_log.last_record_time.timestamp()
+    if sequence_number is None and after is None:
+        last = RecordedData.objects.last_element(
+            use_date_saved=False,
+            time_min=until - _max_age(),
+            time_max=until,
+            variable=variable,
+        )
+        after = last.time_value() if last is not None else until - _max_age()
+
+    items = []
+    retrieved = False
+    try:
+        for i in range(max_requests):
+            apdu = send(
+                read_range_request(
+                    address,
+                    trend_log.trend_log_instance,
+                    count,
+                    sequence_number + 1 if sequence_number is not None else None,
+                    after if sequence_number is None else None,
+                )
+            )
+            records, first, more = decode_records(apdu)
+            if not records:
+                break
+            retrieved = True
+            if first is None:
+                # no sequence numbers, continue after the last record
+                sequence_number = None
+            else:
+                if sequence_number is not None and first > sequence_number + 1:
+                    logger.info(
+                        "%s : %d records overwritten before the backfill"
+                        % (trend_log, first - sequence_number - 1)
+                    )
+                sequence_number = first + len(records) - 1
+            for timestamp, value in records:
+                if timestamp is None:
+                    continue
+                after = timestamp
+                if value is None or timestamp >= until:
+                    continue
+                if variable.scaling is not None and (
+                    variable.value_class.upper() not in ["BOOL", "BOOLEAN"]
+                ):
+                    value = variable.scaling.scale_value(value)
+                items.append(
+                    RecordedData(variable=variable, value=value, timestamp=timestamp)
+                )
+            # some devices only set moreItems when the answer is truncated
+            if not more and len(records) < count:
+                break
+    finally:
+        # keep the records read before a failure
+        date_saved = now()
+        for item in items:
+            item.date_saved = date_saved
+        RecordedData.objects.bulk_create(items, batch_size=1000, ignore_conflicts=True)
+        if retrieved:
+            trend_log.last_sequence_number = sequence_number
+            if after is not None:
+                trend_log.last_record_time = datetime.fromtimestamp(after).astimezone()
+        trend_log.last_backfill = date_saved
+        trend_log.records_backfilled += len(items)
+        trend_log.save(
+            update_fields=[
+                "last_sequence_number",
+                "last_record_time",
+                "last_backfill",
+                "records_backfilled",
+            ]
+        )
+    return len(items)
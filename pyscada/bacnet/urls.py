@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("metrics/bacnet/", views.metrics, name="bacnet-metrics"),
+    path("metrics/bacnet/cycles/", views.cycles, name="bacnet-cycles"),
+]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.bacnet.metrics import read_metrics, read_cycles, prometheus_text
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _metrics_allowed(request):
+    if request.user.is_authenticated:
+        return True
+    allowed_ips = ["127.0.0.1", "::1"]
+    if hasattr(settings, "PYSCADA_BACNET"):
+        if "metrics_allowed_ips" in settings.PYSCADA_BACNET:
+            allowed_ips = settings.PYSCADA_BACNET["metrics_allowed_ips"]
+    return request.META.get("REMOTE_ADDR") in allowed_ips
+
+
+def metrics(request):
+    """
+    acquisition metrics of the BACnet DAQ processes in the Prometheus text
+    format, open to logged in users and the metrics_allowed_ips
+    """
+    if not _metrics_allowed(request):
+        return HttpResponse(status=403)
+    return HttpResponse(
+        prometheus_text(read_metrics()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def cycles(request):
+    """
+    timing breakdown of the last acquisition cycles of each device as json
+    """
+    if not _metrics_allowed(request):
+        return HttpResponse(status=403)
+    return JsonResponse(read_cycles())
@@ -11,7 +11,6 @@ from pyscada.bacnet import PROTOCOL_ID
 import json
 import logging
 
-
 logger = logging.getLogger(__name__)
 
 
@@ -27,25 +26,115 @@ class Process(MultiDeviceDAQProcessWorker):
 
     def init_process(self):
         super(Process, self).init_process()
-        for process in self.processes:
-            bp = BackgroundProcess.objects.filter(pk=process["id"])
-            device_ids = [Device.objects.get(id=process["device_ids"][0]).pk]
+        self.update_processes()
+
+    def restart(self):
+        """
+        apply configuration changes, the processes of the shards which still
+        exist reload their configuration instead of being restarted
+        """
+        self.update_processes(restart=True)
+        return True
+
+    def create_bp(self, key, values, shards=None):
+        bp = BackgroundProcess(
+            label=self.bp_label % key,
+            message="waiting..",
+            enabled=True,
+            parent_process_id=self.process_id,
+            process_class=self.process_class,
+            process_class_kwargs=json.dumps(
+                {"device_ids": [i.pk for i in values], "shards": shards or {}}
+            ),
+        )
+        bp.save()
+        self.processes.append(
+            {
+                "id": bp.id,
+                "key": key,
+                "device_ids": [i.pk for i in values],
+                "failed": 0,
+            }
+        )
+
+    def gen_process_list(self):
+        """
+        return the shard of each local device and the devices of each
+        process by key, the remote devices of a local device are split in
+        shards. The local devices binding the same address and port are
+        handled by one process sharing the BACnet stack
+        """
+        process_list = {}
+        # key of the process binding an address, named after its first local
+        # device
+        keys = {}
+        for local_device in Device.objects.filter(
+            active=True, **self.device_filter
+        ).order_by("pk"):
+            shards = {}
             for item in Device.objects.filter(
                 active=True,
                 bacnetdevice__isnull=False,
-                bacnetdevice__bacnet_local_device=process["device_ids"][0],
+                bacnetdevice__bacnet_local_device=local_device,
             ):
-                device_ids.append(item.pk)
-            bp.update(
-                process_class_kwargs=json.dumps({"device_ids": [i for i in device_ids]})
+                shard = local_device.bacnetdevice.shard_index(item.pk)
+                shards.setdefault(shard, []).append(item)
+            if len(shards) == 0:
+                shards[0] = []
+            for shard, items in shards.items():
+                key = keys.setdefault(
+                    self.gen_address(local_device, shard),
+                    self.gen_group_id(local_device, shard),
+                )
+                local_shards, values = process_list.setdefault(key, ({}, []))
+                local_shards[str(local_device.pk)] = shard
+                values.extend([local_device] + items)
+        return process_list
+
+    def update_processes(self, restart=False):
+        """
+        update the device list of the processes, start the missing shards
+        and stop the processes of shards which no longer exist
+        """
+        process_list = self.gen_process_list()
+        for process in list(self.processes):
+            bp = BackgroundProcess.objects.filter(pk=process["id"]).first()
+            if process["key"] not in process_list:
+                self.processes.remove(process)
+                if bp is None:
+                    continue
+                elif bp.pid:
+                    bp.stop(cleanup=True)
+                else:
+                    bp.delete()
+                continue
+            shards, values = process_list.pop(process["key"])
+            process["device_ids"] = [i.pk for i in values]
+            if bp is None:
+                continue
+            BackgroundProcess.objects.filter(pk=bp.pk).update(
+                process_class_kwargs=json.dumps(
+                    {"device_ids": process["device_ids"], "shards": shards}
+                )
             )
-            process["device_ids"] = device_ids
-            self.processes.remove(process)
-            self.processes.append(process)
+            if restart:
+                bp.restart()
+        for key, (shards, values) in process_list.items():
+            self.create_bp(key, values, shards)
 
-    def gen_group_id(self, item):
-        return "%d-%s:%s" % (
-            item.pk,
+    def gen_address(self, item, shard=0):
+        """
+        address and port bound by the shard of a local device
+        """
+        return "%s:%d" % (
             item.bacnetdevice.ip_address,
-            item.bacnetdevice.port,
+            int(item.bacnetdevice.port) + shard,
         )
+
+    def gen_group_id(self, item, shard=0):
+        """
+        key of the process of the shard of a local device, prefixed with the
+        device id as the pyscada signals look the processes up by
+        pyscada.bacnet-<device id>-
+        """
+        return "%d-%s" % (item.pk, self.gen_address(item, shard))